@@ -0,0 +1,34 @@
+"""Benchmark: difflib.unified_diff vs. devagent.diffing auf großen, ähnlichen Dateien.
+
+Erzeugt eine JSON-artige Datei mit vielen gleichen Zeilen (wie Lockfiles/generiertes JSON)
+und ändert jede k-te Zeile.
+
+Aufruf: python benchmarks/bench_diff.py [--lines 20000] [--every 97]
+"""
+from __future__ import annotations
+import argparse, difflib, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from devagent.diffing import compute  # noqa: E402
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=20000)
+    ap.add_argument("--every", type=int, default=97)
+    ap.add_argument("--skip-difflib", action="store_true")
+    args = ap.parse_args()
+    a = ['  "k%d": %d,' % (i % 50, i % 7) for i in range(args.lines)]
+    b = list(a)
+    for i in range(0, args.lines, args.every):
+        b[i] = '  "changed": true,'
+    t0 = time.perf_counter()
+    d = compute("\n".join(a), "\n".join(b), max_lines=10 * args.lines)
+    print(f"diffing  {(time.perf_counter() - t0) * 1000:9.1f} ms  +{d.added} -{d.removed}")
+    if not args.skip_difflib:
+        t0 = time.perf_counter()
+        n = sum(1 for _ in difflib.unified_diff(a, b, lineterm=""))
+        print(f"difflib  {(time.perf_counter() - t0) * 1000:9.1f} ms  {n} Zeilen")
+
+if __name__ == "__main__":
+    main()
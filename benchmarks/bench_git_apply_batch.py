@@ -0,0 +1,62 @@
+"""Benchmark: Patch-Aktionen einzeln vs. gebündelt anwenden.
+
+Erzeugt ein Git-Repo mit N Dateien und einen Plan aus N Patch-Aktionen und misst:
+  - single:    apply_patch_git je Patch (2 git-Prozesse pro Aktion)
+  - batch:     apply_patches_git mit allen Patches (1x --check, 1x apply)
+  - inprocess: apply_patch je Patch (ohne git-Prozess)
+
+Aufruf: python benchmarks/bench_git_apply_batch.py [--patches 50] [--repeat 3]
+"""
+from __future__ import annotations
+import argparse, os, subprocess, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from devagent.patcher import apply_patch, apply_patch_git, apply_patches_git  # noqa: E402
+
+def make_repo(root: str, n: int) -> list[str]:
+    patches: list[str] = []
+    for i in range(n):
+        with open(os.path.join(root, f"f{i}.txt"), "w") as f:
+            f.write("".join(f"line {j}\n" for j in range(20)))
+        patches.append(f"--- a/f{i}.txt\n+++ b/f{i}.txt\n@@ -9,3 +9,3 @@\n line 8\n-line 9\n+LINE 9\n line 10\n")
+    subprocess.run(["git", "init", "-q"], cwd=root, check=True)
+    subprocess.run(["git", "add", "-A"], cwd=root, check=True)
+    subprocess.run(["git", "-c", "user.email=b@b", "-c", "user.name=b", "commit", "-qm", "init"], cwd=root, check=True)
+    return patches
+
+def bench(label: str, fn, reset, repeat: int) -> None:
+    best = float("inf")
+    for _ in range(repeat):
+        reset()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    print(f"{label:<10} {best*1000:9.1f} ms")
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--patches", type=int, default=50)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as ws:
+        patches = make_repo(ws, args.patches)
+        reset = lambda: subprocess.run(["git", "checkout", "-q", "--", "."], cwd=ws, check=True)
+
+        def single() -> None:
+            for p in patches:
+                assert apply_patch_git(ws, p)
+
+        def batch() -> None:
+            assert apply_patches_git(ws, patches)[0]
+
+        def inprocess() -> None:
+            for p in patches:
+                apply_patch(ws, p)
+
+        bench("single", single, reset, args.repeat)
+        bench("batch", batch, reset, args.repeat)
+        bench("inprocess", inprocess, reset, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark: alte Namens-Set-Prüfung vs. kompilierter .gitignore-Matcher.
+
+Erzeugt einen synthetischen Baum mit großen, per .gitignore ausgeschlossenen
+Ordnern (target/, *.egg-info, vendor/**, bazel-out) und misst:
+  - legacy:  os.walk + set(DEFAULT_IGNORES + extra) pro Aufruf (altes should_ignore)
+  - matcher: scan_tree mit kompiliertem Matcher und Pruning
+  - git:     git ls-files -co --exclude-standard (schneller Pfad)
+
+Aufruf: python benchmarks/bench_ignore.py [--files-per-dir 200] [--repeat 3]
+"""
+from __future__ import annotations
+import argparse, os, subprocess, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from devagent.constants import DEFAULT_IGNORES  # noqa: E402
+from devagent.ignore import compile_ignores, git_ls_files  # noqa: E402
+from devagent.scanner import scan_tree  # noqa: E402
+
+def legacy_scan(workspace: str, extra_ignores: list[str]) -> list[str]:
+    def should_ignore(name: str) -> bool:
+        names = set(DEFAULT_IGNORES + extra_ignores)
+        return name in names
+    out: list[str] = []
+    root = os.path.realpath(workspace)
+    for d, dirs, files in os.walk(root):
+        dirs[:] = [x for x in dirs if not should_ignore(x)]
+        rel_dir = os.path.relpath(d, root)
+        rel_dir = "" if rel_dir == "." else rel_dir
+        out.extend(os.path.join(rel_dir, f) if rel_dir else f for f in files)
+    out.sort()
+    return out
+
+def make_tree(root: str, per_dir: int) -> None:
+    layout = {
+        "src/pkg%d": 20, "tests/t%d": 10,
+        "target/debug/build/b%d": 40, "pkg.egg-info/d%d": 5,
+        "vendor/mod%d": 40, "bazel-out/k8/bin/x%d": 40,
+    }
+    for pattern, ndirs in layout.items():
+        for i in range(ndirs):
+            d = os.path.join(root, pattern % i)
+            os.makedirs(d, exist_ok=True)
+            for j in range(per_dir):
+                with open(os.path.join(d, f"f{j}.txt"), "w") as f:
+                    f.write("x\n")
+    with open(os.path.join(root, ".gitignore"), "w") as f:
+        f.write("target/\n*.egg-info/\nvendor/**\nbazel-*\n")
+
+def bench(label: str, fn, repeat: int) -> None:
+    best = float("inf")
+    n = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        n = len(fn())
+        best = min(best, time.perf_counter() - t0)
+    print(f"{label:<8} {best*1000:9.1f} ms  {n:7d} Dateien")
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files-per-dir", type=int, default=200)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    with tempfile.TemporaryDirectory() as ws:
+        make_tree(ws, args.files_per_dir)
+        bench("legacy", lambda: legacy_scan(ws, []), args.repeat)
+        bench("matcher", lambda: scan_tree(ws, []), args.repeat)
+        subprocess.run(["git", "init", "-q"], cwd=ws, check=True)
+        bench("git", lambda: git_ls_files(ws, compile_ignores(ws, [])) or [], args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+from __future__ import annotations
+import os, json, time, threading, yaml
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+from .config import Config, load_config
+from .prompts import build_prompts
+from .verifier import verify_plan
+from .audit import log_event
+from .res import read_template
+from .utils import is_git_repo, json_dump
+
+# Viele headless Jobs in einem Prozess: scan -> llm -> verify als Pipeline mit begrenzten Pools.
+# Jede Stufe hat ihren eigenen Pool; ein Job rückt weiter, sobald seine vorige Stufe fertig ist.
+
+STAGES = ("scan", "llm", "verify")
+
+@dataclass
+class BatchJob:
+    workspace: str
+    goal: str = ""
+    template: str = ""
+    line: int = 0
+
+@dataclass
+class JobResult:
+    job: BatchJob
+    ok: bool = False
+    plan_file: str = ""
+    plan_hash: str = ""
+    actions: int = 0
+    errors: List[str] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+def load_jobs(path: str) -> List[BatchJob]:
+    """JSONL mit {workspace, goal, template}; relative Workspaces gelten relativ zur Datei."""
+    base = os.path.dirname(os.path.abspath(path))
+    jobs: List[BatchJob] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{n}: kein gültiges JSON ({e})")
+            goal, template = str(rec.get("goal") or ""), str(rec.get("template") or "")
+            if not goal and not template:
+                raise ValueError(f"{path}:{n}: 'goal' oder 'template' fehlt")
+            ws = os.path.realpath(os.path.join(base, str(rec.get("workspace") or ".")))
+            jobs.append(BatchJob(ws, goal, template, n))
+    return jobs
+
+def job_goal(job: BatchJob) -> str:
+    """template 'lint_fix' => templates/goal_lint_fix.txt; goal wird dann als Hinweis angehängt."""
+    if not job.template:
+        return job.goal
+    name = job.template if job.template.endswith(".txt") else f"goal_{job.template.removeprefix('goal_')}.txt"
+    base = read_template(name)
+    return base + ("\n\nZusätzlicher Hinweis:\n" + job.goal if job.goal else "")
+
+def _timed(fn: Callable, *args):
+    t0 = time.perf_counter()
+    return fn(*args), time.perf_counter() - t0
+
+def _percentile(xs: List[float], q: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(q * (len(xs) - 1))))] if xs else 0.0
+
+def summarize(results: List[JobResult], wall: float) -> dict:
+    stages = {}
+    for stage in STAGES:
+        xs = [r.timings[stage] for r in results if stage in r.timings]
+        stages[stage] = {"n": len(xs), "p50": round(_percentile(xs, 0.5), 3),
+                         "p95": round(_percentile(xs, 0.95), 3), "max": round(max(xs, default=0.0), 3)}
+    ok = sum(1 for r in results if r.ok)
+    return {
+        "jobs": len(results), "ok": ok, "failed": len(results) - ok,
+        "wall_s": round(wall, 3),
+        "jobs_per_min": round(60 * len(results) / wall, 2) if wall > 0 else 0.0,
+        "stages": stages,
+    }
+
+def run_batch(jobs: List[BatchJob], out_dir: str, make_client: Callable[[str, Config], object],
+              concurrency: int = 4, verify_workers: int = 2,
+              on_result: Optional[Callable[[JobResult], None]] = None) -> Tuple[List[JobResult], dict]:
+    """Schreibt <out_dir>/NNN-<workspace>.yaml je Job und summary.json; gibt (results, summary) zurück."""
+    os.makedirs(out_dir, exist_ok=True)
+    results = [JobResult(job) for job in jobs]
+    ws_locks: Dict[str, threading.Lock] = {ws: threading.Lock() for ws in {j.workspace for j in jobs}}
+
+    def scan(job: BatchJob):
+        with ws_locks[job.workspace]:  # Index/Cache eines Workspaces nicht doppelt aufbauen
+            cfg = load_config(job.workspace)
+            system_prompt, user_prompt, _ = build_prompts(job.workspace, cfg, job_goal(job))
+        return cfg, system_prompt, user_prompt
+
+    def llm(job: BatchJob, cfg: Config, system_prompt: str, user_prompt: str):
+        client = make_client(job.workspace, cfg)
+        plan, plan_hash = client.generate_plan(system_prompt, user_prompt)
+        stats = dict(getattr(client, "stats", None) or {})
+        if stats:
+            log_event(job.workspace, f"plan-{plan_hash}", "llm", stats)
+        return plan, plan_hash
+
+    def verify(job: BatchJob, cfg: Config, plan):
+        return verify_plan(plan, job.workspace, cfg, is_git_repo(job.workspace))
+
+    t0 = time.perf_counter()
+    cfgs: Dict[int, Config] = {}
+    with ThreadPoolExecutor(concurrency, "batch-scan") as scan_pool, \
+         ThreadPoolExecutor(concurrency, "batch-llm") as llm_pool, \
+         ThreadPoolExecutor(verify_workers, "batch-verify") as verify_pool:
+        pending = {scan_pool.submit(_timed, scan, job): (i, "scan") for i, job in enumerate(jobs)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                i, stage = pending.pop(fut)
+                res, job = results[i], jobs[i]
+                try:
+                    value, seconds = fut.result()
+                except Exception as e:
+                    res.errors.append(f"{stage}: {type(e).__name__}: {e}")
+                    if on_result: on_result(res)
+                    continue
+                res.timings[stage] = round(seconds, 3)
+                if stage == "scan":
+                    cfg, system_prompt, user_prompt = value
+                    cfgs[i] = cfg
+                    pending[llm_pool.submit(_timed, llm, job, cfg, system_prompt, user_prompt)] = (i, "llm")
+                elif stage == "llm":
+                    plan, res.plan_hash = value
+                    res.actions = len(plan.actions)
+                    res.plan_file = os.path.join(out_dir, f"{i+1:03d}-{os.path.basename(job.workspace) or 'ws'}.yaml")
+                    with open(res.plan_file, "w", encoding="utf-8") as f:
+                        yaml.safe_dump({"actions": [a.model_dump() for a in plan.actions]}, f,
+                                       sort_keys=False, allow_unicode=True)
+                    pending[verify_pool.submit(_timed, verify, job, cfgs[i], plan)] = (i, "verify")
+                else:
+                    res.errors = list(value)
+                    res.ok = not value
+                    if on_result: on_result(res)
+
+    summary = summarize(results, time.perf_counter() - t0)
+    summary["results"] = [{
+        "line": r.job.line, "workspace": r.job.workspace, "ok": r.ok, "plan": r.plan_file,
+        "plan_hash": r.plan_hash, "actions": r.actions, "errors": r.errors, "timings": r.timings,
+    } for r in results]
+    json_dump(os.path.join(out_dir, "summary.json"), summary)
+    return results, summary
@@ -0,0 +1,108 @@
+from __future__ import annotations
+import math
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Token-Budget für die Projektkarte: Dateiliste zuerst, dann Samples nach Priorität,
+# zuletzt gekürzte Köpfe der Samples, die nicht vollständig gepasst haben.
+
+MIN_HEAD_LINES = 5
+
+def estimate_tokens(text: str, method: str = "chars") -> int:
+    """Grobe Schätzung ohne Tokenizer: chars => ~4 Zeichen/Token, words => ~1.3 Token/Wort."""
+    if not text:
+        return 0
+    if method == "words":
+        return math.ceil(len(text.split()) * 1.3)
+    return math.ceil(len(text) / 4)
+
+@dataclass
+class CardBudget:
+    tokens: Optional[int] = None      # None => nur die festen Limits
+    estimator: str = "chars"
+    files_share: float = 0.3          # max. Anteil des Budgets für die Dateiliste
+    max_files: int = 400
+    max_samples: int = 60
+
+    def cost(self, line: str) -> int:
+        return estimate_tokens(line, self.estimator) + 1  # +1 für den Zeilenumbruch
+
+def budget_for(context_tokens: int, fixed_text: str, response_tokens: int, estimator: str) -> int:
+    """Restbudget für {{PROJECT_CARD}} nach Abzug von Prompt-Rest und Antwort-Reserve."""
+    return max(0, context_tokens - estimate_tokens(fixed_text, estimator) - response_tokens)
+
+def pack_card(files: List[str], samples: Iterable[Tuple[str, str, bool]], budget: CardBudget,
+              included: Optional[Dict[str, str]] = None) -> Tuple[str, Dict[str, int]]:
+    """samples: (rel, text, is_body) in Prioritätsreihenfolge; is_body=False für Marker-Zeilen
+    (masked/binary/read error), die nie gekürzt werden.
+    Gibt (card, report) zurück; report enthält die Tokens je Abschnitt.
+    included (optional) wird mit rel -> text der vollständig aufgenommenen Samples gefüllt.
+    """
+    total = budget.tokens
+    report = {"files": 0, "samples": 0, "heads": 0, "files_listed": 0, "samples_full": 0, "samples_truncated": 0}
+    used = 0
+
+    def fits(n: int, limit: Optional[int] = None) -> bool:
+        cap = total if limit is None else limit
+        return cap is None or used + n <= cap
+
+    lines: List[str] = ["Files:"]
+    used += budget.cost("Files:")
+    files_cap = None if total is None else int(total * budget.files_share)
+    reserve = budget.cost(f"... (+{len(files)} weitere)")
+    for i, rel in enumerate(files[:budget.max_files]):
+        c = budget.cost(f"- {rel}")
+        if not fits(c if i == len(files) - 1 else c + reserve, files_cap):
+            break
+        lines.append(f"- {rel}")
+        used += c
+        report["files"] += c
+        report["files_listed"] += 1
+    rest = len(files) - report["files_listed"]
+    if rest > 0:
+        more = f"... (+{rest} weitere)"
+        lines.append(more)
+        used += budget.cost(more)
+        report["files"] += budget.cost(more)
+
+    lines.append("\nSamples:")
+    used += budget.cost("\nSamples:")
+    skipped: List[Tuple[str, str]] = []
+    for i, (rel, text, is_body) in enumerate(samples):
+        if i >= budget.max_samples:
+            break
+        block = f"--- {rel} ---\n{text}" if is_body else text
+        c = budget.cost(block)
+        if fits(c):
+            lines.append(block)
+            used += c
+            report["samples"] += c
+            report["samples_full"] += 1
+            if is_body and included is not None:
+                included[rel] = text
+        elif is_body:
+            skipped.append((rel, text))
+
+    for rel, text in skipped:
+        header = f"--- {rel} (gekürzt) ---"
+        c = budget.cost(header)
+        if not fits(c):
+            break
+        head: List[str] = []
+        for ln in text.splitlines():
+            lc = budget.cost(ln)
+            if not fits(c + lc):
+                break
+            head.append(ln)
+            c += lc
+        if len(head) < MIN_HEAD_LINES:
+            continue
+        lines.append(header + "\n" + "\n".join(head))
+        used += c
+        report["heads"] += c
+        report["samples_truncated"] += 1
+
+    report["total"] = used
+    if total is not None:
+        report["budget"] = total
+    return "\n".join(lines), report
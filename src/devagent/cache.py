@@ -0,0 +1,102 @@
+from __future__ import annotations
+import os, json, time, hashlib, threading
+from typing import List, Optional
+from .constants import LLM_CACHE_DIR
+from .utils import atomic_write_text, json_load
+
+_stats_lock = threading.Lock()  # stats.json: read-modify-write der batch-Threads serialisieren
+
+class PlanCache:
+    """Inhaltsadressierter Cache für LLM-Plan-Antworten unter .devagent/cache/llm.
+
+    Schlüssel: sha256(model, system prompt, user prompt, schema hash). Gespeichert wird die rohe
+    'actions'-Liste, damit plan_hash bei einem Treffer identisch bleibt. Eviction: Einträge älter
+    als max_age_s, danach LRU (mtime = letzter Zugriff) bis max_bytes eingehalten sind.
+    """
+
+    def __init__(self, workspace: str, max_bytes: int = 64 * 1024 * 1024, max_age_s: int = 7 * 24 * 3600):
+        self.dir = os.path.join(os.path.realpath(workspace), LLM_CACHE_DIR)
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self._stats_path = os.path.join(self.dir, "stats.json")
+
+    @staticmethod
+    def key(model: str, system_prompt: str, user_prompt: str, schema_hash: str) -> str:
+        h = hashlib.sha256()
+        for part in (model, system_prompt, user_prompt, schema_hash):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[List[dict]]:
+        p = self._path(key)
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                rec = json.load(f)
+        except (OSError, ValueError):
+            self._count("misses")
+            return None
+        if time.time() - rec.get("created", 0) > self.max_age_s:
+            try: os.remove(p)
+            except FileNotFoundError: pass
+            self._count("misses")
+            return None
+        try:
+            os.utime(p)  # LRU: Zugriff merken
+        except FileNotFoundError:
+            pass  # zwischenzeitlich evicted (anderer Thread/Prozess); gelesen ist gelesen
+        self._count("hits")
+        return rec.get("actions") or []
+
+    def put(self, key: str, actions_raw: List[dict]) -> None:
+        os.makedirs(self.dir, exist_ok=True)
+        p = self._path(key)
+        tmp = f"{p}.{os.getpid()}.{threading.get_ident()}.tmp"  # parallele Jobs (batch)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"created": time.time(), "actions": actions_raw}, f, ensure_ascii=False)
+        os.replace(tmp, p)
+        self.evict()
+
+    def evict(self) -> int:
+        now = time.time()
+        entries = []
+        try:
+            it = os.scandir(self.dir)
+        except OSError:
+            return 0
+        with it:
+            for e in it:
+                if not e.name.endswith(".json") or e.name == "stats.json":
+                    continue
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+        removed = 0
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in sorted(entries):  # älteste Zugriffe zuerst
+            if total <= self.max_bytes and now - mtime <= self.max_age_s:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def totals(self) -> dict:
+        try:
+            return json_load(self._stats_path) or {"hits": 0, "misses": 0}
+        except (OSError, ValueError):
+            return {"hits": 0, "misses": 0}  # beschädigt/fremd geschrieben: Zähler neu beginnen
+
+    def _count(self, field: str) -> None:
+        with _stats_lock:
+            t = self.totals()
+            t[field] = t.get(field, 0) + 1
+            try:
+                atomic_write_text(self._stats_path, json.dumps(t, ensure_ascii=False, indent=2))
+            except OSError:
+                pass
@@ -1,75 +1,196 @@
 from __future__ import annotations
-import os, sys, yaml, json, typer, getpass
-from typing import Optional, List
+import os, sys, time, json, typer
+from typing import TYPE_CHECKING, Optional, List, Tuple
 from rich.console import Console
-from rich.panel import Panel
-from rich.syntax import Syntax
-from .config import load_config
-from .scanner import project_card
-from .llm import LLMClient
-from .planner import save_plan, load_plan, save_approval_code
-from .verifier import verify_plan
+from rich.markup import escape
+from typer.core import TyperGroup
+from .config import ConfigError, load_config, Config
 from .utils import is_git_repo, json_load, json_dump, rand_code
 from .constants import PREVIEW_CODE_FILE, PLAN_FILE, STATE_FILE
-from .executor import preview as preview_actions, execute as execute_actions
 from .audit import log_event
-from .repl import run_repl
-from .res import read_template
-from .creds import get_openrouter_key, set_openrouter_key, unset_openrouter_key, mask_key
+
+if TYPE_CHECKING:  # nur für Annotationen; zur Laufzeit importieren die Kommandos selbst
+    from .cache import PlanCache
+    from .schemas import Plan, Action
+
+# Subsysteme (httpx, pydantic, yaml, llm, executor, repl, ...) importiert jedes Kommando selbst,
+# damit z.B. 'approve' und 'logs' nicht den ganzen Importgraphen laden.
+# LLM-Clients bleiben als Modulattribute erreichbar (und per monkeypatch ersetzbar).
+_LAZY = {"LLMClient": ".llm", "AsyncLLMClient": ".llm"}
+
+def __getattr__(name: str):
+    mod = _LAZY.get(name)
+    if mod is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(mod, __package__), name)
+    globals()[name] = value
+    return value
 
 console = Console()
-app = typer.Typer(invoke_without_command=True, no_args_is_help=False)
 
-def _build_prompts(ws: str, goal: str):
+class _Group(TyperGroup):
+    """Fängt ungültige Config-Werte für alle Kommandos (auch REPL, batch, Headless) an einer Stelle."""
+
+    def invoke(self, ctx):
+        try:
+            return super().invoke(ctx)
+        except ConfigError as e:
+            where = f"{e.layer}, Schlüssel '{e.key}'" if e.key else e.layer
+            console.print(f"[red]Ungültige Konfiguration ({escape(where)}):[/red] {escape(e.reason)}")
+            console.print("[dim]'devagent config --explain' zeigt alle Schichten.[/dim]")
+            raise typer.Exit(2)
+
+app = typer.Typer(cls=_Group, invoke_without_command=True, no_args_is_help=False)
+
+def _build_prompts(ws: str, goal: str, headless: bool = False):
+    from .prompts import build_prompts, format_report
     cfg = load_config(ws)
-    system_prompt = read_template("system_plan.txt")
-    user_prompt = read_template("user_plan.txt")
-    card = project_card(ws, cfg.ignores)
-    user_prompt = user_prompt \
-        .replace("{{GOAL}}", goal)\
-        .replace("{{WORKSPACE}}", ws)\
-        .replace("{{ALLOWLIST}}", ", ".join(sorted(cfg.allow_commands)))\
-        .replace("{{HAS_GIT}}", str(is_git_repo(ws)))\
-        .replace("{{PROJECT_CARD}}", card)
+    system_prompt, user_prompt, report = build_prompts(ws, cfg, goal)
+    if headless:
+        typer.echo(format_report(report), err=True)  # stdout bleibt reines YAML/JSON
+    else:
+        console.print(f"[dim]{format_report(report)}[/dim]", highlight=False)
     return system_prompt, user_prompt, cfg
 
+def _plan_cache(ws: str, cfg: Config, no_cache: bool) -> Optional[PlanCache]:
+    if no_cache or not cfg.llm_cache:
+        return None
+    from .cache import PlanCache
+    return PlanCache(ws, max_bytes=cfg.llm_cache_max_mb * 1024 * 1024, max_age_s=int(cfg.llm_cache_max_age_h * 3600))
+
+def _client(ws: str, cfg: Config, model: str, cache: Optional[PlanCache]):
+    """Mit race_models: AsyncLLMClient, der nur Pläne akzeptiert, die verify_plan bestehen."""
+    cli = sys.modules[__name__]  # Lookup über __getattr__ (lazy, patchbar)
+    if not cfg.race_models:
+        return cli.LLMClient(model=model, workspace=ws, cfg=cfg, cache=cache)
+    from .verifier import verify_plan
+    has_git = is_git_repo(ws)
+    return cli.AsyncLLMClient([model] + cfg.race_models, workspace=ws, cfg=cfg, cache=cache,
+                          validate=lambda plan: verify_plan(plan, ws, cfg, has_git))
+
+def _generate(ws: str, cfg: Config, system_prompt: str, user_prompt: str, stream: bool,
+              out: Console = console, no_cache: bool = False) -> Tuple[Plan, str]:
+    client = _client(ws, cfg, cfg.model, _plan_cache(ws, cfg, no_cache))
+    if not stream:
+        plan, plan_hash = client.generate_plan(system_prompt, user_prompt)
+        _log_llm(ws, plan_hash, client, out)
+        return plan, plan_hash
+    # Streaming: jede fertige Aktion sofort prüfen und kurz anzeigen
+    from .executor import preview as preview_actions
+    from .schemas import Plan
+    from .verifier import verify_action
+    has_git = is_git_repo(ws)
+    t0 = time.perf_counter()
+    first: List[float] = []
+
+    def on_action(i: int, a: Action) -> None:
+        dt = time.perf_counter() - t0
+        if not first:
+            first.append(dt)
+        try:
+            it = preview_actions(Plan(actions=[a]), ws)[0]
+            what = f"[bold]{it.kind.upper()}[/bold] {it.relpath or ' '.join(it.cmd or [])} - {it.summary}"
+        except Exception as e:
+            what = f"[bold]{a.type.upper()}[/bold] {a.file or ''} ({e})"
+        out.print(f"[dim]+{dt:.2f}s[/dim] #{i+1} {what}", highlight=False)
+        for e in verify_action(i, a, ws, cfg, has_git):
+            out.print(f"[yellow] - {e}[/yellow]")
+
+    plan, plan_hash = client.generate_plan(system_prompt, user_prompt, stream=True, on_action=on_action)
+    ttfa = f"{first[0]:.2f}s" if first else "-"
+    out.print(f"[dim]Erste Aktion nach {ttfa}, Plan komplett nach {time.perf_counter() - t0:.2f}s[/dim]")
+    _log_llm(ws, plan_hash, client, out)
+    return plan, plan_hash
+
+def _log_llm(ws: str, plan_hash: str, client, out: Console) -> None:
+    stats = dict(getattr(client, "stats", None) or {})
+    if not stats:
+        return
+    log_event(ws, f"plan-{plan_hash}", "llm", stats)
+    if stats.get("cache") == "hit":
+        out.print("[dim]Plan aus dem LLM-Cache (--no-cache erzwingt eine neue Anfrage)[/dim]")
+
+def _plan_and_save(ws: str, goal: str, stream: Optional[bool], no_cache: bool = False) -> None:
+    from .planner import save_plan
+    from .verifier import verify_plan
+    system_prompt, user_prompt, cfg = _build_prompts(ws, goal)
+    plan, _ = _generate(ws, cfg, system_prompt, user_prompt, cfg.stream if stream is None else stream,
+                        no_cache=no_cache)
+    save_plan(ws, plan)
+    console.print("[green]Plan gespeichert:[/green] " + os.path.join(ws, PLAN_FILE))
+    errs = verify_plan(plan, ws, cfg, is_git_repo(ws))
+    if errs:
+        console.print("[yellow]Plan enthält Probleme:[/yellow]")
+        for e in errs: console.print(f" - {e}")
+    else:
+        console.print("[green]Plan OK[/green]")
+
 @app.callback()
 def main(
     ctx: typer.Context,
     workspace: str = typer.Option(".", "--workspace", "-w", help="Projektwurzel"),
     prompt: Optional[str] = typer.Option(None, "--prompt", "-p", help="Headless: Zielbeschreibung (Plan in YAML)"),
     output_format: str = typer.Option("yaml", "--output-format", "-o", help="text|yaml|json"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="LLM-Antwort-Cache umgehen"),
+    set_values: Optional[List[str]] = typer.Option(None, "--set", help="Config-Wert key=value (überschreibt Dateien und Umgebung)"),
 ):
     ws = os.path.realpath(workspace)
+    if set_values:
+        from .config import set_cli_overrides, parse_value
+        try:
+            set_cli_overrides(dict((k.strip(), parse_value(v)) for k, v in (x.split("=", 1) for x in set_values)))
+        except ValueError as e:
+            console.print(f"[red]--set: {escape(str(e))}[/red] (erwartet key=value)"); raise typer.Exit(2)
     if ctx.invoked_subcommand is not None:
         return
     if prompt is not None:
-        system_prompt, user_prompt, cfg = _build_prompts(ws, prompt)
-        client = LLMClient(model=cfg.model, workspace=ws)
-        plan, _ = client.generate_plan(system_prompt, user_prompt)
+        system_prompt, user_prompt, cfg = _build_prompts(ws, prompt, headless=True)
+        plan, _ = _generate(ws, cfg, system_prompt, user_prompt, cfg.stream, out=Console(stderr=True), no_cache=no_cache)
         if output_format == "json":
             typer.echo(json.dumps({"actions": [a.model_dump() for a in plan.actions]}, ensure_ascii=False, indent=2))
         elif output_format in ("yaml","text"):
+            import yaml
             out = {"actions": [a.model_dump() for a in plan.actions]}
             typer.echo(yaml.safe_dump(out, sort_keys=False, allow_unicode=True))
         else:
             typer.echo("unknown output-format", err=True); raise typer.Exit(2)
         raise typer.Exit()
     else:
+        from .repl import run_repl
         run_repl(ws); raise typer.Exit()
 
 @app.command()
-def scan(workspace: str = typer.Option(".", "--workspace", "-w", help="Projektwurzel")):
+def scan(
+    workspace: str = typer.Option(".", "--workspace", "-w", help="Projektwurzel"),
+    timings: bool = typer.Option(False, "--timings", help="Kalten Parallel-Scan messen und Zeiten je Unterbaum zeigen"),
+):
+    from .scanner import build_card, scan_tree_parallel
     ws = os.path.realpath(workspace)
     cfg = load_config(ws)
-    card = project_card(ws, cfg.ignores)
-    console.print(Panel(card, title="Project Card (gekürzt)"))
+    if timings:
+        from rich.table import Table
+        t0 = time.perf_counter()
+        files, subtrees = scan_tree_parallel(ws, cfg.ignores, cfg.scan_workers)
+        table = Table("subtree", "files", "seconds")
+        for t in subtrees:
+            table.add_row(t["subtree"], str(t["files"]), f"{t['seconds']:.3f}")
+        console.print(table)
+        console.print(f"{len(files)} Dateien in {time.perf_counter() - t0:.3f}s")
+        return
+    from rich.panel import Panel
+    from .budget import CardBudget
+    from .prompts import format_report
+    budget = CardBudget(estimator=cfg.token_estimator, max_files=cfg.card_max_files, max_samples=cfg.card_max_samples)
+    card, report = build_card(ws, cfg.ignores, workers=cfg.scan_workers, use_git=cfg.scan_use_git, budget=budget)
+    console.print(Panel(card, title="Project Card (gekürzt)", subtitle=format_report(report)))
 
 @app.command()
 def summarize(workspace: str = typer.Option(".", "--workspace", "-w")):
+    from .scanner import project_card
     ws = os.path.realpath(workspace)
     cfg = load_config(ws)
-    card = project_card(ws, cfg.ignores)
+    card = project_card(ws, cfg.ignores, workers=cfg.scan_workers, use_git=cfg.scan_use_git)
     console.print(card)
 
 @app.command()
@@ -77,102 +198,112 @@ def plan(
     goal: str = typer.Option(..., "--goal", "-g", help="Zielbeschreibung für Änderungen"),
     workspace: str = typer.Option(".", "--workspace", "-w"),
     add_dir: List[str] = typer.Option([], "--add-dir", help="Zusätzliche Read-Only-Verzeichnisse"),
+    stream: Optional[bool] = typer.Option(None, "--stream/--no-stream", help="Antwort streamen (Default: Config.stream)"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="LLM-Antwort-Cache umgehen"),
 ):
     ws = os.path.realpath(workspace)
-    system_prompt, user_prompt, cfg = _build_prompts(ws, goal)
-    client = LLMClient(model=cfg.model, workspace=ws)
-    plan, _ = client.generate_plan(system_prompt, user_prompt)
-    save_plan(ws, plan)
-    console.print("[green]Plan gespeichert:[/green] " + os.path.join(ws, PLAN_FILE))
-    errs = verify_plan(plan, ws, cfg, is_git_repo(ws))
-    if errs:
-        console.print("[yellow]Plan enthält Probleme:[/yellow]")
-        for e in errs: console.print(f" - {e}")
-    else:
-        console.print("[green]Plan OK[/green]")
+    _plan_and_save(ws, goal, stream, no_cache)
 
 @app.command()
 def lint_fix(
     workspace: str = typer.Option(".", "--workspace", "-w"),
     hint: str = typer.Option("", "--hint", help="Zusätzlicher Hinweis für den Fix-Plan"),
+    stream: Optional[bool] = typer.Option(None, "--stream/--no-stream", help="Antwort streamen (Default: Config.stream)"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="LLM-Antwort-Cache umgehen"),
 ):
+    from .res import read_template
     ws = os.path.realpath(workspace)
     base_goal = read_template("goal_lint_fix.txt")
     goal = base_goal + ("\n\nZusätzlicher Hinweis:\n" + hint if hint else "")
-    system_prompt, user_prompt, cfg = _build_prompts(ws, goal)
-    client = LLMClient(model=cfg.model, workspace=ws)
-    plan, _ = client.generate_plan(system_prompt, user_prompt)
-    save_plan(ws, plan)
-    console.print("[green]Plan gespeichert:[/green] " + os.path.join(ws, PLAN_FILE))
-    errs = verify_plan(plan, ws, cfg, is_git_repo(ws))
-    if errs:
-        console.print("[yellow]Plan enthält Probleme:[/yellow]")
-        for e in errs: console.print(f" - {e}")
-    else:
-        console.print("[green]Plan OK[/green]")
+    _plan_and_save(ws, goal, stream, no_cache)
 
 @app.command()
 def test(
     workspace: str = typer.Option(".", "--workspace", "-w"),
     hint: str = typer.Option("", "--hint", help="Zusätzlicher Hinweis für den Test-Plan"),
+    stream: Optional[bool] = typer.Option(None, "--stream/--no-stream", help="Antwort streamen (Default: Config.stream)"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="LLM-Antwort-Cache umgehen"),
 ):
+    from .res import read_template
     ws = os.path.realpath(workspace)
     base_goal = read_template("goal_test.txt")
     goal = base_goal + ("\n\nZusätzlicher Hinweis:\n" + hint if hint else "")
-    system_prompt, user_prompt, cfg = _build_prompts(ws, goal)
-    client = LLMClient(model=cfg.model, workspace=ws)
-    plan, _ = client.generate_plan(system_prompt, user_prompt)
-    save_plan(ws, plan)
-    console.print("[green]Plan gespeichert:[/green] " + os.path.join(ws, PLAN_FILE))
-    errs = verify_plan(plan, ws, cfg, is_git_repo(ws))
-    if errs:
-        console.print("[yellow]Plan enthält Probleme:[/yellow]")
-        for e in errs: console.print(f" - {e}")
-    else:
-        console.print("[green]Plan OK[/green]")
+    _plan_and_save(ws, goal, stream, no_cache)
 
 @app.command()
 def conflicts(
     workspace: str = typer.Option(".", "--workspace", "-w"),
     hint: str = typer.Option("", "--hint", help="Zusätzlicher Hinweis für den Konflikt-Plan"),
+    stream: Optional[bool] = typer.Option(None, "--stream/--no-stream", help="Antwort streamen (Default: Config.stream)"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="LLM-Antwort-Cache umgehen"),
 ):
+    from .res import read_template
     ws = os.path.realpath(workspace)
     base_goal = read_template("goal_conflicts.txt")
     goal = base_goal + ("\n\nZusätzlicher Hinweis:\n" + hint if hint else "")
-    system_prompt, user_prompt, cfg = _build_prompts(ws, goal)
-    client = LLMClient(model=cfg.model, workspace=ws)
-    plan, _ = client.generate_plan(system_prompt, user_prompt)
-    save_plan(ws, plan)
-    console.print("[green]Plan gespeichert:[/green] " + os.path.join(ws, PLAN_FILE))
-    errs = verify_plan(plan, ws, cfg, is_git_repo(ws))
-    if errs:
-        console.print("[yellow]Plan enthält Probleme:[/yellow]")
-        for e in errs: console.print(f" - {e}")
-    else:
-        console.print("[green]Plan OK[/green]")
+    _plan_and_save(ws, goal, stream, no_cache)
 
 @app.command()
 def review(
     workspace: str = typer.Option(".", "--workspace", "-w"),
     hint: str = typer.Option("", "--hint", help="Zusätzlicher Hinweis für das Review"),
+    stream: Optional[bool] = typer.Option(None, "--stream/--no-stream", help="Antwort streamen (Default: Config.stream)"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="LLM-Antwort-Cache umgehen"),
 ):
+    from .res import read_template
     ws = os.path.realpath(workspace)
     base_goal = read_template("goal_review.txt")
     goal = base_goal + ("\n\nZusätzlicher Hinweis:\n" + hint if hint else "")
-    system_prompt, user_prompt, cfg = _build_prompts(ws, goal)
-    client = LLMClient(model=cfg.model, workspace=ws)
-    plan, _ = client.generate_plan(system_prompt, user_prompt)
-    save_plan(ws, plan)
-    console.print("[green]Plan gespeichert:[/green] " + os.path.join(ws, PLAN_FILE))
-    errs = verify_plan(plan, ws, cfg, is_git_repo(ws))
-    if errs:
-        console.print("[yellow]Plan enthält Probleme:[/yellow]")
-        for e in errs: console.print(f" - {e}")
-    else:
-        console.print("[green]Plan OK[/green]")
+    _plan_and_save(ws, goal, stream, no_cache)
 
 @app.command()
-def preview(workspace: str = typer.Option(".", "--workspace", "-w")):
+def batch(
+    jobs_file: str = typer.Argument(..., help="JSONL mit {workspace, goal, template} je Zeile"),
+    out: str = typer.Option("devagent-batch", "--out", help="Zielordner für Pläne und summary.json"),
+    concurrency: int = typer.Option(4, "--concurrency", "-j", help="Parallele Jobs je Stufe (scan, llm)"),
+    verify_workers: int = typer.Option(2, "--verify-workers"),
+    no_cache: bool = typer.Option(False, "--no-cache", help="LLM-Antwort-Cache umgehen"),
+):
+    """Viele headless Pläne in einem Prozess: scan -> llm -> verify als Pipeline."""
+    from .batch import load_jobs, run_batch
+    from rich.table import Table
+    try:
+        jobs = load_jobs(jobs_file)
+    except (OSError, ValueError) as e:
+        console.print(f"[red]{e}[/red]"); raise typer.Exit(2)
+    for ws in dict.fromkeys(j.workspace for j in jobs):
+        load_config(ws)  # ungültige Config vorab melden statt pro Job
+
+    def on_result(r) -> None:
+        mark = "[green]OK[/green]" if r.ok else "[red]FEHLER[/red]"
+        console.print(f"{mark} #{r.job.line} {r.job.workspace} ({r.actions} Aktionen)", highlight=False)
+        for e in r.errors: console.print(f"[yellow] - {e}[/yellow]")
+
+    results, summary = run_batch(
+        jobs, os.path.abspath(out),
+        lambda ws, cfg: _client(ws, cfg, cfg.model, _plan_cache(ws, cfg, no_cache)),
+        concurrency=max(1, concurrency), verify_workers=max(1, verify_workers), on_result=on_result,
+    )
+    table = Table("stage", "n", "p50 s", "p95 s", "max s")
+    for stage, st in summary["stages"].items():
+        table.add_row(stage, str(st["n"]), f"{st['p50']:.3f}", f"{st['p95']:.3f}", f"{st['max']:.3f}")
+    console.print(table)
+    console.print(f"{summary['ok']}/{summary['jobs']} ok in {summary['wall_s']:.2f}s "
+                  f"({summary['jobs_per_min']} Jobs/min) -> {os.path.join(os.path.abspath(out), 'summary.json')}")
+    if summary["failed"]:
+        raise typer.Exit(1)
+
+@app.command()
+def preview(
+    workspace: str = typer.Option(".", "--workspace", "-w"),
+    patch_file: bool = typer.Option(False, "--patch-file", help="Diffs nach .devagent/preview.patch schreiben statt anzeigen"),
+    full: bool = typer.Option(False, "--full", help="Alle Hunks anzeigen (ohne Zeilenbudget)"),
+):
+    from rich.panel import Panel
+    from .executor import preview as preview_actions
+    from .planner import load_plan, save_approval_code
+    from .render import PreviewRenderer, write_patch
+    from .verifier import verify_plan
     ws = os.path.realpath(workspace)
     cfg = load_config(ws)
     plan = load_plan(ws)
@@ -180,12 +311,17 @@ def preview(workspace: str = typer.Option(".", "--workspace", "-w")):
     if errs:
         console.print("[red]Plan-Fehler:[/red]")
         for e in errs: console.print(" - " + e); raise typer.Exit(2)
-    items = preview_actions(plan, ws)
-    for it in items:
-        header = f"[bold]{it.kind.upper()}[/bold] {it.relpath or ''} - {it.summary}"
-        console.rule(header)
-        if it.cmd: console.print(" ".join(it.cmd))
-        if it.diff: console.print(Syntax(it.diff, "diff", theme="ansi_dark"))
+    t0 = time.perf_counter()
+    items = preview_actions(plan, ws, cfg)
+    diff_s = time.perf_counter() - t0
+    big = 1 << 62
+    renderer = PreviewRenderer(console, big if full else cfg.preview_file_lines, big if full else cfg.preview_total_lines)
+    renderer.render(items, headers_only=patch_file)
+    if patch_file:
+        console.print(f"Diffs geschrieben: {write_patch(ws, items)}")
+    elif renderer.collapsed:
+        console.print(f"[dim]Eingeklappt: {', '.join(renderer.collapsed)} (--full oder --patch-file zeigt alles)[/dim]")
+    console.print(f"[dim]{renderer.summary(diff_s)}[/dim]", highlight=False)
     code = rand_code()
     save_approval_code(ws, code)
     console.print(Panel(f"Bestätigungscode:\n[bold]{code}[/bold]\nNutze: devagent approve -w {ws} --code {code}", title="Approve"))
@@ -203,8 +339,18 @@ def approve(code: str = typer.Option(..., "--code"), workspace: str = typer.Opti
     json_dump(os.path.join(ws, STATE_FILE), {"approved_code": code.strip()})
     console.print("[green]Plan freigegeben.[/green] Jetzt 'execute' ausführen.")
 
+def _echo_output(cmd: List[str], stream: str, line: str) -> None:
+    name = os.path.basename(cmd[0]) if cmd else "?"
+    style = "red" if stream == "stderr" else "dim"
+    console.print(f"[{style}]{name}|[/{style}] {escape(line)}", highlight=False)
+
 @app.command()
-def execute(workspace: str = typer.Option(".", "--workspace", "-w")):
+def execute(
+    workspace: str = typer.Option(".", "--workspace", "-w"),
+    serial: bool = typer.Option(False, "--serial", help="Aktionen strikt nacheinander ausführen"),
+):
+    from .executor import execute as execute_actions, change_summary
+    from .planner import load_plan
     ws = os.path.realpath(workspace)
     cfg = load_config(ws)
     state = json_load(os.path.join(ws, STATE_FILE)) or {}
@@ -212,10 +358,18 @@ def execute(workspace: str = typer.Option(".", "--workspace", "-w")):
     if not approved:
         console.print("[red]Kein Approve gefunden. Erst 'preview' und 'approve'.[/red]"); raise typer.Exit(2)
     plan = load_plan(ws)
-    ok, msgs = execute_actions(plan, ws, approved, require_git_for_patches=cfg.enforce_git_for_patches)
+    report: dict = {}
+    ok, msgs = execute_actions(plan, ws, approved, require_git_for_patches=cfg.enforce_git_for_patches,
+                               workers=1 if serial else cfg.execute_workers, cfg=cfg,
+                               on_output=_echo_output, report=report)
     for m in msgs:
         console.print(m)
         log_event(ws, approved, "step", {"msg": m})
+    if report:
+        console.print("Änderungen:")
+        for line in change_summary(report):
+            console.print(line, highlight=False)
+        log_event(ws, approved, "changes", {rel: list(v) for rel, v in report.items()})
     if ok:
         console.print("[green]Ausführung abgeschlossen.[/green]")
         log_event(ws, approved, "done", {})
@@ -225,6 +379,25 @@ def execute(workspace: str = typer.Option(".", "--workspace", "-w")):
         console.print("[red]Fehler. Siehe Logs.[/red]")
         log_event(ws, approved, "failed", {})
 
+@app.command()
+def rollback(
+    run_id: str = typer.Argument(..., help="run_id der Ausführung (siehe 'logs')"),
+    workspace: str = typer.Option(".", "--workspace", "-w"),
+    force: bool = typer.Option(False, "--force", help="Auch zurücksetzen, wenn Dateien nach dem Lauf geändert wurden"),
+):
+    """Setzt die Dateien, die eine Ausführung geändert hat, auf den Stand davor zurück.
+    Aktuelle Fassungen landen unter .devagent/trash/<run_id>/."""
+    from .snapshot import SnapshotError, rollback as rollback_run
+    ws = os.path.realpath(workspace)
+    try:
+        msgs = rollback_run(ws, run_id, force=force)
+    except (SnapshotError, OSError, ValueError) as e:
+        console.print(f"[red]Rollback fehlgeschlagen:[/red] {e}"); raise typer.Exit(2)
+    for m in msgs:
+        console.print(m)
+    log_event(ws, run_id, "rollback", {"paths": len(msgs)})
+    console.print(f"[green]Rollback abgeschlossen[/green] ({len(msgs)} Pfade).")
+
 @app.command()
 def logs(workspace: str = typer.Option(".", "--workspace", "-w"), run_id: str = typer.Option(None, "--run-id")):
     ws = os.path.realpath(workspace)
@@ -246,8 +419,32 @@ def logs(workspace: str = typer.Option(".", "--workspace", "-w"), run_id: str =
         table.add_row(rid, str(size))
     console.print(table)
 
+@app.command("config")
+def config_cmd(
+    workspace: str = typer.Option(".", "--workspace", "-w"),
+    explain: bool = typer.Option(False, "--explain", help="Zu jedem Wert die Schicht zeigen, die ihn gesetzt hat"),
+):
+    from dataclasses import fields
+    from rich.table import Table
+    from .config import resolve_config, config_paths
+    ws = os.path.realpath(workspace)
+    cfg, sources = resolve_config(ws)
+    table = Table("key", "value", "source") if explain else Table("key", "value")
+    for f in fields(cfg):
+        value = getattr(cfg, f.name)
+        text = escape(json.dumps(sorted(value) if isinstance(value, set) else value, ensure_ascii=False))
+        row = [f.name, text] + ([escape(sources.get(f.name, "default"))] if explain else [])
+        table.add_row(*row)
+    console.print(table)
+    if explain:
+        for layer, path in config_paths(ws):
+            state = "gelesen" if os.path.isfile(path) else "nicht vorhanden"
+            console.print(f"{layer}: {escape(path)} ({state})")
+        console.print("env: DEVAGENT_<FELD> (z.B. DEVAGENT_HTTP_TIMEOUT=30), cli: --set key=value")
+
 @app.command()
 def repl(workspace: str = typer.Option(".", "--workspace", "-w")):
+    from .repl import run_repl
     ws = os.path.realpath(workspace)
     run_repl(ws)
 
@@ -257,6 +454,7 @@ def key_cmd(
     action: str = typer.Argument(..., metavar="[set|show|unset]"),
     scope: str = typer.Option("user", "--scope", help="user|project"),
 ):
+    from .creds import get_openrouter_key, set_openrouter_key, unset_openrouter_key, mask_key
     ws = os.path.realpath(workspace)
     scope = scope.lower().strip()
     if scope not in ("user","project"):
@@ -271,6 +469,7 @@ def key_cmd(
         console.print("[green]Key entfernt[/green]" if ok else "[yellow]Kein Key vorhanden[/yellow]")
         return
     if action == "set":
+        import getpass
         console.print("Gib deinen OpenRouter API-Key ein (wird nicht angezeigt):")
         key = getpass.getpass("Key: ")
         try:
@@ -1,7 +1,8 @@
 from __future__ import annotations
-import os, tomllib
-from dataclasses import dataclass, field
-from typing import List, Set
+import copy, os, tomllib, typing
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, List, Optional, Set, Tuple
+from .constants import OPENROUTER_URL
 
 DEFAULT_ALLOW = [
     "pytest", "python", "ruff", "black", "mypy",
@@ -16,7 +17,7 @@ class Config:
     disallow_commands: Set[str] = field(default_factory=set)
     max_actions: int = 20
     net_allowed: bool = False
-    enforce_git_for_patches: bool = True
+    enforce_git_for_patches: bool = False  # Patches laufen in-process; git apply nur als Fallback
     ignores: List[str] = field(default_factory=list)
 
     # Phase-1-Erweiterungen
@@ -24,43 +25,188 @@ class Config:
     dangerously_skip_permissions: bool = False
     extra_workspaces: List[str] = field(default_factory=list)  # read-only Kontext
 
-def _first_existing(paths: list[str]) -> str | None:
-    for p in paths:
-        if os.path.exists(p):
-            return p
-    return None
-
-def load_config(workspace: str) -> Config:
-    paths = []
-    xdg = os.environ.get("XDG_CONFIG_HOME")
-    if xdg:
-        paths.append(os.path.join(xdg, "devagent", "config.toml"))
-    paths.append(os.path.join(workspace, ".devagent", "config.toml"))
-
-    data = {}
-    p = _first_existing(paths)
-    if p:
-        with open(p, "rb") as f:
-            data = tomllib.load(f)
+    # Performance
+    scan_workers: int = 0  # Threads für den Scan, 0 = automatisch
+    scan_use_git: bool = True  # Dateiliste via 'git ls-files' statt Walk, wenn Git-Repo
+    context_tokens: int = 32000  # Kontextfenster, falls Modell nicht in model_context; 0 = feste Kartenlimits
+    model_context: Dict[str, int] = field(default_factory=dict)  # Modell-ID -> Kontextfenster
+    response_tokens: int = 4096  # Reserve für die Antwort
+    token_estimator: str = "chars"  # chars|words
+    card_files_share: float = 0.3  # max. Anteil der Karte für die Dateiliste
+    card_max_files: int = 400
+    card_max_samples: int = 60
+    card_delta: bool = True  # REPL: Folge-Turns senden nur das Delta zur letzten Vollkarte
+    card_delta_max_share: float = 0.5  # größeres Delta (Anteil der Vollkarte) => neue Vollkarte
+    stream: bool = False  # LLM-Antwort per SSE streamen
+    api_url: str = OPENROUTER_URL
+    http_timeout: float = 60.0  # Lese-Timeout pro Chunk
+    http_connect_timeout: float = 10.0
+    http_max_connections: int = 10
+    http_max_keepalive: int = 5
+    http_keepalive_expiry: float = 60.0
+    http2: bool = False  # benötigt das optionale Paket 'h2'
+    llm_cache: bool = True  # Plan-Antworten unter .devagent/cache/llm wiederverwenden
+    llm_cache_max_mb: int = 64
+    llm_cache_max_age_h: float = 168.0
+    # Racing/Hedging über mehrere Modelle
+    race_models: List[str] = field(default_factory=list)
+    hedge: bool = False  # nächstes Modell erst nach p95-Latenz des vorherigen starten
+    hedge_delay_s: float = 20.0  # Fallback, solange keine Latenzstatistik vorliegt
+    preview_file_lines: int = 200  # Preview: angezeigte Diff-Zeilen je Datei, Rest eingeklappt
+    preview_total_lines: int = 1500  # Preview: angezeigte Diff-Zeilen gesamt
+    diff_max_lines: int = 50000  # Preview: darüber (alt + neu) nur eine Zusammenfassung statt Diff
+    snapshot_mode: str = "ref"  # ref (private Ref bzw. Dateikopien)|commit (altes add+commit)|off
+    snapshot_keep: int = 20  # so viele Snapshots (Ref/Dateikopien + Manifest) bleiben für rollback
+    patch_engine: str = "inprocess"  # inprocess|git (git: aufeinanderfolgende Patches als ein git apply)
+    execute_workers: int = 4  # unabhängige Aktionen parallel ausführen, 1 = strikt seriell
+    run_timeout_s: float = 1800.0  # Default-Timeout für run-Schritte
+    run_timeouts: Dict[str, float] = field(default_factory=dict)  # Befehl (argv[0]) -> Timeout
+    run_parallel_commands: List[str] = field(default_factory=list)  # argv[0], die gleichzeitig laufen dürfen (z.B. ruff, mypy)
+    run_abort_patterns: List[str] = field(default_factory=list)  # Regex => run-Schritt sofort abbrechen
+    run_output_head: int = 100  # Zeilen je Stream, die im Ergebnis/Audit-Log bleiben
+    run_output_tail: int = 200
+    # Request-Scheduler (prozessweit, für alle LLM-Aufrufe)
+    llm_max_concurrency: int = 4
+    llm_rate_per_min: float = 0.0  # Token-Bucket-Rate, 0 = unbegrenzt
+    llm_burst: int = 4
+    llm_max_retries: int = 4  # bei 408/429/5xx und Verbindungsfehlern
+    llm_backoff_s: float = 1.0  # Basis für exponentielles Backoff (mit Jitter)
+    llm_backoff_max_s: float = 60.0  # Obergrenze, auch für Retry-After
+    hook_timeout_s: float = 5.0  # Verzeichnis-Hooks (.devagent/hooks)
+    hook_workers: int = 8  # Threads für parallel_safe-Hooks
 
+# Schichten, spätere gewinnen: Defaults -> $XDG_CONFIG_HOME/devagent/config.toml
+# -> <workspace>/.devagent/config.toml -> DEVAGENT_<FELD> (Umgebung) -> CLI (--set key=value).
+# Ergebnis je Prozess gemerkt; Schlüssel sind mtime/Größe der Dateien, die DEVAGENT_*-Umgebung
+# und die CLI-Werte. load_config liefert Kopien, Aufrufer dürfen sie ändern.
+
+ENV_PREFIX = "DEVAGENT_"
+Sources = Dict[str, str]
+
+_HINTS = typing.get_type_hints(Config)
+_FIELDS = {f.name for f in fields(Config)}
+_cli_overrides: Dict[str, Any] = {}
+_memo: Dict[tuple, Tuple[Config, Sources]] = {}
+
+class ConfigError(ValueError):
+    """Ungültiger Wert in einer Schicht; layer und key benennen die Quelle (key leer: ganze Datei)."""
+
+    def __init__(self, layer: str, key: str, reason: str):
+        super().__init__(f"Config {layer}: {key}: {reason}" if key else f"Config {layer}: {reason}")
+        self.layer, self.key, self.reason = layer, key, reason
+
+def _xdg_config_home() -> str:
+    base = os.environ.get("XDG_CONFIG_HOME")
+    if base:
+        return base
+    return os.path.join(os.path.expanduser("~"), ".config")
+
+def config_paths(workspace: str) -> List[Tuple[str, str]]:
+    """(Schicht, Pfad) der Konfigurationsdateien, in Auswertungsreihenfolge."""
+    return [("xdg", os.path.join(_xdg_config_home(), "devagent", "config.toml")),
+            ("project", os.path.join(os.path.realpath(workspace), ".devagent", "config.toml"))]
+
+def _bool(value: Any) -> bool:
+    if isinstance(value, str):
+        v = value.strip().lower()
+        if v in ("1", "true", "yes", "on"):
+            return True
+        if v in ("0", "false", "no", "off", ""):
+            return False
+        raise ValueError(f"kein Wahrheitswert: {value!r}")
+    return bool(value)
+
+_SCALARS = {bool: _bool, int: int, float: float, str: str}
+
+def _items(value: Any) -> list:
+    if isinstance(value, str):  # Umgebung/CLI: "a,b"
+        return [x.strip() for x in value.split(",") if x.strip()]
+    if not isinstance(value, (list, tuple, set)):
+        raise ValueError(f"Liste erwartet, nicht {type(value).__name__}")
+    return list(value)
+
+def _pairs(value: Any) -> list:
+    if isinstance(value, str):  # Umgebung/CLI: "k=v,k2=v2"
+        return [tuple(x.split("=", 1)) for x in _items(value) if "=" in x]
+    if not isinstance(value, dict):
+        raise ValueError(f"Tabelle erwartet, nicht {type(value).__name__}")
+    return list(value.items())
+
+def coerce(name: str, value: Any) -> Any:
+    """Wert für das Config-Feld name in den Feldtyp umwandeln (ValueError bei unpassendem Wert)."""
+    hint = _HINTS[name]
+    origin, args = typing.get_origin(hint), typing.get_args(hint)
+    if origin in (list, set):
+        conv = _SCALARS[args[0]]
+        items = [conv(x) for x in _items(value)]
+        return set(items) if origin is set else items
+    if origin is dict:
+        kconv, vconv = _SCALARS[args[0]], _SCALARS[args[1]]
+        return {kconv(k): vconv(v) for k, v in _pairs(value)}
+    return _SCALARS[hint](value)
+
+def parse_value(raw: str) -> Any:
+    """TOML-Literal ('7', 'true', '["a"]'), sonst der Text selbst."""
+    try:
+        return tomllib.loads(f"v = {raw}")["v"]
+    except tomllib.TOMLDecodeError:
+        return raw
+
+def set_cli_overrides(values: Dict[str, Any]) -> None:
+    """Oberste Schicht für alle folgenden load_config-Aufrufe im Prozess (CLI-Option --set)."""
+    unknown = sorted(set(values) - _FIELDS)
+    if unknown:
+        raise ValueError(f"Unbekannte Config-Felder: {', '.join(unknown)}")
+    _cli_overrides.clear()
+    _cli_overrides.update(values)
+
+def _stat(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def _apply(cfg: Config, sources: Sources, layer: str, data: Dict[str, Any]) -> None:
+    for key, value in data.items():
+        if key not in _FIELDS:
+            continue  # unbekannte Schlüssel (z.B. von neueren Versionen) ignorieren
+        try:
+            setattr(cfg, key, coerce(key, value))
+        except (ValueError, TypeError, KeyError) as e:
+            raise ConfigError(layer, key, str(e)) from None
+        sources[key] = layer
+
+def _resolve(files: List[Tuple[str, str, Optional[Tuple[int, int]]]],
+             env: Dict[str, str], overrides: Dict[str, Any]) -> Tuple[Config, Sources]:
     cfg = Config()
-    # einfache Zuordnungen
-    if "model" in data: cfg.model = str(data["model"])
-    if "max_actions" in data: cfg.max_actions = int(data["max_actions"])
-    if "net_allowed" in data: cfg.net_allowed = bool(data["net_allowed"])
-    if "enforce_git_for_patches" in data: cfg.enforce_git_for_patches = bool(data["enforce_git_for_patches"])
-    if "ignores" in data and isinstance(data["ignores"], list): cfg.ignores = [str(x) for x in data["ignores"]]
-
-    # Sets
-    if "allow_commands" in data and isinstance(data["allow_commands"], list):
-        cfg.allow_commands = set(str(x) for x in data["allow_commands"])
-    if "disallow_commands" in data and isinstance(data["disallow_commands"], list):
-        cfg.disallow_commands = set(str(x) for x in data["disallow_commands"])
-
-    # Phase-1
-    if "permission_mode" in data: cfg.permission_mode = str(data["permission_mode"])
-    if "dangerously_skip_permissions" in data: cfg.dangerously_skip_permissions = bool(data["dangerously_skip_permissions"])
-    if "extra_workspaces" in data and isinstance(data["extra_workspaces"], list):
-        cfg.extra_workspaces = [str(x) for x in data["extra_workspaces"]]
-
-    return cfg
+    sources: Sources = {}
+    for layer, path, st in files:
+        if st is None:
+            continue
+        with open(path, "rb") as f:
+            try:
+                data = tomllib.load(f)
+            except tomllib.TOMLDecodeError as e:
+                raise ConfigError(f"{layer}:{path}", "", f"kein gültiges TOML ({e})") from None
+        _apply(cfg, sources, f"{layer}:{path}", data)
+    for var, raw in env.items():
+        _apply(cfg, sources, f"env:{var}", {var[len(ENV_PREFIX):].lower(): parse_value(raw)})
+    _apply(cfg, sources, "cli", overrides)
+    return cfg, sources
+
+def resolve_config(workspace: str, overrides: Optional[Dict[str, Any]] = None) -> Tuple[Config, Sources]:
+    """(Config, {feld: schicht}) für Felder, die nicht auf dem Default stehen."""
+    ov = {**_cli_overrides, **(overrides or {})}
+    files = [(layer, p, _stat(p)) for layer, p in config_paths(workspace)]
+    env = {k: v for k, v in os.environ.items() if k.startswith(ENV_PREFIX) and k[len(ENV_PREFIX):].lower() in _FIELDS}
+    key = (tuple(files), tuple(sorted(env.items())), repr(sorted(ov.items())))
+    hit = _memo.get(key)
+    if hit is None:
+        if len(_memo) >= 64:
+            _memo.clear()
+        hit = _memo[key] = _resolve(files, env, ov)
+    return copy.deepcopy(hit[0]), dict(hit[1])
+
+def load_config(workspace: str, overrides: Optional[Dict[str, Any]] = None) -> Config:
+    return resolve_config(workspace, overrides)[0]
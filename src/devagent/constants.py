@@ -6,9 +6,23 @@ SENSITIVE_NAMES = [".env", ".env.local", "id_rsa", "id_ed25519", "secrets", "cre
 MAX_FILE_BYTES = 256 * 1024  # 256 KiB pro Datei in der Projektkarte
 
 PREVIEW_CODE_FILE = ".devagent/approval_code.txt"
-PLAN_FILE = ".devagent/plan.yaml"
+PLAN_FILE = ".devagent/plan.json"
+LEGACY_PLAN_FILE = ".devagent/plan.yaml"  # nur noch gelesen
+BLOBS_DIR = ".devagent/blobs"
+PREVIEW_PATCH_FILE = ".devagent/preview.patch"
 STATE_FILE = ".devagent/state.json"
 LOG_DIR = ".devagent/logs"
 TRASH_DIR = ".devagent/trash"
 SESSIONS_DIR = ".devagent/sessions"
 HOOKS_DIR = ".devagent/hooks"
+INDEX_FILE = ".devagent/index.json"
+HEADS_DIR = ".devagent/cache/heads"
+IGNORE_FILE = ".devagent/ignore"
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+LLM_CACHE_DIR = ".devagent/cache/llm"
+LATENCY_FILE = ".devagent/cache/latency.json"
+HOOK_MANIFEST = ".devagent/hooks/hooks.toml"
+HOOK_BLOBS_DIR = ".devagent/cache/hook-blobs"
+SNAPSHOT_DIR = ".devagent/snapshots"
+SNAPSHOT_REF_PREFIX = "refs/devagent/snapshots/"
+DIFF_CACHE_DIR = ".devagent/cache/diff"
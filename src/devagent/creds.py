@@ -1,6 +1,6 @@
 from __future__ import annotations
 import os, stat, tomllib
-from typing import Literal, Optional
+from typing import Dict, Literal, Optional, Tuple
 
 def _xdg_config_home() -> str:
     base = os.environ.get("XDG_CONFIG_HOME")
@@ -39,17 +39,29 @@ def _toml_save(path: str, data: dict) -> None:
         f.writelines(lines)
     _chmod_600(path)
 
+# path -> ((mtime_ns, size), key); ein stat pro Aufruf statt TOML-Parse
+_KEY_CACHE: Dict[str, Tuple[Tuple[int, int], Optional[str]]] = {}
+
 def _read_key_from_file(path: str) -> Optional[str]:
-    if not os.path.exists(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        _KEY_CACHE.pop(path, None)
         return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    hit = _KEY_CACHE.get(path)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+    key: Optional[str] = None
     try:
         data = _toml_load(path)
-        key = data.get("openrouter_api_key")
-        if isinstance(key, str) and key.strip():
-            return key.strip()
+        k = data.get("openrouter_api_key")
+        if isinstance(k, str) and k.strip():
+            key = k.strip()
     except Exception:
-        return None
-    return None
+        key = None
+    _KEY_CACHE[path] = (stamp, key)
+    return key
 
 def get_openrouter_key(workspace: str) -> Optional[str]:
     k = os.environ.get("OPENROUTER_API_KEY")
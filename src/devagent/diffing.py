@@ -0,0 +1,304 @@
+from __future__ import annotations
+import hashlib, json, os, threading
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+from .constants import DIFF_CACHE_DIR
+
+# Zeilen-Diff für Preview und Ausführungsbericht: Zeilen werden auf Ints abgebildet,
+# gemeinsame Präfixe/Suffixe abgeschnitten, eindeutige Zeilen (Patience) als Anker genommen und
+# die Lücken mit Myers (O(ND)) gefüllt. Übersteigt eine Lücke MAX_COST Edits (typisch: viele
+# doppelte Zeilen, also keine Anker), läuft Myers fensterweise entlang der Diagonale weiter; nur
+# Fenster mit mehr als WINDOW/2 Edits werden als Ersetzung ausgegeben (korrekt, nur nicht minimal).
+# Über max_lines gibt es nur eine Zusammenfassung.
+
+MAX_COST = 1000
+MAX_DEPTH = 32
+WINDOW = 400
+CONTEXT = 3
+MEM_ENTRIES = 256
+DISK_ENTRIES = 512
+
+Match = Tuple[int, int]
+Opcode = Tuple[str, int, int, int, int]
+
+def _myers(a: List[int], b: List[int], alo: int, ahi: int, blo: int, bhi: int, out: List[Match],
+           max_cost: int = MAX_COST) -> bool:
+    """Kürzestes Edit-Skript für a[alo:ahi] vs. b[blo:bhi]; hängt die Gleich-Paare an out an.
+    False, wenn mehr als max_cost Edits nötig wären."""
+    n, m = ahi - alo, bhi - blo
+    off = max_cost + 1
+    v = [0] * (2 * off + 1)
+    trace: List[Tuple[int, List[int]]] = []
+    for d in range(max_cost + 1):
+        lo = off - d - 1
+        trace.append((lo, v[lo:off + d + 2]))
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[off + k - 1] < v[off + k + 1]):
+                x = v[off + k + 1]
+            else:
+                x = v[off + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            v[off + k] = x
+            if x >= n and y >= m:
+                pairs: List[Match] = []
+                x, y = n, m
+                for dd in range(d, -1, -1):
+                    lo_d, vd = trace[dd]
+                    k = x - y
+                    if k == -dd or (k != dd and vd[off + k - 1 - lo_d] < vd[off + k + 1 - lo_d]):
+                        pk = k + 1
+                    else:
+                        pk = k - 1
+                    px = vd[off + pk - lo_d] if dd > 0 else 0
+                    py = px - pk if dd > 0 else 0
+                    while x > px and y > py:
+                        x -= 1
+                        y -= 1
+                        pairs.append((alo + x, blo + y))
+                    x, y = px, py
+                out.extend(reversed(pairs))
+                return True
+    return False
+
+def _windowed(a: List[int], b: List[int], alo: int, ahi: int, blo: int, bhi: int, out: List[Match]) -> None:
+    """Myers über Fenster von WINDOW Zeilen; behalten werden die Treffer aus der ersten Fensterhälfte,
+    das nächste Fenster beginnt hinter dem letzten. Kosten O((N+M)·WINDOW) statt O((N+M)·D)."""
+    half = WINDOW // 2
+    while alo < ahi and blo < bhi:
+        wa, wb = min(ahi, alo + WINDOW), min(bhi, blo + WINDOW)
+        last = wa == ahi and wb == bhi
+        part: List[Match] = []
+        if last:
+            _myers(a, b, alo, wa, blo, wb, out, half)
+            return
+        if _myers(a, b, alo, wa, blo, wb, part, half) and part:
+            keep = [p for p in part if p[0] < alo + half and p[1] < blo + half] or part[:1]
+            out.extend(keep)
+            alo, blo = keep[-1][0] + 1, keep[-1][1] + 1
+        else:  # Fenster ohne brauchbare Treffer: als Ersetzung überspringen
+            alo, blo = min(ahi, alo + half), min(bhi, blo + half)
+
+def _unique_anchors(a: List[int], b: List[int], alo: int, ahi: int, blo: int, bhi: int) -> List[Match]:
+    """Längste aufsteigende Folge der Zeilen, die in beiden Bereichen genau einmal vorkommen."""
+    count_a: Dict[int, int] = {}
+    count_b: Dict[int, int] = {}
+    pos_a: Dict[int, int] = {}
+    pos_b: Dict[int, int] = {}
+    for i in range(alo, ahi):
+        count_a[a[i]] = count_a.get(a[i], 0) + 1
+        pos_a[a[i]] = i
+    for j in range(blo, bhi):
+        count_b[b[j]] = count_b.get(b[j], 0) + 1
+        pos_b[b[j]] = j
+    pairs = sorted((pos_a[t], pos_b[t]) for t, c in count_a.items() if c == 1 and count_b.get(t) == 1)
+    if not pairs:
+        return []
+    # Patience-Sortierung über j
+    tails: List[int] = []
+    tails_idx: List[int] = []
+    prev: List[int] = [-1] * len(pairs)
+    for idx, (_, j) in enumerate(pairs):
+        pos = bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tails_idx.append(idx)
+        else:
+            tails[pos] = j
+            tails_idx[pos] = idx
+        prev[idx] = tails_idx[pos - 1] if pos > 0 else -1
+    out: List[Match] = []
+    idx = tails_idx[-1]
+    while idx >= 0:
+        out.append(pairs[idx])
+        idx = prev[idx]
+    out.reverse()
+    return out
+
+def _matches(a: List[int], b: List[int], alo: int, ahi: int, blo: int, bhi: int,
+             out: List[Match], depth: int = 0) -> None:
+    while alo < ahi and blo < bhi and a[alo] == b[blo]:
+        out.append((alo, blo))
+        alo += 1
+        blo += 1
+    suffix: List[Match] = []
+    while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+        ahi -= 1
+        bhi -= 1
+        suffix.append((ahi, bhi))
+    if alo < ahi and blo < bhi:
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi) if depth < MAX_DEPTH else []
+        if anchors:
+            pa, pb = alo, blo
+            for i, j in anchors:
+                _matches(a, b, pa, i, pb, j, out, depth + 1)
+                out.append((i, j))
+                pa, pb = i + 1, j + 1
+            _matches(a, b, pa, ahi, pb, bhi, out, depth + 1)
+        elif not _myers(a, b, alo, ahi, blo, bhi, out):
+            _windowed(a, b, alo, ahi, blo, bhi, out)
+    out.extend(reversed(suffix))
+
+def opcodes(before: List[str], after: List[str]) -> List[Opcode]:
+    """Opcodes wie difflib.SequenceMatcher.get_opcodes()."""
+    ids: Dict[str, int] = {}
+    a = [ids.setdefault(s, len(ids)) for s in before]
+    b = [ids.setdefault(s, len(ids)) for s in after]
+    matches: List[Match] = []
+    _matches(a, b, 0, len(a), 0, len(b), matches)
+    ops: List[Opcode] = []
+    i = j = 0
+    for x, y in matches + [(len(a), len(b))]:
+        if x > i or y > j:
+            tag = "replace" if x > i and y > j else "delete" if x > i else "insert"
+            ops.append((tag, i, x, j, y))
+        if x < len(a):
+            if ops and ops[-1][0] == "equal" and ops[-1][2] == x:
+                t, i1, _, j1, _ = ops[-1]
+                ops[-1] = (t, i1, x + 1, j1, y + 1)
+            else:
+                ops.append(("equal", x, x + 1, y, y + 1))
+        i, j = x + 1, y + 1
+    return ops
+
+def _grouped(ops: List[Opcode], n: int) -> List[List[Opcode]]:
+    # wie difflib.SequenceMatcher.get_grouped_opcodes
+    if not ops:
+        ops = [("equal", 0, 1, 0, 1)]
+    ops = list(ops)
+    if ops[0][0] == "equal":
+        t, i1, i2, j1, j2 = ops[0]
+        ops[0] = t, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if ops[-1][0] == "equal":
+        t, i1, i2, j1, j2 = ops[-1]
+        ops[-1] = t, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+    nn = n + n
+    groups: List[List[Opcode]] = []
+    group: List[Opcode] = []
+    for t, i1, i2, j1, j2 in ops:
+        if t == "equal" and i2 - i1 > nn:
+            group.append((t, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((t, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        groups.append(group)
+    return groups
+
+def _range(start: int, stop: int) -> str:
+    beginning, length = start + 1, stop - start
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+@dataclass
+class FileDiff:
+    body: str          # Hunks ohne ---/+++ Kopf; bei skipped eine Zusammenfassung
+    added: int
+    removed: int
+    skipped: bool = False
+    limit: int = 0     # max_lines, mit dem skipped entschieden wurde
+
+    def unified(self, rel: str) -> str:
+        if self.skipped:
+            return self.body
+        if not self.body:
+            return ""
+        return f"--- a/{rel}\n+++ b/{rel}\n{self.body}"
+
+def compute(before: str, after: str, max_lines: int) -> FileDiff:
+    a, b = before.splitlines(), after.splitlines()
+    if len(a) + len(b) > max_lines:
+        return FileDiff(f"(Diff ausgelassen: {len(a)} -> {len(b)} Zeilen, Grenze {max_lines})",
+                        max(0, len(b) - len(a)), max(0, len(a) - len(b)), True, max_lines)
+    lines: List[str] = []
+    added = removed = 0
+    for group in _grouped(opcodes(a, b), CONTEXT):
+        lines.append(f"@@ -{_range(group[0][1], group[-1][2])} +{_range(group[0][3], group[-1][4])} @@")
+        for t, i1, i2, j1, j2 in group:
+            if t == "equal":
+                lines.extend(" " + s for s in a[i1:i2])
+                continue
+            if t in ("replace", "delete"):
+                lines.extend("-" + s for s in a[i1:i2])
+                removed += i2 - i1
+            if t in ("replace", "insert"):
+                lines.extend("+" + s for s in b[j1:j2])
+                added += j2 - j1
+    return FileDiff("\n".join(lines), added, removed, False, max_lines)
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+_mem: "OrderedDict[Tuple[str, str], FileDiff]" = OrderedDict()
+_mem_lock = threading.Lock()
+
+class DiffCache:
+    """Diffs nach (sha256(before), sha256(after)): im Prozess (LRU) und unter .devagent/cache/diff,
+    damit preview, ein erneutes /preview und der Bericht nach execute nicht neu rechnen."""
+
+    def __init__(self, workspace: str, max_lines: int = 50000):
+        self.dir = os.path.join(os.path.realpath(workspace), DIFF_CACHE_DIR)
+        self.max_lines = max_lines
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _usable(self, d: FileDiff) -> bool:
+        return not d.skipped or d.limit == self.max_lines
+
+    def get(self, before: str, after: str) -> FileDiff:
+        key = (_digest(before), _digest(after))
+        with _mem_lock:
+            d = _mem.get(key)
+            if d is not None:
+                _mem.move_to_end(key)
+        if d is None:
+            d = self._load(key)
+        if d is not None and self._usable(d):
+            self.stats["hits"] += 1
+        else:
+            self.stats["misses"] += 1
+            d = compute(before, after, self.max_lines)
+            self._store(key, d)
+        with _mem_lock:
+            _mem[key] = d
+            while len(_mem) > MEM_ENTRIES:
+                _mem.popitem(last=False)
+        return d
+
+    def _path(self, key: Tuple[str, str]) -> str:
+        return os.path.join(self.dir, f"{key[0][:32]}-{key[1][:32]}.json")
+
+    def _load(self, key: Tuple[str, str]) -> Optional[FileDiff]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return FileDiff(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _store(self, key: Tuple[str, str], d: FileDiff) -> None:
+        p = self._path(key)
+        tmp = f"{p}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.dir, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(asdict(d), f, ensure_ascii=False)
+            os.replace(tmp, p)
+            self._evict()
+        except OSError:
+            pass  # read-only Workspace: nur der Prozess-Cache
+
+    def _evict(self) -> None:
+        with os.scandir(self.dir) as it:
+            entries = [(e.stat().st_mtime, e.path) for e in it if e.name.endswith(".json")]
+        for _, path in sorted(entries)[:max(0, len(entries) - DISK_ENTRIES)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -1,11 +1,18 @@
 from __future__ import annotations
-import os, difflib
-from typing import List, Tuple
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Collection, Dict, List, Optional, Set, Tuple
+from .config import Config
 from .schemas import Plan, Action
 from .jail import ensure_inside, ensure_parent, trash_path, move_to_trash
-from .utils import read_text_limited, run_cmd, is_git_repo, git_commit_all
-from .patcher import apply_patch_git
-from .hooks import run_hooks
+from .utils import read_text_limited, stream_cmd, is_git_repo, git_commit_all, atomic_write_text
+from .patcher import PatchError, apply_patch, apply_patch_git, apply_patches_git, patch_paths
+from . import gitio
+from .hooks import HookRunner
+from .snapshot import finish_snapshot, take_snapshot
+from .audit import log_event
+from .diffing import DiffCache
 
 class PreviewItem:
     def __init__(self, kind: str, relpath: str | None, summary: str, diff: str | None = None, cmd: List[str] | None = None):
@@ -15,18 +22,16 @@ class PreviewItem:
         self.diff = diff
         self.cmd = cmd
 
-def preview(plan: Plan, workspace: str) -> List[PreviewItem]:
+def preview(plan: Plan, workspace: str, cfg: Optional[Config] = None,
+            diffs: Optional[DiffCache] = None) -> List[PreviewItem]:
+    cfg = cfg or Config()
+    diffs = diffs or DiffCache(workspace, cfg.diff_max_lines)
     items: List[PreviewItem] = []
-    root = os.path.realpath(workspace)
     for a in plan.actions:
         if a.type == "create":
-            target = ensure_inside(workspace, a.file or "")
-            before = ""
+            ensure_inside(workspace, a.file or "")
             after = a.content or ""
-            df = "\n".join(difflib.unified_diff(
-                before.splitlines(), after.splitlines(),
-                fromfile=f"a/{a.file}", tofile=f"b/{a.file}", lineterm=""
-            ))
+            df = diffs.get("", after).unified(a.file or "")
             items.append(PreviewItem("create", a.file, f"Create file ({len(after.splitlines())} lines)", df))
         elif a.type == "delete":
             target = ensure_inside(workspace, a.file or "")
@@ -35,15 +40,9 @@ def preview(plan: Plan, workspace: str) -> List[PreviewItem]:
             items.append(PreviewItem("delete", a.file, f"Delete file (exists={exists}, bytes={size})"))
         elif a.type == "edit":
             target = ensure_inside(workspace, a.file or "")
-            before = ""
-            if os.path.exists(target):
-                before = read_text_limited(target, 1024*1024)
             if a.content is not None:
-                after = a.content
-                df = "\n".join(difflib.unified_diff(
-                    before.splitlines(), after.splitlines(),
-                    fromfile=f"a/{a.file}", tofile=f"b/{a.file}", lineterm=""
-                ))
+                before = _read_before(target)
+                df = diffs.get(before, a.content).unified(a.file or "")
                 items.append(PreviewItem("edit", a.file, f"Edit file via content ({len((a.content or '').splitlines())} lines)", df))
             else:
                 items.append(PreviewItem("edit", a.file, "Edit via patch", diff=a.patch))
@@ -52,70 +51,306 @@ def preview(plan: Plan, workspace: str) -> List[PreviewItem]:
             items.append(PreviewItem("run", None, "Run command", cmd=cmd))
     return items
 
-def execute(plan: Plan, workspace: str, run_id: str, require_git_for_patches: bool = True) -> Tuple[bool, List[str]]:
+def _read_before(target: str) -> str:
+    return read_text_limited(target, 1024*1024) if os.path.isfile(target) else ""
+
+def change_summary(report: Dict[str, Tuple[int, int]]) -> List[str]:
+    """Zeilen für den Bericht nach execute: '<datei> +hinzu -weg'."""
+    return [f"  {rel} +{added} -{removed}" for rel, (added, removed) in sorted(report.items())]
+
+def _cmd_name(a: Action) -> str:
+    return os.path.basename(a.cmd[0]) if a.cmd else ""
+
+def action_deps(actions: List[Action], parallel_cmds: Collection[str] = ()) -> List[Set[int]]:
+    """Abhängigkeiten je Aktion (Indizes früherer Aktionen).
+
+    Dateiaktionen hängen von früheren Aktionen auf demselben Pfad und von allen früheren
+    run-Schritten ab; run-Schritte hängen von allen früheren Dateiaktionen und früheren
+    run-Schritten ab (npm install -> npm test). Nur wenn beide Befehle (argv[0]) in parallel_cmds
+    stehen (cfg.run_parallel_commands, z.B. ruff und mypy), laufen zwei run-Schritte gleichzeitig.
+    """
+    deps: List[Set[int]] = []
+    last_by_path: Dict[str, int] = {}
+    file_ops: List[int] = []
+    runs: List[int] = []
+    for i, a in enumerate(actions):
+        if a.type == "run":
+            independent = _cmd_name(a) in parallel_cmds
+            deps.append(set(file_ops) | {j for j in runs
+                                         if not (independent and _cmd_name(actions[j]) in parallel_cmds)})
+            runs.append(i)
+            continue
+        paths = {os.path.normpath(a.file or "")}
+        if a.type == "edit" and a.content is None:
+            paths |= patch_paths(a.patch or "")
+        d = set(runs)
+        for p in paths:
+            if p in last_by_path:
+                d.add(last_by_path[p])
+            last_by_path[p] = i
+        deps.append(d)
+        file_ops.append(i)
+    return deps
+
+OutputSink = Callable[[List[str], str, str], None]  # (cmd, stream, line)
+
+def command_timeout(cfg: Config, cmd: List[str]) -> float:
+    name = os.path.basename(cmd[0]) if cmd else ""
+    return cfg.run_timeouts.get(name, cfg.run_timeout_s)
+
+@dataclass
+class _Run:
+    workspace: str
+    run_id: str
+    require_git_for_patches: bool
+    has_git: bool
+    cfg: Config
+    hooks: HookRunner
+    on_output: Optional[OutputSink] = None
+    report: Optional[Dict[str, Tuple[int, int]]] = None  # datei -> (+, -), aus dem Diff-Cache
+    diffs: Optional[DiffCache] = None
+
+    def record(self, rel: str, before: str, target: str) -> None:
+        if self.report is None or self.diffs is None:
+            return
+        d = self.diffs.get(before, _read_before(target))
+        self.report[rel] = (d.added, d.removed)
+
+def _units(actions: List[Action], cfg: Config) -> List[List[int]]:
+    """Ausführungseinheiten: einzelne Aktionen; mit patch_engine='git' werden aufeinanderfolgende
+    Patch-Edits zu einer Gruppe (ein kombiniertes git apply)."""
+    units: List[List[int]] = []
+    for i, a in enumerate(actions):
+        is_patch = a.type == "edit" and a.content is None
+        if cfg.patch_engine == "git" and is_patch and units and i > 0 and units[-1][-1] == i - 1 \
+                and actions[i - 1].type == "edit" and actions[i - 1].content is None:
+            units[-1].append(i)
+        else:
+            units.append([i])
+    return units
+
+def _step(a: Action, run: _Run) -> Tuple[bool, List[str]]:
+    """Eine Aktion inkl. Pre-/PostToolUse-Hooks; (ok, messages)."""
+    workspace, run_id, cfg, hooks, on_output = run.workspace, run.run_id, run.cfg, run.hooks, run.on_output
+    require_git_for_patches, has_git = run.require_git_for_patches, run.has_git
+    root = os.path.realpath(workspace)
+    msgs: List[str] = []
+    try:
+        # PreToolUse Hooks
+        allowed, hook_msgs = hooks.run("PreToolUse", {"action": a.model_dump(), "run_id": run_id})
+        msgs.extend(hook_msgs)
+        if not allowed:
+            raise RuntimeError("Aktion durch PreToolUse-Hook blockiert")
+
+        if a.type == "create":
+            target = ensure_inside(workspace, a.file or "")
+            before = _read_before(target) if run.report is not None else ""
+            atomic_write_text(target, a.content or "")  # ersetzt die Datei (Hardlink-Snapshots bleiben intakt)
+            run.record(a.file or "", before, target)
+            msgs.append(f"CREATE {a.file}")
+        elif a.type == "delete":
+            target = ensure_inside(workspace, a.file or "")
+            if os.path.exists(target) and os.path.isfile(target):
+                trash_abs = trash_path(workspace, run_id, a.file or "")
+                ensure_parent(trash_abs)
+                move_to_trash(target, trash_abs)
+                msgs.append(f"DELETE {a.file} -> trash")
+            else:
+                msgs.append(f"DELETE {a.file} (skip: not a file)")
+        elif a.type == "edit":
+            target = ensure_inside(workspace, a.file or "")
+            before = _read_before(target) if run.report is not None else ""
+            if a.content is not None:
+                atomic_write_text(target, a.content)
+                run.record(a.file or "", before, target)
+                msgs.append(f"EDIT {a.file} (content)")
+            else:
+                if require_git_for_patches and not has_git:
+                    raise RuntimeError("patch-edit ohne Git-Repo verboten")
+                if cfg.patch_engine == "git" and has_git:
+                    if not apply_patch_git(root, a.patch or ""):
+                        raise RuntimeError("git apply fehlgeschlagen")
+                    run.record(a.file or "", before, target)
+                    msgs.append(f"EDIT {a.file} (patch via git apply)")
+                    return _post(a, run, msgs)
+                try:
+                    notes = apply_patch(root, a.patch or "")
+                    run.record(a.file or "", before, target)
+                    msgs.append(f"EDIT {a.file} (patch)")
+                    msgs.extend(f"  {n}" for n in notes)
+                except PatchError as e:
+                    # Fallback für Formen, die nur git beherrscht (binär, Umbenennung, ...)
+                    if not has_git:
+                        raise RuntimeError(f"Patch nicht anwendbar: {e}")
+                    if not apply_patch_git(root, a.patch or ""):
+                        raise RuntimeError(f"git apply fehlgeschlagen ({e})")
+                    run.record(a.file or "", before, target)
+                    msgs.append(f"EDIT {a.file} (patch via git apply)")
+        elif a.type == "run":
+            cmd = a.cmd or []
+            sink = (lambda stream, line: on_output(cmd, stream, line)) if on_output else None
+            res = stream_cmd(cmd, cwd=root, timeout=command_timeout(cfg, cmd), on_line=sink,
+                             head_lines=cfg.run_output_head, tail_lines=cfg.run_output_tail,
+                             abort_patterns=cfg.run_abort_patterns)
+            msgs.append(f"RUN {' '.join(cmd)} -> code={res.code}")
+            if res.out.strip():
+                msgs.append(f"STDOUT:\n{res.out.strip()}")
+            if res.err.strip():
+                msgs.append(f"STDERR:\n{res.err.strip()}")
+            if res.aborted:
+                raise RuntimeError(f"Abgebrochen: Ausgabe passt auf '{res.aborted}'")
+            if res.code != 0:
+                raise RuntimeError(f"Command exit {res.code}")
+
+    except Exception as e:
+        msgs.append(f"ERROR {a.type} {getattr(a,'file',None)}: {e}")
+        return False, msgs
+    return _post(a, run, msgs)
+
+def _post(a: Action, run: _Run, msgs: List[str]) -> Tuple[bool, List[str]]:
+    # PostToolUse Hooks
+    try:
+        _, hook_msgs = run.hooks.run("PostToolUse", {"action": a.model_dump(), "run_id": run.run_id})
+        msgs.extend(hook_msgs)
+    except Exception as e:
+        msgs.append(f"ERROR {a.type} {getattr(a,'file',None)}: {e}")
+        return False, msgs
+    return True, msgs
+
+def _step_patches(group: List[Action], run: _Run) -> Tuple[bool, List[str]]:
+    """Aufeinanderfolgende Patch-Edits mit einem 'git apply --check' und einem 'git apply'.
+    Semantik wie nacheinander: Aktionen vor dem ersten Fehler werden angewendet, danach keine.
+    Nur ohne PreToolUse-Hooks (siehe _run_unit), da diese sonst den Baum vor der Gruppe sähen."""
+    root = os.path.realpath(run.workspace)
+    msgs: List[str] = []
+    ready: List[Action] = []
+    error: Optional[Tuple[Action, str]] = None
+    for a in group:
+        if not run.has_git:
+            error = (a, "patch-edit ohne Git-Repo verboten" if run.require_git_for_patches
+                     else "patch_engine=git benötigt ein Git-Repo")
+            break
+        ready.append(a)
+    if ready:
+        befores = {a.file: _read_before(ensure_inside(root, a.file or "")) for a in ready} if run.report is not None else {}
+        ok, failures = apply_patches_git(root, [a.patch or "" for a in ready])
+        if not ok:
+            # Fehlerpfad: einzeln nachziehen, bis der schuldige Patch feststeht
+            for k in sorted(failures):
+                msgs.append(f"  {ready[k].file}: {failures[k]}")
+            for k, a in enumerate(ready):
+                ok_k, fail_k = apply_patches_git(root, [a.patch or ""])
+                if not ok_k:
+                    error = (a, f"git apply fehlgeschlagen ({fail_k.get(0) or failures.get(k, '?')})")
+                    ready = ready[:k]
+                    break
+        for a in ready:
+            if a.file in befores:
+                run.record(a.file or "", befores.pop(a.file), ensure_inside(root, a.file or ""))
+            msgs.append(f"EDIT {a.file} (patch, git apply gebündelt)")
+            ok, msgs = _post(a, run, msgs)
+            if not ok:
+                return False, msgs
+    if error is not None:
+        a, reason = error
+        msgs.append(f"ERROR {a.type} {a.file}: {reason}")
+        return False, msgs
+    return True, msgs
+
+def _run_unit(unit: List[int], actions: List[Action], run: _Run) -> Tuple[bool, List[str]]:
+    if len(unit) == 1:
+        return _step(actions[unit[0]], run)
+    if run.hooks.has("PreToolUse"):
+        # Der Hook für Patch N muss den Baum nach Patch 1..N-1 sehen: einzeln anwenden
+        msgs: List[str] = []
+        for i in unit:
+            ok, step_msgs = _step(actions[i], run)
+            msgs.extend(step_msgs)
+            if not ok:
+                return False, msgs
+        return True, msgs
+    return _step_patches([actions[i] for i in unit], run)
+
+def _execute_dag(actions: List[Action], run: _Run, workers: int) -> Tuple[bool, List[str]]:
+    """Führt unabhängige Einheiten parallel aus. Nach dem ersten Fehler startet nichts Neues mehr;
+    bereits laufende werden abgewartet. Meldungen erscheinen in Planreihenfolge."""
+    units = _units(actions, run.cfg)
+    unit_of = {i: u for u, members in enumerate(units) for i in members}
+    deps = action_deps(actions, set(run.cfg.run_parallel_commands))
+    pending = {u: {unit_of[j] for i in members for j in deps[i]} - {u} for u, members in enumerate(units)}
+    results: Dict[int, List[str]] = {}
+    failed = False
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="devagent-exec") as pool:
+        running: Dict[Future, int] = {}
+        while True:
+            if not failed:
+                for u in sorted(u for u, d in pending.items() if not d):
+                    del pending[u]
+                    running[pool.submit(_run_unit, units[u], actions, run)] = u
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                u = running.pop(fut)
+                ok, results[u] = fut.result()
+                failed = failed or not ok
+                for d in pending.values():
+                    d.discard(u)
+    msgs = [m for u in sorted(results) for m in results[u]]
+    return not failed, msgs
+
+def execute(plan: Plan, workspace: str, run_id: str, require_git_for_patches: bool = True,
+            workers: int = 1, cfg: Optional[Config] = None,
+            on_output: Optional[OutputSink] = None,
+            report: Optional[Dict[str, Tuple[int, int]]] = None) -> Tuple[bool, List[str]]:
+    """Führt den Plan aus; workers > 1 nutzt den Abhängigkeitsgraphen (action_deps),
+    workers <= 1 die strikte Planreihenfolge. on_output erhält die Ausgabe von run-Schritten live.
+    report (optional) wird mit datei -> (+Zeilen, -Zeilen) gefüllt; die Diffs kommen aus dem
+    Cache, den preview bereits befüllt hat."""
+    cfg = cfg or Config()
     root = os.path.realpath(workspace)
     msgs: List[str] = []
-    had_error = False
+    has_git = is_git_repo(root)
 
-    # Git-Snapshot vor Ausführung
-    if is_git_repo(root):
+    # Snapshot vor Ausführung (Rücksprung: devagent rollback <run_id>)
+    if cfg.snapshot_mode == "commit" and has_git:
         sha = git_commit_all(root, f"devagent pre: {run_id}")
         msgs.append(f"Git snapshot: {sha or 'failed'}")
+    elif cfg.snapshot_mode == "ref":
+        note = take_snapshot(root, run_id, plan, has_git, keep=cfg.snapshot_keep)
+        if note:
+            msgs.append(note)
+    try:
+        return _execute_run(plan, workspace, run_id, require_git_for_patches, has_git, workers,
+                            cfg, on_output, report, msgs)
+    finally:
+        if cfg.snapshot_mode == "ref":
+            finish_snapshot(root, run_id)  # Nachher-Stand für rollback, auch nach Fehlern
 
-    for a in plan.actions:
+def _execute_run(plan: Plan, workspace: str, run_id: str, require_git_for_patches: bool, has_git: bool,
+                 workers: int, cfg: Config, on_output: Optional[OutputSink],
+                 report: Optional[Dict[str, Tuple[int, int]]], msgs: List[str]) -> Tuple[bool, List[str]]:
+    try:
+        hooks = HookRunner(workspace, timeout=cfg.hook_timeout_s, workers=cfg.hook_workers)
+    except ValueError as e:
+        msgs.append(f"ERROR hooks: {e}")
+        return False, msgs
+    run = _Run(workspace, run_id, require_git_for_patches, has_git, cfg, hooks, on_output, report,
+               DiffCache(workspace, cfg.diff_max_lines) if report is not None else None)
+    with hooks:
         try:
-            # PreToolUse Hooks
-            allowed, hook_msgs = run_hooks(workspace, "PreToolUse", {"action": a.model_dump(), "run_id": run_id})
-            msgs.extend(hook_msgs)
-            if not allowed:
-                raise RuntimeError("Aktion durch PreToolUse-Hook blockiert")
-
-            if a.type == "create":
-                target = ensure_inside(workspace, a.file or "")
-                ensure_parent(target)
-                with open(target, "w", encoding="utf-8") as f:
-                    f.write(a.content or "")
-                msgs.append(f"CREATE {a.file}")
-            elif a.type == "delete":
-                target = ensure_inside(workspace, a.file or "")
-                if os.path.exists(target) and os.path.isfile(target):
-                    trash_abs = trash_path(workspace, run_id, a.file or "")
-                    ensure_parent(trash_abs)
-                    move_to_trash(target, trash_abs)
-                    msgs.append(f"DELETE {a.file} -> trash")
-                else:
-                    msgs.append(f"DELETE {a.file} (skip: not a file)")
-            elif a.type == "edit":
-                target = ensure_inside(workspace, a.file or "")
-                if a.content is not None:
-                    ensure_parent(target)
-                    with open(target, "w", encoding="utf-8") as f:
-                        f.write(a.content)
-                    msgs.append(f"EDIT {a.file} (content)")
-                else:
-                    if require_git_for_patches and not is_git_repo(root):
-                        raise RuntimeError("patch-edit ohne Git-Repo verboten")
-                    ok = apply_patch_git(root, a.patch or "")
-                    if not ok:
-                        raise RuntimeError("git apply fehlgeschlagen")
-                    msgs.append(f"EDIT {a.file} (patch)")
-            elif a.type == "run":
-                code, out, err = run_cmd(a.cmd or [], cwd=root, timeout=1800)
-                msgs.append(f"RUN {' '.join(a.cmd or [])} -> code={code}")
-                if out.strip():
-                    msgs.append(f"STDOUT:\n{out.strip()}")
-                if err.strip():
-                    msgs.append(f"STDERR:\n{err.strip()}")
-                if code != 0:
-                    raise RuntimeError(f"Command exit {code}")
-
-            # PostToolUse Hooks
-            _, hook_msgs2 = run_hooks(workspace, "PostToolUse", {"action": a.model_dump(), "run_id": run_id})
-            msgs.extend(hook_msgs2)
-
-        except Exception as e:
-            msgs.append(f"ERROR {a.type} {getattr(a,'file',None)}: {e}")
-            had_error = True
-            break
+            if workers > 1 and len(plan.actions) > 1:
+                ok, step_msgs = _execute_dag(plan.actions, run, workers)
+                return ok, msgs + step_msgs
 
-    return (not had_error), msgs
+            for unit in _units(plan.actions, cfg):
+                ok, step_msgs = _run_unit(unit, plan.actions, run)
+                msgs.extend(step_msgs)
+                if not ok:
+                    return False, msgs
+            return True, msgs
+        finally:
+            if has_git:
+                log_event(workspace, run_id, "gitio", dict(gitio.stats))
+            if hooks.latency:
+                log_event(workspace, run_id, "hooks", {"latency": hooks.latency})
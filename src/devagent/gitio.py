@@ -0,0 +1,153 @@
+from __future__ import annotations
+import atexit, os, subprocess, threading
+from typing import Dict, List, Optional, Tuple
+
+# Git-Zugriff mit Prozess-Lebensdauer-Caches:
+#   - Repo-Erkennung/Top-Level je Pfad (ungültig, sobald ein .git in der Elternkette auftaucht/verschwindet)
+#   - Objekte über einen langlebigen 'git cat-file --batch' je Repo
+# 'git status' wird bewusst nicht gemerkt: ein Stempel aus Index/HEAD sieht keine Worktree-
+# Änderungen, und die Aufrufer (Snapshot vor/nach dem Lauf) brauchen ohnehin den frischen Stand.
+# stats zählt gestartete und eingesparte git-Prozesse.
+
+stats: Dict[str, int] = {"spawned": 0, "avoided": 0}
+_lock = threading.RLock()
+_tops: Dict[str, Tuple[Optional[str], Optional[str]]] = {}  # path -> (stamp, top)
+_batches: Dict[str, "_CatFile"] = {}
+
+def _count(field: str) -> None:
+    with _lock:
+        stats[field] += 1
+
+def _run(args: List[str], cwd: str) -> Tuple[int, bytes]:
+    _count("spawned")
+    try:
+        proc = subprocess.run(["git"] + args, cwd=cwd, capture_output=True)
+    except OSError:
+        return 127, b""
+    return proc.returncode, proc.stdout
+
+def _dotgit(path: str) -> Optional[str]:
+    """Nächstes .git (Ordner oder Datei) in der Elternkette, nur per stat."""
+    p = path
+    while True:
+        cand = os.path.join(p, ".git")
+        if os.path.exists(cand):
+            return cand
+        parent = os.path.dirname(p)
+        if parent == p:
+            return None
+        p = parent
+
+def repo_top(path: str) -> Optional[str]:
+    """Top-Level des Repos, das path enthält, oder None."""
+    key = os.path.realpath(path)
+    stamp = _dotgit(key)
+    hit = _tops.get(key)
+    if hit is not None and hit[0] == stamp:
+        _count("avoided")
+        return hit[1]
+    code, out = _run(["rev-parse", "--show-toplevel"], key)
+    top = os.fsdecode(out.strip()) if code == 0 and out.strip() else None
+    with _lock:
+        _tops[key] = (stamp, top)
+    return top
+
+def is_repo(path: str) -> bool:
+    return repo_top(path) is not None
+
+def status(path: str) -> Optional[Dict[str, str]]:
+    """Geänderte und untracked Pfade unter path (relativ zu path, ohne .devagent): {rel: XY}, '??' = untracked.
+    None, wenn path kein Git-Repo ist. Jeder Aufruf startet 'git status'."""
+    key = os.path.realpath(path)
+    top = repo_top(key)
+    if top is None:
+        return None
+    code, out = _run(["status", "--porcelain=v2", "-z", "--untracked-files=all",
+                      "--", ".", ":(exclude).devagent"], key)
+    if code != 0:
+        return None
+    prefix = os.path.relpath(key, top)
+    prefix = "" if prefix == "." else prefix.replace(os.sep, "/") + "/"
+    entries: Dict[str, str] = {}
+    parts = out.split(b"\0")
+    i = 0
+    while i < len(parts):
+        rec = os.fsdecode(parts[i])
+        i += 1
+        if not rec:
+            continue
+        kind = rec[0]
+        if kind == "?":
+            rel, xy = rec[2:], "??"
+        elif kind == "1":
+            fields = rec.split(" ", 8)
+            rel, xy = fields[8], fields[1]
+        elif kind == "2":
+            fields = rec.split(" ", 9)
+            rel, xy = fields[9], fields[1]
+            i += 1  # Ursprungspfad
+        elif kind == "u":
+            fields = rec.split(" ", 10)
+            rel, xy = fields[10], fields[1]
+        else:
+            continue
+        entries[rel[len(prefix):] if rel.startswith(prefix) else rel] = xy
+    return entries
+
+class _CatFile:
+    """Langlebiger 'git cat-file --batch'; Anfragen serialisiert über ein Lock."""
+
+    def __init__(self, top: str):
+        _count("spawned")
+        self.proc = subprocess.Popen(["git", "cat-file", "--batch"], cwd=top,
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.lock = threading.Lock()
+        self.used = False
+
+    def read(self, spec: str) -> Optional[Tuple[str, bytes]]:
+        with self.lock:
+            if self.used:
+                _count("avoided")
+            self.used = True
+            assert self.proc.stdin is not None and self.proc.stdout is not None
+            self.proc.stdin.write(spec.encode("utf-8") + b"\n")
+            self.proc.stdin.flush()
+            header = self.proc.stdout.readline().decode("utf-8", "replace").split()
+            if len(header) != 3:
+                return None  # "<spec> missing" / "ambiguous"
+            size = int(header[2])
+            data = self.proc.stdout.read(size)
+            self.proc.stdout.read(1)  # abschließendes LF
+            return header[1], data
+
+    def close(self) -> None:
+        try:
+            if self.proc.stdin:
+                self.proc.stdin.close()
+            self.proc.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.proc.kill()
+
+def read_object(path: str, spec: str) -> Optional[Tuple[str, bytes]]:
+    """(typ, inhalt) für z.B. '<commit>:<pfad>' relativ zum Repo-Top; None, wenn nicht vorhanden."""
+    top = repo_top(path)
+    if top is None or "\n" in spec:
+        return None
+    with _lock:
+        batch = _batches.get(top)
+        if batch is None or batch.proc.poll() is not None:
+            batch = _batches[top] = _CatFile(top)
+    try:
+        return batch.read(spec)
+    except (OSError, ValueError):
+        with _lock:
+            _batches.pop(top, None)
+        return None
+
+@atexit.register
+def close_all() -> None:
+    with _lock:
+        batches = list(_batches.values())
+        _batches.clear()
+    for b in batches:
+        b.close()
@@ -1,7 +1,9 @@
 from __future__ import annotations
-import os, json, stat, subprocess, shlex, time
-from typing import Tuple, List
-from .constants import HOOKS_DIR
+import os, json, stat, subprocess, shlex, time, queue, hashlib, threading, tomllib, importlib.util
+from dataclasses import dataclass, field
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, NamedTuple, Tuple, List, Optional
+from .constants import HOOKS_DIR, HOOK_MANIFEST, HOOK_BLOBS_DIR
 
 def _exec_file(path: str, payload: dict, timeout: int = 5) -> Tuple[int, str, str]:
     # Führt beliebige Hook-Executables aus (Shell-Skripte, Python etc.).
@@ -15,30 +17,372 @@ def _exec_file(path: str, payload: dict, timeout: int = 5) -> Tuple[int, str, st
         return 124, out, err
     return proc.returncode, out, err
 
-def run_hooks(workspace: str, event: str, payload: dict, timeout: int = 5) -> Tuple[bool, List[str]]:
-    """Sucht ausführbare Dateien unter .devagent/hooks/<event>/* und führt sie aus.
-    Exit-Code 0 => allow, !=0 => block.
-    Gibt (allowed, messages) zurück.
-    """
+PARALLEL_MARK = ".parallel"  # z.B. lint.parallel.sh: darf gleichzeitig mit anderen parallel-sicheren Hooks laufen
+
+class DirHook(NamedTuple):
+    name: str
+    path: str
+    parallel: bool
+
+def discover_hooks(workspace: str, event: str) -> List[DirHook]:
+    """Ausführbare Dateien unter .devagent/hooks/<event>/, sortiert."""
     base = os.path.join(workspace, HOOKS_DIR, event)
-    msgs: List[str] = []
-    allowed = True
-    if not os.path.isdir(base):
-        return True, msgs
-    for name in sorted(os.listdir(base)):
+    out: List[DirHook] = []
+    try:
+        names = sorted(os.listdir(base))
+    except OSError:
+        return out
+    for name in names:
         path = os.path.join(base, name)
         try:
-            st = os.stat(path)
-            if not (st.st_mode & stat.S_IXUSR):
+            if not (os.stat(path).st_mode & stat.S_IXUSR):
                 continue
-            code, out, err = _exec_file(path, payload, timeout=timeout)
-            if out.strip():
-                msgs.append(f"[hook:{event}:{name}] {out.strip()}")
-            if err.strip():
-                msgs.append(f"[hook:{event}:{name}:stderr] {err.strip()}")
-            if code != 0:
-                allowed = False
+        except OSError:
+            continue
+        out.append(DirHook(name, path, PARALLEL_MARK in name))
+    return out
+
+HookCall = Callable[[], Tuple[bool, List[str]]]
+
+def _exec_dir_hook(event: str, hook: DirHook, payload: dict, timeout: int) -> Tuple[bool, List[str]]:
+    msgs: List[str] = []
+    code, out, err = _exec_file(hook.path, payload, timeout=timeout)
+    if out.strip():
+        msgs.append(f"[hook:{event}:{hook.name}] {out.strip()}")
+    if err.strip():
+        msgs.append(f"[hook:{event}:{hook.name}:stderr] {err.strip()}")
+    return code == 0, msgs
+
+def _run_all(event: str, calls: List[Tuple[str, bool, HookCall]],
+             pool: Optional[ThreadPoolExecutor] = None,
+             record: Optional[Callable[[str, float], None]] = None) -> Tuple[bool, List[str]]:
+    """Führt Hooks aus: zuerst die übrigen nacheinander, danach die parallel-sicheren gleichzeitig
+    im pool; ein nicht parallel-sicherer Hook läuft also nie neben einem anderen. Ergebnis wie bisher: ein einziger Block genügt. Meldungen in Discovery-Reihenfolge."""
+    def timed(name: str, call: HookCall) -> Tuple[bool, List[str]]:
+        t0 = time.perf_counter()
+        try:
+            return call()
         except Exception as e:
-            msgs.append(f"[hook:{event}:{name}] ERROR {e}")
-            allowed = False
-    return allowed, msgs
+            return False, [f"[hook:{event}:{name}] ERROR {e}"]
+        finally:
+            if record:
+                record(f"{event}:{name}", time.perf_counter() - t0)
+
+    results: List[Any] = [None] * len(calls)
+    own_pool = None
+    if pool is None and sum(1 for _, par, _ in calls if par) > 1:
+        pool = own_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="devagent-hook")
+    try:
+        for i, (name, par, call) in enumerate(calls):
+            if not par or pool is None:
+                results[i] = timed(name, call)
+        for i, (name, par, call) in enumerate(calls):
+            if results[i] is None:
+                results[i] = pool.submit(timed, name, call)
+        allowed, msgs = True, []
+        for r in results:
+            ok, hook_msgs = r.result() if isinstance(r, Future) else r
+            allowed = allowed and ok
+            msgs.extend(hook_msgs)
+        return allowed, msgs
+    finally:
+        if own_pool is not None:
+            own_pool.shutdown()
+
+def run_hooks(workspace: str, event: str, payload: dict, timeout: int = 5) -> Tuple[bool, List[str]]:
+    """Sucht ausführbare Dateien unter .devagent/hooks/<event>/* und führt sie aus.
+    Exit-Code 0 => allow, !=0 => block. Hooks mit '.parallel' im Namen laufen gleichzeitig.
+    Gibt (allowed, messages) zurück.
+    """
+    calls = [(h.name, h.parallel, lambda h=h: _exec_dir_hook(event, h, payload, timeout))
+             for h in discover_hooks(workspace, event)]
+    return _run_all(event, calls)
+
+# Opt-in: .devagent/hooks/hooks.toml
+#
+#   [[hook]]
+#   name = "policy"
+#   events = ["PreToolUse", "PostToolUse"]
+#   mode = "persistent"          # exec | persistent | python
+#   command = ["python3", "policy.py"]   # relativ zu .devagent/hooks
+#   timeout = 5
+#   inline_max = 4096            # größere Payload-Felder als {"$file": ...}
+#   parallel_safe = true         # darf gleichzeitig mit anderen parallel-sicheren Hooks laufen
+#
+#   [[hook]]
+#   name = "guard"
+#   events = ["PreToolUse"]
+#   mode = "python"
+#   module = "guard.py"          # handle(event, payload) -> bool | (bool, str) | {"allow", "message"}
+#
+# persistent: der Prozess läuft einmal pro Run und liest je Zeile {"id", "event", "payload"};
+# er antwortet je Zeile mit {"id", "allow", "message"}.
+
+LARGE_FIELDS = ("content", "patch")
+
+@dataclass
+class HookSpec:
+    name: str
+    events: List[str]
+    mode: str = "exec"
+    command: List[str] = field(default_factory=list)
+    module: str = ""
+    function: str = "handle"
+    timeout: float = 5.0
+    inline_max: int = 4096
+    parallel_safe: bool = False
+
+def load_manifest(workspace: str) -> List[HookSpec]:
+    path = os.path.join(workspace, HOOK_MANIFEST)
+    if not os.path.isfile(path):
+        return []
+    with open(path, "rb") as f:
+        data = tomllib.load(f)
+    specs: List[HookSpec] = []
+    for i, h in enumerate(data.get("hook") or []):
+        mode = str(h.get("mode", "exec"))
+        if mode not in ("exec", "persistent", "python"):
+            raise ValueError(f"{HOOK_MANIFEST}: hook #{i+1}: unbekannter mode '{mode}'")
+        cmd = h.get("command") or []
+        specs.append(HookSpec(
+            name=str(h.get("name") or f"hook{i+1}"),
+            events=[str(e) for e in h.get("events") or []],
+            mode=mode,
+            command=shlex.split(cmd) if isinstance(cmd, str) else [str(x) for x in cmd],
+            module=str(h.get("module") or ""),
+            function=str(h.get("function") or "handle"),
+            timeout=float(h.get("timeout", 5.0)),
+            inline_max=int(h.get("inline_max", 4096)),
+            parallel_safe=bool(h.get("parallel_safe", False)),
+        ))
+    return specs
+
+def _verdict(result: Any) -> Tuple[bool, str]:
+    """Antwort eines Hooks (Python-Rückgabe oder NDJSON-Objekt) -> (allow, message)."""
+    if result is None:
+        return True, ""
+    if isinstance(result, bool):
+        return result, ""
+    if isinstance(result, tuple):
+        return bool(result[0]), str(result[1]) if len(result) > 1 and result[1] else ""
+    if isinstance(result, dict):
+        return bool(result.get("allow", True)), str(result.get("message") or "")
+    raise TypeError(f"ungültige Hook-Antwort: {result!r}")
+
+_blob_refs: Dict[str, int] = {}
+_blob_lock = threading.Lock()
+
+def offload_payload(workspace: str, payload: dict, inline_max: int) -> dict:
+    """Ersetzt große action-Felder durch {"$file": <pfad>, "bytes", "sha256"} (inhaltsadressiert).
+    Jeder Aufruf braucht ein release_payload, sobald der Hook geantwortet hat."""
+    action = payload.get("action")
+    if not isinstance(action, dict):
+        return payload
+    slim = None
+    for key in LARGE_FIELDS:
+        val = action.get(key)
+        if not isinstance(val, str) or len(val) <= inline_max:
+            continue
+        data = val.encode("utf-8")
+        sha = hashlib.sha256(data).hexdigest()
+        path = os.path.join(os.path.realpath(workspace), HOOK_BLOBS_DIR, sha)
+        with _blob_lock:  # parallele Hooks teilen sich denselben Blob
+            if not _blob_refs.get(path) or not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            _blob_refs[path] = _blob_refs.get(path, 0) + 1
+        slim = slim or dict(action)
+        slim[key] = {"$file": path, "bytes": len(data), "sha256": sha}
+    return payload if slim is None else {**payload, "action": slim}
+
+def release_payload(wire: dict) -> None:
+    """Gegenstück zu offload_payload: der letzte Nutzer eines Blobs löscht die Datei."""
+    action = wire.get("action")
+    if not isinstance(action, dict):
+        return
+    for key in LARGE_FIELDS:
+        ref = action.get(key)
+        if not isinstance(ref, dict) or "$file" not in ref:
+            continue
+        path = ref["$file"]
+        with _blob_lock:
+            n = _blob_refs.get(path, 0) - 1
+            if n > 0:
+                _blob_refs[path] = n
+                continue
+            _blob_refs.pop(path, None)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+class _Worker:
+    """Langlebiger Hook-Prozess mit NDJSON auf stdin/stdout."""
+
+    def __init__(self, spec: HookSpec, cwd: str):
+        self.spec = spec
+        self.cwd = cwd
+        self.proc: Optional[subprocess.Popen] = None
+        self.lines: "queue.Queue[Optional[str]]" = queue.Queue()
+        self.lock = threading.Lock()
+        self.seq = 0
+
+    def _start(self) -> None:
+        self.proc = subprocess.Popen(self.spec.command, cwd=self.cwd, stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        self.lines = queue.Queue()
+        threading.Thread(target=self._pump, args=(self.proc, self.lines), daemon=True).start()
+
+    @staticmethod
+    def _pump(proc: subprocess.Popen, lines: "queue.Queue[Optional[str]]") -> None:
+        for line in proc.stdout:
+            lines.put(line)
+        lines.put(None)  # EOF
+
+    def request(self, event: str, payload: dict) -> Tuple[bool, str]:
+        with self.lock:
+            if self.proc is None or self.proc.poll() is not None:
+                self._start()
+            self.seq += 1
+            msg = json.dumps({"id": self.seq, "event": event, "payload": payload}, ensure_ascii=False)
+            try:
+                self.proc.stdin.write(msg + "\n")
+                self.proc.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                self.close()
+                raise RuntimeError(f"Hook-Prozess beendet ({e})")
+            deadline = time.monotonic() + self.spec.timeout
+            while True:
+                try:
+                    line = self.lines.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    self.close()  # hängt: beim nächsten Aufruf neu starten
+                    raise TimeoutError(f"keine Antwort nach {self.spec.timeout}s")
+                if line is None:
+                    self.close()
+                    raise RuntimeError("Hook-Prozess beendet")
+                try:
+                    resp = json.loads(line)
+                except ValueError:
+                    continue  # Log-Ausgaben o.ä. ignorieren
+                if isinstance(resp, dict) and resp.get("id") == self.seq:
+                    return _verdict(resp)
+
+    def close(self) -> None:
+        proc, self.proc = self.proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=1)
+        except Exception:
+            proc.kill()
+            proc.wait()
+
+class HookRunner:
+    """Hooks eines Runs: Verzeichnis-Hooks wie run_hooks plus die Hooks aus hooks.toml.
+    Discovery, persistente Prozesse und Python-Module einmal pro Run; Latenz je Hook in latency."""
+
+    def __init__(self, workspace: str, timeout: float = 5, workers: int = 8):
+        self.workspace = workspace
+        self.timeout = timeout
+        self.workers = workers
+        self.base = os.path.join(workspace, HOOKS_DIR)
+        self.specs = load_manifest(workspace)
+        self._workers: Dict[str, _Worker] = {}
+        self._funcs: Dict[str, Callable[[str, dict], Any]] = {}
+        self._dir_hooks: Dict[str, List[DirHook]] = {}  # Discovery einmal pro Run
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.latency: Dict[str, Dict[str, float]] = {}  # "<event>:<hook>" -> calls/total_s/max_s
+
+    def _func(self, spec: HookSpec) -> Callable[[str, dict], Any]:
+        with self._lock:
+            fn = self._funcs.get(spec.name)
+            if fn is None:
+                path = os.path.join(self.base, spec.module)
+                mod_spec = importlib.util.spec_from_file_location(f"devagent_hook_{spec.name}", path)
+                if mod_spec is None or mod_spec.loader is None:
+                    raise ImportError(f"Hook-Modul nicht ladbar: {path}")
+                mod = importlib.util.module_from_spec(mod_spec)
+                mod_spec.loader.exec_module(mod)
+                fn = self._funcs[spec.name] = getattr(mod, spec.function)
+            return fn
+
+    def _worker(self, spec: HookSpec) -> _Worker:
+        with self._lock:
+            w = self._workers.get(spec.name)
+            if w is None:
+                w = self._workers[spec.name] = _Worker(spec, self.base)
+            return w
+
+    def _call(self, spec: HookSpec, event: str, payload: dict) -> Tuple[bool, List[str]]:
+        tag = f"[hook:{event}:{spec.name}]"
+        if spec.mode == "python":
+            allow, message = _verdict(self._func(spec)(event, payload))
+            return allow, [f"{tag} {message}"] if message else []
+        wire = offload_payload(self.workspace, payload, spec.inline_max)
+        try:
+            if spec.mode == "persistent":
+                allow, message = self._worker(spec).request(event, wire)
+                return allow, [f"{tag} {message}"] if message else []
+            proc = subprocess.run(spec.command, cwd=self.base, input=json.dumps(wire), capture_output=True,
+                                  text=True, timeout=spec.timeout)
+        finally:
+            release_payload(wire)
+        msgs = [f"{tag} {proc.stdout.strip()}"] if proc.stdout.strip() else []
+        if proc.stderr.strip():
+            msgs.append(f"[hook:{event}:{spec.name}:stderr] {proc.stderr.strip()}")
+        return proc.returncode == 0, msgs
+
+    def _discover(self, event: str) -> List[DirHook]:
+        with self._lock:
+            hooks = self._dir_hooks.get(event)
+            if hooks is None:
+                hooks = self._dir_hooks[event] = discover_hooks(self.workspace, event)
+            return hooks
+
+    def _record(self, key: str, seconds: float) -> None:
+        with self._lock:
+            st = self.latency.setdefault(key, {"calls": 0, "total_s": 0.0, "max_s": 0.0})
+            st["calls"] += 1
+            st["total_s"] = round(st["total_s"] + seconds, 4)
+            st["max_s"] = round(max(st["max_s"], seconds), 4)
+
+    def has(self, event: str) -> bool:
+        """Gibt es für event überhaupt Hooks (Verzeichnis oder hooks.toml)?"""
+        return bool(self._discover(event)) or any(event in spec.events for spec in self.specs)
+
+    def run(self, event: str, payload: dict) -> Tuple[bool, List[str]]:
+        calls: List[Tuple[str, bool, HookCall]] = [
+            (h.name, h.parallel, lambda h=h: _exec_dir_hook(event, h, payload, self.timeout))
+            for h in self._discover(event)
+        ]
+        calls += [(spec.name, spec.parallel_safe, lambda spec=spec: self._call(spec, event, payload))
+                  for spec in self.specs if event in spec.events]
+        if not calls:
+            return True, []
+        pool = None
+        if sum(1 for _, par, _ in calls if par) > 1:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="devagent-hook")
+                pool = self._pool
+        return _run_all(event, calls, pool, self._record)
+
+    def close(self) -> None:
+        for w in self._workers.values():
+            w.close()
+        self._workers.clear()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self) -> "HookRunner":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,186 @@
+from __future__ import annotations
+import os, re, stat, subprocess
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from .constants import DEFAULT_IGNORES, IGNORE_FILE
+from .utils import hash_str
+
+class _Rule(NamedTuple):
+    pattern: str
+    negate: bool
+    dir_only: bool
+    anchored: bool
+    body: str  # Regex ohne ^/$
+
+def _glob_to_regex(pat: str) -> str:
+    out: List[str] = []
+    i, n = 0, len(pat)
+    while i < n:
+        c = pat[i]
+        if pat.startswith("**/", i) and (i == 0 or pat[i-1] == "/"):
+            out.append("(?:.*/)?"); i += 3; continue
+        if pat.startswith("/**", i) and i + 3 == n:
+            out.append("/.*"); i += 3; continue
+        if pat.startswith("**", i):
+            out.append(".*"); i += 2; continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(pat[i+1])); i += 2; continue
+        elif c == "[":
+            j = pat.find("]", i + 2 if pat[i+1:i+2] in ("!", "^", "]") else i + 1)
+            if j == -1:
+                out.append(re.escape(c))
+            else:
+                cls = pat[i+1:j]
+                if cls[:1] in ("!", "^"):
+                    cls = "^" + cls[1:]
+                out.append("[" + cls.replace("\\", "\\\\") + "]")
+                i = j + 1
+                continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+def _parse_line(line: str) -> Optional[_Rule]:
+    raw = line.rstrip("\n").rstrip("\r")
+    if not raw.strip() or raw.startswith("#"):
+        return None
+    if not raw.endswith("\\ "):
+        raw = raw.rstrip()
+    negate = raw.startswith("!")
+    if negate:
+        raw = raw[1:]
+    elif raw.startswith("\\!") or raw.startswith("\\#"):
+        raw = raw[1:]
+    dir_only = raw.endswith("/")
+    pat = raw.rstrip("/")
+    if not pat:
+        return None
+    anchored = "/" in pat
+    pat = pat.lstrip("/")
+    return _Rule(line.strip(), negate, dir_only, anchored, _glob_to_regex(pat))
+
+def _join(bodies: List[str]) -> Optional[re.Pattern]:
+    return re.compile("^(?:" + "|".join(bodies) + ")$") if bodies else None
+
+class IgnoreMatcher:
+    """Kompilierte .gitignore-Regeln (Negation, verankerte Muster, Ordner-Muster).
+
+    Ohne Negationen werden alle Regeln zu wenigen Sets/Regexen zusammengefasst,
+    sonst gilt wie bei git: die letzte passende Regel gewinnt.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = list(patterns)
+        self.fingerprint = hash_str("\n".join(self.patterns))
+        self.rules: List[_Rule] = [r for r in (_parse_line(p) for p in self.patterns) if r]
+        self._ordered = any(r.negate for r in self.rules)
+        self._regex: Dict[Tuple[bool, bool], re.Pattern] = {}
+        self._names: Dict[bool, set] = {False: set(), True: set()}
+        self._combined: Dict[Tuple[bool, bool], Optional[re.Pattern]] = {}
+        self._dir_cache: Dict[str, bool] = {}
+        if self._ordered:
+            self._compiled = [(r, re.compile("^" + r.body + "$")) for r in self.rules]
+            return
+        bodies: Dict[Tuple[bool, bool], List[str]] = {(a, d): [] for a in (False, True) for d in (False, True)}
+        for r in self.rules:
+            if not r.anchored and re.escape(r.pattern.rstrip("/")) == r.body:
+                self._names[r.dir_only].add(r.pattern.rstrip("/"))
+            else:
+                bodies[(r.anchored, r.dir_only)].append(r.body)
+        self._combined = {k: _join(v) for k, v in bodies.items()}
+
+    def ignored(self, rel: str, is_dir: bool) -> bool:
+        """Prüft nur rel selbst (für den Walk, der ignorierte Ordner ohnehin nicht betritt)."""
+        name = rel.rsplit("/", 1)[-1]
+        if self._ordered:
+            for r, rx in reversed(self._compiled):
+                if r.dir_only and not is_dir:
+                    continue
+                if rx.match(rel if r.anchored else name):
+                    return not r.negate
+            return False
+        if name in self._names[False] or (is_dir and name in self._names[True]):
+            return True
+        for (anchored, dir_only), rx in self._combined.items():
+            if rx is None or (dir_only and not is_dir):
+                continue
+            if rx.match(rel if anchored else name):
+                return True
+        return False
+
+    def ignored_path(self, rel: str) -> bool:
+        """Prüft eine Datei inkl. aller Elternordner (für fertige Dateilisten, z.B. aus git)."""
+        parts = rel.split("/")
+        for i in range(1, len(parts)):
+            d = "/".join(parts[:i])
+            hit = self._dir_cache.get(d)
+            if hit is None:
+                hit = self._dir_cache[d] = self.ignored(d, True)
+            if hit:
+                return True
+        return self.ignored(rel, False)
+
+def _read_patterns(path: str) -> List[str]:
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return f.read().splitlines()
+    except OSError:
+        return []
+
+def _mtime(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+@lru_cache(maxsize=32)
+def _compile(root: str, extra: Tuple[str, ...], _stamp: Tuple[int, int]) -> IgnoreMatcher:
+    patterns = [d + "/" for d in DEFAULT_IGNORES]
+    patterns += _read_patterns(os.path.join(root, ".gitignore"))
+    patterns += _read_patterns(os.path.join(root, IGNORE_FILE))
+    patterns += list(extra)
+    return IgnoreMatcher(patterns)
+
+def compile_ignores(workspace: str, extra_ignores: List[str]) -> IgnoreMatcher:
+    """Defaults + <ws>/.gitignore + .devagent/ignore + Config.ignores, einmal kompiliert.
+    Neu kompiliert wird nur, wenn sich eine der Dateien ändert.
+    """
+    root = os.path.realpath(workspace)
+    stamp = (_mtime(os.path.join(root, ".gitignore")), _mtime(os.path.join(root, IGNORE_FILE)))
+    return _compile(root, tuple(extra_ignores), stamp)
+
+def git_ls_files(workspace: str, matcher: IgnoreMatcher) -> Optional[List[str]]:
+    """Schneller Pfad: 'git ls-files -co --exclude-standard' (beachtet auch verschachtelte .gitignore).
+    None, wenn der Workspace kein Git-Repo ist.
+    """
+    root = os.path.realpath(workspace)
+    try:
+        proc = subprocess.run(["git", "ls-files", "-co", "--exclude-standard", "-z"],
+                              cwd=root, capture_output=True)
+    except OSError:
+        return None
+    if proc.returncode != 0:
+        return None
+    out: List[str] = []
+    for raw in proc.stdout.split(b"\0"):
+        if not raw:
+            continue
+        rel = os.fsdecode(raw)
+        if matcher.ignored_path(rel):
+            continue
+        try:
+            st = os.lstat(os.path.join(root, rel))
+        except OSError:
+            continue  # getrackt, aber im Worktree gelöscht
+        if stat.S_ISDIR(st.st_mode):
+            continue  # Submodule
+        if stat.S_ISLNK(st.st_mode) and os.path.isdir(os.path.join(root, rel)):
+            continue  # wie os.walk: Symlinks auf Ordner nicht als Datei
+        out.append(rel)
+    out.sort()
+    return out
@@ -0,0 +1,225 @@
+from __future__ import annotations
+import os, json, hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from .constants import HEADS_DIR, INDEX_FILE, MAX_FILE_BYTES
+from .scanner import list_dir, scan_tree_parallel
+from .ignore import compile_ignores, git_ls_files
+from .utils import is_text_bytes
+from .rank import extract_terms
+
+INDEX_VERSION = 3
+HEAD_LINES = 120
+_CHUNK = 1024 * 1024
+
+def _hash_file(abs_path: str) -> dict:
+    h = hashlib.sha256()
+    with open(abs_path, "rb") as f:
+        first = f.read(MAX_FILE_BYTES)
+        text = is_text_bytes(first)
+        h.update(first)
+        while True:
+            b = f.read(_CHUNK)
+            if not b:
+                break
+            h.update(b)
+    out = {"sha256": h.hexdigest(), "text": text}
+    if text:
+        out["terms"] = extract_terms(first.decode("utf-8", errors="replace"))
+    return out
+
+class WorkspaceIndex:
+    """Persistenter Datei-Index unter .devagent/index.json.
+
+    Ordner werden nur neu gelistet, wenn sich ihre mtime geändert hat; Dateien
+    werden nur neu gelesen (gehasht), wenn sich size/mtime/inode geändert haben.
+    Datei-Anfänge für die Projektkarte liegen nicht im Index, sondern nach sha256
+    unter .devagent/cache/heads und werden nur für gerankte Dateien erzeugt.
+    """
+
+    def __init__(self, workspace: str, extra_ignores: List[str], workers: int = 0, use_git: bool = True):
+        self.root = os.path.realpath(workspace)
+        self.extra_ignores = list(extra_ignores)
+        self.matcher = compile_ignores(self.root, self.extra_ignores)
+        self.workers = workers
+        self.use_git = use_git
+        self.path = os.path.join(self.root, INDEX_FILE)
+        self.heads_dir = os.path.join(self.root, HEADS_DIR)
+        self._heads: Dict[str, str] = {}
+        self.dirs: Dict[str, dict] = {}
+        self.entries: Dict[str, dict] = {}
+        self.stats = {"dirs_listed": 0, "dirs_cached": 0, "files_hashed": 0, "files_cached": 0}
+        self.timings: List[dict] = []
+        self._dirty = False
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != INDEX_VERSION or data.get("ignores") != self.matcher.fingerprint:
+            return
+        self.dirs = data.get("dirs") or {}
+        self.entries = data.get("files") or {}
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        data = {"version": INDEX_VERSION, "ignores": self.matcher.fingerprint, "dirs": self.dirs, "files": self.entries}
+        tmp = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except OSError:
+            return  # read-only Workspace: Index bleibt flüchtig
+        self._dirty = False
+        self._prune_heads()
+
+    def _head_path(self, sha: str) -> str:
+        return os.path.join(self.heads_dir, f"{sha}-{HEAD_LINES}.txt")
+
+    def _prune_heads(self) -> None:
+        """Löscht Datei-Anfänge, zu denen kein Index-Eintrag mehr passt."""
+        live = {os.path.basename(self._head_path(e["sha256"])) for e in self.entries.values() if "sha256" in e}
+        try:
+            with os.scandir(self.heads_dir) as it:
+                stale = [e.path for e in it if e.name not in live]
+        except OSError:
+            return
+        for path in stale:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _walk(self) -> List[str]:
+        if not self.dirs:
+            # Kalter Start: Top-Level-Unterbäume parallel scannen
+            records: Dict[str, dict] = {}
+            out, self.timings = scan_tree_parallel(self.root, self.extra_ignores, self.workers, records)
+            self.stats["dirs_listed"] += len(records)
+            self.dirs = records
+            self._dirty = True
+            return out
+        new_dirs: Dict[str, dict] = {}
+        out: List[str] = []
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            abs_dir = os.path.join(self.root, rel) if rel else self.root
+            try:
+                mtime = os.stat(abs_dir).st_mtime_ns
+            except OSError:
+                continue
+            old = self.dirs.get(rel)
+            if old is not None and old.get("mtime_ns") == mtime:
+                subdirs, files = old["dirs"], old["files"]
+                self.stats["dirs_cached"] += 1
+            else:
+                subdirs, files = list_dir(abs_dir, rel, self.matcher)
+                self.stats["dirs_listed"] += 1
+                self._dirty = True
+            new_dirs[rel] = {"mtime_ns": mtime, "dirs": subdirs, "files": files}
+            for name in subdirs:
+                stack.append(os.path.join(rel, name) if rel else name)
+            for name in files:
+                out.append(os.path.join(rel, name) if rel else name)
+        if new_dirs.keys() != self.dirs.keys():
+            self._dirty = True
+        self.dirs = new_dirs
+        return out
+
+    def _update_entry(self, rel: str) -> dict:
+        abs_path = os.path.join(self.root, rel)
+        old = self.entries.get(rel)
+        try:
+            st = os.stat(abs_path)
+        except OSError as e:
+            return {"error": str(e)}
+        if old is not None and old.get("size") == st.st_size and old.get("mtime_ns") == st.st_mtime_ns \
+                and old.get("ino") == st.st_ino and "sha256" in old:
+            return old
+        entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "ino": st.st_ino}
+        try:
+            entry.update(_hash_file(abs_path))
+        except OSError as e:
+            entry = {"error": str(e)}
+        return entry
+
+    def refresh(self) -> List[str]:
+        files = git_ls_files(self.root, self.matcher) if self.use_git else None
+        if files is None:
+            files = self._walk()
+        else:
+            self.stats["git"] = 1
+        new_entries: Dict[str, dict] = {}
+        if self.workers != 1 and len(files) > 256:
+            with ThreadPoolExecutor(max_workers=self.workers if self.workers > 0 else None) as ex:
+                updated = list(ex.map(self._update_entry, files, chunksize=64))
+        else:
+            updated = [self._update_entry(rel) for rel in files]
+        for rel, entry in zip(files, updated):
+            if entry is self.entries.get(rel):
+                self.stats["files_cached"] += 1
+            else:
+                self.stats["files_hashed"] += 1
+                self._dirty = True
+            new_entries[rel] = entry
+        if len(new_entries) != len(self.entries):
+            self._dirty = True
+        self.entries = new_entries
+        return self.files()
+
+    def files(self) -> List[str]:
+        return sorted(self.entries)
+
+    def entry(self, rel: str) -> Optional[dict]:
+        return self.entries.get(rel)
+
+    def terms(self, rel: str) -> Dict[str, int]:
+        entry = self.entries.get(rel) or {}
+        return entry.get("terms") or {}
+
+    def head(self, rel: str) -> Optional[str]:
+        """Liefert die ersten HEAD_LINES Zeilen (gecacht nach sha256) oder None für Binärdateien."""
+        entry = self.entries.get(rel)
+        if entry is None or "error" in entry:
+            raise OSError((entry or {}).get("error") or f"not indexed: {rel}")
+        if not entry.get("text"):
+            return None
+        sha = entry["sha256"]
+        head = self._heads.get(sha)
+        if head is not None:
+            return head
+        path = self._head_path(sha)
+        try:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                head = f.read()
+        except OSError:
+            with open(os.path.join(self.root, rel), "rb") as f:
+                b = f.read(MAX_FILE_BYTES)
+                st = os.fstat(f.fileno())
+            head = "\n".join(b.decode("utf-8", errors="replace").splitlines()[:HEAD_LINES])
+            if st.st_size == entry.get("size") and st.st_mtime_ns == entry.get("mtime_ns"):
+                self._store_head(path, head)  # nur, wenn der Inhalt noch zum sha256 passt
+        self._heads[sha] = head
+        return head
+
+    def _store_head(self, path: str, head: str) -> None:
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.heads_dir, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8", newline="") as f:
+                f.write(head)
+            os.replace(tmp, path)
+        except OSError:
+            pass  # read-only Workspace: nur im Speicher
+
+def load_index(workspace: str, extra_ignores: List[str], workers: int = 0, use_git: bool = True) -> WorkspaceIndex:
+    idx = WorkspaceIndex(workspace, extra_ignores, workers, use_git)
+    idx.load()
+    idx.refresh()
+    return idx
@@ -1,73 +1,592 @@
 from __future__ import annotations
-import httpx, json
-from typing import Tuple
+import httpx, json, re, os, time, random, asyncio, atexit, threading, importlib.util
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from .schemas import Plan, Action
+from .config import Config
 from .creds import get_openrouter_key
-from .utils import hash_str
-
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+from .utils import hash_str, json_dump, json_load
+from .constants import LATENCY_FILE
+from .cache import PlanCache
 SYSTEM_TAG = "system"
 USER_TAG = "user"
 
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "actions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "type": {"enum": ["run","edit","create","delete"]},
+                    "cmd": {"type":"array","items":{"type":"string"}},
+                    "file": {"type":"string"},
+                    "patch": {"type":"string"},
+                    "content": {"type":"string"},
+                },
+                "required": ["type"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["actions"],
+    "additionalProperties": False
+}
+SCHEMA_HASH = hash_str(json.dumps(PLAN_SCHEMA, sort_keys=True))
+
+_CLIENTS: Dict[tuple, httpx.Client] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+def _h2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+def _client_settings(cfg: Config) -> Tuple[tuple, dict]:
+    """Schlüssel und httpx-Argumente für einen Pool; gemeinsam für sync und async."""
+    http2 = cfg.http2 and _h2_available()
+    key = (cfg.http_timeout, cfg.http_connect_timeout, cfg.http_max_connections,
+           cfg.http_max_keepalive, cfg.http_keepalive_expiry, http2)
+    return key, dict(
+        timeout=httpx.Timeout(cfg.http_timeout, connect=cfg.http_connect_timeout),
+        limits=httpx.Limits(max_connections=cfg.http_max_connections,
+                            max_keepalive_connections=cfg.http_max_keepalive,
+                            keepalive_expiry=cfg.http_keepalive_expiry),
+        http2=http2,
+    )
+
+def shared_client(cfg: Optional[Config] = None) -> httpx.Client:
+    """Ein langlebiger httpx.Client pro Prozess und Einstellungs-Satz (Keep-Alive, Connection-Pool).
+    HTTP/2 nur, wenn konfiguriert und das optionale Paket 'h2' installiert ist.
+    """
+    key, kwargs = _client_settings(cfg or Config())
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None or client.is_closed:
+            client = _CLIENTS[key] = httpx.Client(**kwargs)
+        return client
+
+_ACLIENTS: Dict[tuple, httpx.AsyncClient] = {}
+_ALOOP: Optional[asyncio.AbstractEventLoop] = None
+
+def async_loop() -> asyncio.AbstractEventLoop:
+    """Prozessweiter Event-Loop in einem Daemon-Thread; dort leben die AsyncClients über Aufrufe hinweg."""
+    global _ALOOP
+    with _CLIENTS_LOCK:
+        if _ALOOP is None or _ALOOP.is_closed():
+            _ALOOP = asyncio.new_event_loop()
+            threading.Thread(target=_ALOOP.run_forever, name="devagent-llm", daemon=True).start()
+        return _ALOOP
+
+def shared_async_client(cfg: Optional[Config] = None) -> httpx.AsyncClient:
+    """Wie shared_client, aber für asyncio; nur innerhalb von async_loop() verwenden."""
+    key, kwargs = _client_settings(cfg or Config())
+    with _CLIENTS_LOCK:
+        client = _ACLIENTS.get(key)
+        if client is None or client.is_closed:
+            client = _ACLIENTS[key] = httpx.AsyncClient(**kwargs)
+        return client
+
+@atexit.register
+def close_shared_clients() -> None:
+    global _ALOOP
+    with _CLIENTS_LOCK:
+        for c in _CLIENTS.values():
+            c.close()
+        _CLIENTS.clear()
+        loop, _ALOOP = _ALOOP, None
+        aclients = list(_ACLIENTS.values())
+        _ACLIENTS.clear()
+    if loop is not None and loop.is_running():
+        for c in aclients:
+            try:
+                asyncio.run_coroutine_threadsafe(c.aclose(), loop).result(timeout=5)
+            except Exception:
+                pass
+        loop.call_soon_threadsafe(loop.stop)
+
+RETRY_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Retry-After als Sekunden oder HTTP-Datum; None, wenn nicht lesbar."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class RequestScheduler:
+    """Prozessweiter Takt für LLM-Requests: Token-Bucket, Concurrency-Cap und Retries.
+
+    Wiederholt wird bei RETRY_STATUS und Transportfehlern, mit exponentiellem Backoff
+    (Full Jitter) bzw. dem Retry-After des Servers. Retries und Wartezeit landen in stats.
+    """
+
+    def __init__(self, max_concurrency: int = 4, rate_per_min: float = 0.0, burst: int = 4,
+                 max_retries: int = 4, backoff_s: float = 1.0, backoff_max_s: float = 60.0,
+                 sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic):
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.backoff_max_s = backoff_max_s
+        self.rate = rate_per_min / 60.0
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._sleep = sleep
+        self._clock = clock
+        self._stamp = clock()
+        self._lock = threading.Lock()
+        self._sem = threading.BoundedSemaphore(max(1, max_concurrency))
+
+    def _reserve(self) -> float:
+        """Nimmt ein Token (ggf. auf Vorschuss) und liefert die nötige Wartezeit."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(float(self.burst), self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= 1.0
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def _delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        ra = retry_after_seconds(response.headers.get("Retry-After")) if response is not None else None
+        if ra is None:
+            ra = random.random() * self.backoff_s * (2 ** attempt)
+        return min(ra, self.backoff_max_s)
+
+    @staticmethod
+    def _count(stats: Optional[dict], field: str, value: float) -> None:
+        if stats is not None:
+            stats[field] = round(stats.get(field, 0) + value, 3)
+
+    @contextmanager
+    def request(self, send: Callable[[], httpx.Response], stats: Optional[dict] = None) -> Iterator[httpx.Response]:
+        """Führt send() mit Retries aus; der Slot bleibt belegt, bis der Block (z.B. ein Stream) endet."""
+        attempt = 0
+        while True:
+            wait = self._reserve()
+            if wait:
+                self._count(stats, "wait_s", wait)
+                self._sleep(wait)
+            t0 = self._clock()
+            self._sem.acquire()
+            self._count(stats, "wait_s", self._clock() - t0)
+            response = None
+            try:
+                try:
+                    response = send()
+                except httpx.TransportError:
+                    if attempt >= self.max_retries:
+                        raise
+                else:
+                    if response.status_code not in RETRY_STATUS or attempt >= self.max_retries:
+                        try:
+                            yield response
+                        finally:
+                            response.close()
+                        return
+                    response.close()
+            finally:
+                self._sem.release()
+            delay = self._delay(attempt, response)
+            self._count(stats, "retries", 1)
+            self._count(stats, "wait_s", delay)
+            self._sleep(delay)
+            attempt += 1
+
+    @asynccontextmanager
+    async def arequest(self, send: Callable[[], Awaitable[httpx.Response]], stats: Optional[dict] = None) -> AsyncIterator[httpx.Response]:
+        """asyncio-Variante von request(); teilt Token-Bucket und Concurrency-Cap mit den Threads."""
+        attempt = 0
+        while True:
+            t0 = self._clock()
+            wait = self._reserve()
+            if wait:
+                await asyncio.sleep(wait)
+            if not self._sem.acquire(blocking=False):
+                acquired = asyncio.ensure_future(asyncio.to_thread(self._sem.acquire))
+                try:
+                    await asyncio.shield(acquired)
+                except asyncio.CancelledError:
+                    # Den Slot, den der Thread noch bekommt, sofort zurückgeben.
+                    acquired.add_done_callback(lambda f: f.cancelled() or self._sem.release())
+                    raise
+            self._count(stats, "wait_s", self._clock() - t0)
+            response = None
+            try:
+                try:
+                    response = await send()
+                except httpx.TransportError:
+                    if attempt >= self.max_retries:
+                        raise
+                else:
+                    if response.status_code not in RETRY_STATUS or attempt >= self.max_retries:
+                        try:
+                            yield response
+                        finally:
+                            await response.aclose()
+                        return
+                    await response.aclose()
+            finally:
+                self._sem.release()
+            delay = self._delay(attempt, response)
+            self._count(stats, "retries", 1)
+            self._count(stats, "wait_s", delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+_SCHEDULERS: Dict[tuple, RequestScheduler] = {}
+
+def scheduler(cfg: Optional[Config] = None) -> RequestScheduler:
+    """Ein RequestScheduler pro Prozess und Einstellungs-Satz, geteilt von allen Clients."""
+    cfg = cfg or Config()
+    key = (cfg.llm_max_concurrency, cfg.llm_rate_per_min, cfg.llm_burst,
+           cfg.llm_max_retries, cfg.llm_backoff_s, cfg.llm_backoff_max_s)
+    with _CLIENTS_LOCK:
+        s = _SCHEDULERS.get(key)
+        if s is None:
+            s = _SCHEDULERS[key] = RequestScheduler(*key)
+        return s
+
 class LLMClient:
-    def __init__(self, model: str, workspace: str | None = None):
+    def __init__(self, model: str, workspace: str | None = None, cfg: Optional[Config] = None,
+                 cache: Optional[PlanCache] = None, context: Optional[List[str]] = None):
         self.model = model
+        self.context = list(context or [])  # zusätzliche User-Nachrichten vor dem Prompt (z.B. Vollkarte)
         self.workspace = workspace or "."
+        self.cfg = cfg or Config()
+        self.url = self.cfg.api_url
+        self.cache = cache
+        self.stats: Dict[str, object] = {"model": model}
+        self._hdrs: Optional[dict] = None
 
     def _headers(self) -> dict:
+        # Key nur einmal pro Client auflösen (creds cached zusätzlich per mtime)
+        if self._hdrs is not None:
+            return self._hdrs
         key = get_openrouter_key(self.workspace)
         if not key:
             raise RuntimeError("Kein OpenRouter API-Key gefunden. Nutze 'devagent key set' oder /key set.")
-        return {
+        self._hdrs = {
             "Authorization": f"Bearer {key}",
             "HTTP-Referer": "https://devagent.local",
             "X-Title": "devagent",
             "Content-Type": "application/json",
         }
+        return self._hdrs
 
-    def generate_plan(self, system_prompt: str, user_prompt: str) -> Tuple[Plan, str]:
+    def _body(self, system_prompt: str, user_prompt: str, stream: bool = False, model: Optional[str] = None) -> dict:
         body = {
-            "model": self.model,
+            "model": model or self.model,
             "messages": [
                 {"role": SYSTEM_TAG, "content": system_prompt},
+                *({"role": USER_TAG, "content": c} for c in self.context),
                 {"role": USER_TAG, "content": user_prompt},
             ],
             "temperature": 0.2,
             "response_format": { "type": "json_schema", "json_schema": {
                 "name": "action_plan",
-                "schema": {
-                    "type": "object",
-                    "properties": {
-                        "actions": {
-                            "type": "array",
-                            "items": {
-                                "type": "object",
-                                "properties": {
-                                    "type": {"enum": ["run","edit","create","delete"]},
-                                    "cmd": {"type":"array","items":{"type":"string"}},
-                                    "file": {"type":"string"},
-                                    "patch": {"type":"string"},
-                                    "content": {"type":"string"},
-                                },
-                                "required": ["type"],
-                                "additionalProperties": False
-                            }
-                        }
-                    },
-                    "required": ["actions"],
-                    "additionalProperties": False
-                }
+                "schema": PLAN_SCHEMA,
             }},
         }
-        with httpx.Client(timeout=60) as client:
-            r = client.post(OPENROUTER_URL, headers=self._headers(), json=body)
+        if stream:
+            body["stream"] = True
+        return body
+
+    def generate_plan(self, system_prompt: str, user_prompt: str, stream: bool = False,
+                      on_action: Optional[Callable[[int, Action], None]] = None) -> Tuple[Plan, str]:
+        """Erzeugt einen Plan. Mit stream=True wird on_action für jede fertige Aktion sofort aufgerufen.
+        Mit Cache liefert ein Treffer die gespeicherte rohe 'actions'-Liste (gleicher plan_hash).
+        """
+        key = None
+        if self.cache is not None:
+            key = PlanCache.key(self.model, system_prompt, self._cache_prompt(user_prompt), SCHEMA_HASH)
+            cached = self.cache.get(key)
+            self.stats["cache"] = "hit" if cached is not None else "miss"
+            self.stats.update(self.cache.totals())
+            if cached is not None:
+                if on_action:
+                    for i, raw in enumerate(cached):
+                        on_action(i, Action.model_validate(raw))
+                return _plan_from_raw(cached)
+
+        if stream:
+            actions_raw: List[dict] = []
+            for raw in self.stream_actions_raw(system_prompt, user_prompt):
+                actions_raw.append(raw)
+                if on_action:
+                    on_action(len(actions_raw) - 1, Action.model_validate(raw))
+        else:
+            actions_raw = self._request_actions(system_prompt, user_prompt)
+        result = _plan_from_raw(actions_raw)
+        if key is not None:
+            self.cache.put(key, actions_raw)
+        return result
+
+    def _cache_prompt(self, user_prompt: str) -> str:
+        return "\0".join(self.context + [user_prompt])
+
+    def _request_actions(self, system_prompt: str, user_prompt: str) -> List[dict]:
+        body = self._body(system_prompt, user_prompt)
+        client = shared_client(self.cfg)
+        with scheduler(self.cfg).request(lambda: client.post(self.url, headers=self._headers(), json=body), self.stats) as r:
             r.raise_for_status()
-            data = r.json()
-
-        content = data["choices"][0]["message"]["content"]
-        payload = json.loads(content) if isinstance(content, str) else content
-        actions_raw = payload.get("actions") or []
-        actions = [Action.model_validate(a) for a in actions_raw]
-        plan = Plan(actions=actions)
-        plan_hash = hash_str(json.dumps(actions_raw, ensure_ascii=False, sort_keys=True))
+            return _actions_from_response(r.json())
+
+    def stream_actions_raw(self, system_prompt: str, user_prompt: str) -> Iterator[dict]:
+        """SSE-Stream ("stream": true); liefert jede Aktion als dict, sobald ihr JSON-Objekt vollständig ist."""
+        body = self._body(system_prompt, user_prompt, stream=True)
+        parser = ActionStreamParser()
+        client = shared_client(self.cfg)
+        request = client.build_request("POST", self.url, headers=self._headers(), json=body)
+        with scheduler(self.cfg).request(lambda: client.send(request, stream=True), self.stats) as r:
+            if r.status_code >= 400:
+                r.read()
+            r.raise_for_status()
+            for delta in iter_sse_content(r.iter_lines()):
+                yield from parser.feed(delta)
+        if not parser.started:
+            raise ValueError("Stream enthielt keinen 'actions'-Block")
+        if not parser.done:  # Verbindungsabbruch, finish_reason "length", ...
+            raise ValueError("Stream abgebrochen: 'actions'-Liste unvollständig")
+
+    def stream_actions(self, system_prompt: str, user_prompt: str) -> Iterator[Action]:
+        for raw in self.stream_actions_raw(system_prompt, user_prompt):
+            yield Action.model_validate(raw)
+
+def _actions_from_response(data: dict) -> List[dict]:
+    content = data["choices"][0]["message"]["content"]
+    payload = json.loads(content) if isinstance(content, str) else content
+    return payload.get("actions") or []
+
+def _plan_from_raw(actions_raw: List[dict]) -> Tuple[Plan, str]:
+    actions = [Action.model_validate(a) for a in actions_raw]
+    plan = Plan(actions=actions)
+    plan_hash = hash_str(json.dumps(actions_raw, ensure_ascii=False, sort_keys=True))
+    return plan, plan_hash
+
+def iter_sse_content(lines: Iterable[str]) -> Iterator[str]:
+    """Extrahiert choices[0].delta.content aus Server-Sent-Events (OpenAI-/OpenRouter-Format)."""
+    for line in lines:
+        if not line or line.startswith(":"):
+            continue  # Keep-Alive-Kommentare wie ': OPENROUTER PROCESSING'
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        chunk = json.loads(data)
+        if "error" in chunk:
+            raise RuntimeError(f"LLM-Stream-Fehler: {chunk['error']}")
+        for choice in chunk.get("choices") or []:
+            content = (choice.get("delta") or {}).get("content")
+            if content:
+                yield content
+
+class ActionStreamParser:
+    """Inkrementeller Parser für {"actions": [ {...}, {...} ]}.
+
+    feed() nimmt beliebige Textstücke und gibt die Aktions-Objekte zurück, die damit
+    vollständig geworden sind. Strings (inkl. Escapes) werden korrekt übersprungen.
+    """
+
+    _START_RE = re.compile(r'"actions"\s*:\s*\[')
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0
+        self.started = False
+        self.done = False
+        self._depth = 0
+        self._obj_start = -1
+        self._in_str = False
+        self._esc = False
+
+    def feed(self, text: str) -> List[dict]:
+        out: List[dict] = []
+        self.buf += text
+        if self.done:
+            return out
+        if not self.started:
+            m = self._START_RE.search(self.buf)
+            if not m:
+                return out
+            self.started = True
+            self.pos = m.end()
+        buf = self.buf
+        i = self.pos
+        while i < len(buf):
+            c = buf[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+            elif c == '"':
+                self._in_str = True
+            elif c in "{[":
+                if self._depth == 0:
+                    self._obj_start = i
+                self._depth += 1
+            elif c in "}]":
+                if self._depth == 0 and c == "]":
+                    self.done = True
+                    i += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0:
+                    out.append(json.loads(buf[self._obj_start:i + 1]))
+                    self._obj_start = -1
+            i += 1
+        # Bereits verarbeiteten Text verwerfen, damit der Puffer nicht wächst
+        keep = self._obj_start if self._obj_start >= 0 else i
+        self.buf = buf[keep:]
+        if self._obj_start >= 0:
+            self._obj_start = 0
+        self.pos = i - keep
+        return out
+
+class LatencyStats:
+    """Gleitendes Fenster der Antwortzeiten je Modell (persistiert), Basis für das Hedge-Delay."""
+
+    def __init__(self, workspace: str, window: int = 50):
+        self.path = os.path.join(os.path.realpath(workspace), LATENCY_FILE)
+        self.window = window
+        self.samples: Dict[str, List[float]] = json_load(self.path) or {}
+
+    def record(self, model: str, seconds: float) -> None:
+        xs = self.samples.setdefault(model, [])
+        xs.append(round(seconds, 3))
+        del xs[:-self.window]
+
+    def p95(self, model: str, min_samples: int = 5) -> Optional[float]:
+        xs = sorted(self.samples.get(model) or [])
+        if len(xs) < min_samples:
+            return None
+        return xs[min(len(xs) - 1, int(round(0.95 * (len(xs) - 1))))]
+
+    def save(self) -> None:
+        try:
+            json_dump(self.path, self.samples)
+        except OSError:
+            pass
+
+class AsyncLLMClient(LLMClient):
+    """asyncio-Variante: schickt dieselbe Plan-Anfrage an mehrere Modelle.
+
+    Race: alle Modelle sofort; Hedge: das nächste Modell erst nach dem p95 des vorherigen
+    (bzw. sofort, wenn das vorherige scheitert). Gewinnt die erste Antwort, die parst und
+    validate() ohne Fehler besteht; alle anderen Requests werden abgebrochen.
+    """
+
+    def __init__(self, models: List[str], workspace: str | None = None, cfg: Optional[Config] = None,
+                 cache: Optional[PlanCache] = None, validate: Optional[Callable[[Plan], List[str]]] = None,
+                 latency: Optional[LatencyStats] = None, context: Optional[List[str]] = None):
+        super().__init__(models[0], workspace, cfg, cache, context)
+        self.models = list(dict.fromkeys(models))
+        self.validate = validate
+        self.latency = latency or LatencyStats(self.workspace)
+        self.stats["race"] = {}
+
+    def _hedge_delay(self, model: str) -> float:
+        p95 = self.latency.p95(model)
+        return max(0.0, p95) if p95 is not None else self.cfg.hedge_delay_s
+
+    async def _request_async(self, client: httpx.AsyncClient, model: str, system_prompt: str, user_prompt: str) -> List[dict]:
+        body = self._body(system_prompt, user_prompt, model=model)
+        request = client.build_request("POST", self.url, headers=self._headers(), json=body)
+        async with scheduler(self.cfg).arequest(lambda: client.send(request), self.stats) as r:
+            r.raise_for_status()
+            return _actions_from_response(r.json())
+
+    async def agenerate_plan(self, system_prompt: str, user_prompt: str) -> Tuple[Plan, str]:
+        key = None
+        if self.cache is not None:
+            key = PlanCache.key(",".join(self.models), system_prompt, self._cache_prompt(user_prompt), SCHEMA_HASH)
+            cached = self.cache.get(key)
+            self.stats["cache"] = "hit" if cached is not None else "miss"
+            self.stats.update(self.cache.totals())
+            if cached is not None:
+                return _plan_from_raw(cached)
+
+        race: Dict[str, object] = self.stats["race"]  # type: ignore[assignment]
+        if asyncio.get_running_loop() is _ALOOP:
+            client, own = shared_async_client(self.cfg), None
+        else:  # fremder Loop: Client nur für diesen Aufruf
+            client = own = httpx.AsyncClient(**_client_settings(self.cfg)[1])
+        try:
+            pending: Dict[asyncio.Task, Tuple[str, float]] = {}
+            queue = list(self.models)
+
+            def launch() -> None:
+                m = queue.pop(0)
+                task = asyncio.create_task(self._request_async(client, m, system_prompt, user_prompt))
+                pending[task] = (m, time.perf_counter())
+
+            launch()
+            while not self.cfg.hedge and queue:
+                launch()
+            try:
+                while pending:
+                    last = self.models[len(self.models) - len(queue) - 1]
+                    wait_for = self._hedge_delay(last) if queue else None
+                    done, _ = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+                    if not done:
+                        launch()  # Hedge: vorheriges Modell zu langsam
+                        continue
+                    for task in done:
+                        m, t0 = pending.pop(task)
+                        dt = time.perf_counter() - t0
+                        try:
+                            raw = task.result()
+                            self.latency.record(m, dt)
+                            plan, plan_hash = _plan_from_raw(raw)
+                            errs = self.validate(plan) if self.validate else []
+                        except Exception as e:
+                            errs = [f"{type(e).__name__}: {e}"]
+                        if errs:
+                            race[m] = {"seconds": round(dt, 3), "errors": errs[:3]}
+                            if queue and not pending:
+                                launch()
+                            continue
+                        race[m] = {"seconds": round(dt, 3), "winner": True}
+                        self.model = m
+                        self.stats["model"] = m
+                        if key is not None:
+                            self.cache.put(key, raw)
+                        return plan, plan_hash
+            finally:
+                for task in pending:
+                    task.cancel()
+                    race.setdefault(pending[task][0], {"cancelled": True})
+                if pending:
+                    await asyncio.gather(*pending, return_exceptions=True)
+                self.latency.save()
+        finally:
+            if own is not None:
+                await own.aclose()
+        raise RuntimeError("Kein Modell lieferte einen gültigen Plan: " +
+                           "; ".join(f"{m}: {r}" for m, r in race.items()))
+
+    def generate_plan(self, system_prompt: str, user_prompt: str, stream: bool = False,
+                      on_action: Optional[Callable[[int, Action], None]] = None) -> Tuple[Plan, str]:
+        """Synchrone Hülle für CLI/REPL; stream wird beim Racing ignoriert.
+        Läuft auf async_loop(), damit Verbindungen von Aufruf zu Aufruf wiederverwendet werden.
+        """
+        future = asyncio.run_coroutine_threadsafe(self.agenerate_plan(system_prompt, user_prompt), async_loop())
+        try:
+            plan, plan_hash = future.result()
+        except BaseException:
+            future.cancel()  # z.B. Strg+C: offene Requests im Loop abbrechen
+            raise
+        if on_action:
+            for i, a in enumerate(plan.actions):
+                on_action(i, a)
         return plan, plan_hash
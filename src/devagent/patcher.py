@@ -1,6 +1,17 @@
 from __future__ import annotations
-import os, tempfile
-from .utils import run_cmd
+import os, re, tempfile
+from typing import Dict, List, Optional, Set, Tuple
+from unidiff import PatchSet, UnidiffParseError
+from .jail import ensure_inside
+from .utils import run_cmd, atomic_write_text
+
+FUZZ = 2  # max. ignorierte Kontextzeilen am Hunk-Anfang/-Ende (wie 'patch -F2')
+
+class PatchError(ValueError):
+    """Patch passt nicht auf den aktuellen Stand."""
+
+class PatchUnsupported(PatchError):
+    """Patch-Form, die nur git apply beherrscht (binär, Umbenennung, Submodule)."""
 
 def apply_patch_git(workspace: str, patch_text: str) -> bool:
     # sichere Anwendung via git apply --check, dann git apply
@@ -18,3 +29,184 @@ def apply_patch_git(workspace: str, patch_text: str) -> bool:
             os.remove(tmp)
         except FileNotFoundError:
             pass
+
+_PATCH_PATH_RE = re.compile(r"^(?:\+\+\+|---) (?:[ab]/)?(\S+)", re.M)
+_GIT_ERR_RE = re.compile(r"^error: (?:patch failed: )?(.+?)(?::\d+)?(?:: .*)?$", re.M)
+
+def patch_paths(patch_text: str) -> Set[str]:
+    """Pfade aus den ---/+++-Kopfzeilen (ohne a/ b/ Präfix, /dev/null ausgenommen)."""
+    return {os.path.normpath(m) for m in _PATCH_PATH_RE.findall(patch_text or "") if m != "/dev/null"}
+
+def _git_apply(workspace: str, patch_text: str, check: bool) -> Tuple[int, str]:
+    with tempfile.NamedTemporaryFile("w", delete=False, suffix=".patch") as tf:
+        tf.write(patch_text)
+        tmp = tf.name
+    try:
+        code, _, err = run_cmd(["git", "apply"] + (["--check"] if check else []) + [tmp], cwd=workspace)
+        return code, err
+    finally:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+
+def apply_patches_git(workspace: str, patches: List[str]) -> Tuple[bool, Dict[int, str]]:
+    """Mehrere Patches als ein kombinierter Patch: ein 'git apply --check' und ein 'git apply'.
+    Scheitert der Check, wird nichts angewendet; das Ergebnis ordnet die git-Fehler den
+    Patches (Index) über die betroffenen Dateien zu."""
+    combined = "".join(p if p.endswith("\n") else p + "\n" for p in patches)
+    code, err = _git_apply(workspace, combined, check=True)
+    if code == 0:
+        code, err = _git_apply(workspace, combined, check=False)
+        if code == 0:
+            return True, {}
+    owners: Dict[str, List[int]] = {}
+    for i, p in enumerate(patches):
+        for path in patch_paths(p):
+            owners.setdefault(path, []).append(i)
+    failures: Dict[int, str] = {}
+    for m in _GIT_ERR_RE.finditer(err):
+        path = os.path.normpath(m.group(1).strip())
+        for i in owners.get(path, []):
+            failures.setdefault(i, m.group(0)[len("error: "):])
+    if not failures:
+        failures[0] = err.strip() or f"git apply exit {code}"
+    return False, failures
+
+def _eol(line: str) -> str:
+    return "\r\n" if line.endswith("\r\n") else "\n" if line.endswith("\n") else ""
+
+def _key(line: str) -> str:
+    return line[:len(line) - len(_eol(line))]
+
+def _ops(hunk) -> List[Tuple[str, str]]:
+    """(typ, zeile) mit ' ', '-', '+'; '\\ No newline' entfernt das Zeilenende der Vorzeile."""
+    ops: List[Tuple[str, str]] = []
+    for ln in hunk:
+        if ln.line_type == "\\":
+            if ops:
+                t, v = ops[-1]
+                ops[-1] = (t, _key(v))
+            continue
+        if ln.line_type in (" ", "-", "+"):
+            ops.append((ln.line_type, ln.value))
+    return ops
+
+def _find(keys: List[str], src: List[str], hint: int, lo: int) -> Optional[int]:
+    """Nächstgelegene Position >= lo, an der src exakt passt (Versatz in beide Richtungen)."""
+    n, m = len(keys), len(src)
+    hint = min(max(hint, lo), max(lo, n - m))
+    for delta in range(0, n + 1):
+        below, above = hint - delta, hint + delta
+        if below < lo and above > n - m:
+            break
+        for pos in ((hint,) if delta == 0 else (below, above)):
+            if lo <= pos <= n - m and keys[pos:pos + m] == src:
+                return pos
+    return None
+
+def apply_to_text(text: str, pf, fuzz: int = FUZZ) -> Tuple[str, List[str]]:
+    """Wendet alle Hunks einer Datei auf text an; liefert (neuer Text, Hinweise zu Versatz/Fuzz)."""
+    lines = text.splitlines(keepends=True)
+    keys = [_key(x) for x in lines]
+    nl = _eol(lines[0]) if lines and _eol(lines[0]) else "\n"
+    out: List[str] = []
+    notes: List[str] = []
+    cursor = offset = 0
+    for n, hunk in enumerate(pf, 1):
+        ops = _ops(hunk)
+        lead = next((i for i, (t, _) in enumerate(ops) if t != " "), len(ops))
+        trail = next((i for i, (t, _) in enumerate(reversed(ops)) if t != " "), len(ops))
+        base = hunk.source_start - (0 if hunk.source_length == 0 else 1)
+        for f in range(fuzz + 1):
+            cut_lead, cut_trail = min(f, lead), min(f, trail)
+            part = ops[cut_lead:len(ops) - cut_trail]
+            src = [_key(v) for t, v in part if t != "+"]
+            hint = base + offset + cut_lead
+            pos = _find(keys, src, hint, cursor)
+            if pos is not None:
+                break
+        else:
+            raise PatchError(f"{pf.path}: Hunk #{n} passt nicht (@@ -{hunk.source_start},{hunk.source_length} @@)")
+        if pos != hint:
+            notes.append(f"{pf.path}: Hunk #{n} mit Versatz {pos - hint:+d}")
+        if f:
+            notes.append(f"{pf.path}: Hunk #{n} mit Fuzz {f}")
+        offset = pos - base - cut_lead
+        out.extend(lines[cursor:pos])
+        p = pos
+        for t, v in part:
+            if t == " ":
+                out.append(lines[p]); p += 1
+            elif t == "-":
+                p += 1
+            else:
+                out.append(v[:-1] + nl if nl == "\r\n" and _eol(v) == "\n" else v)
+        cursor = p
+    out.extend(lines[cursor:])
+    for i in range(len(out) - 1):  # Zeilen ohne Umbruch nur am Dateiende
+        if not _eol(out[i]):
+            out[i] += nl
+    return "".join(out), notes
+
+def parse_patch(patch_text: str) -> PatchSet:
+    try:
+        ps = PatchSet(patch_text)
+    except UnidiffParseError as e:
+        raise PatchError(f"Patch nicht lesbar: {e}")
+    if not len(ps):
+        raise PatchError("Patch enthält keine Dateien")
+    return ps
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+    except UnicodeDecodeError:
+        raise PatchUnsupported(f"{path}: keine UTF-8-Textdatei")
+
+def compute_patch(workspace: str, patch_text: str, files: Optional[Dict[str, Optional[str]]] = None,
+                  fuzz: int = FUZZ, notes: Optional[List[str]] = None) -> Dict[str, Optional[str]]:
+    """Neue Inhalte je Datei (None = löschen), ohne etwas zu schreiben.
+    files: virtueller Stand (rel -> Inhalt/None) vorheriger Aktionen, z.B. beim Verify."""
+    result: Dict[str, Optional[str]] = {}
+    for pf in parse_patch(patch_text):
+        if getattr(pf, "is_binary_file", False) or getattr(pf, "is_rename", False) or getattr(pf, "is_submodule", False):
+            raise PatchUnsupported(f"{pf.path}: binär/Umbenennung nur via git apply")
+        rel = pf.path
+        try:
+            target = ensure_inside(workspace, rel)
+        except ValueError as e:
+            raise PatchError(f"{rel}: {e}")
+        if rel in result:
+            current = result[rel]
+        elif files is not None and rel in files:
+            current = files[rel]
+        else:
+            current = _read(target)
+        if pf.is_added_file and current:
+            raise PatchError(f"{rel}: existiert bereits")
+        if not pf.is_added_file and current is None:
+            raise PatchError(f"{rel}: Datei fehlt")
+        new, hunk_notes = apply_to_text(current or "", pf, fuzz)
+        if notes is not None:
+            notes.extend(hunk_notes)
+        result[rel] = None if pf.is_removed_file else new
+    return result
+
+def apply_patch(workspace: str, patch_text: str, fuzz: int = FUZZ) -> List[str]:
+    """In-Process-Anwendung: erst alle Dateien im Speicher patchen, dann atomar schreiben.
+    Wirft PatchError, ohne etwas verändert zu haben. Gibt die Hinweise (Versatz/Fuzz) zurück."""
+    notes: List[str] = []
+    changes = compute_patch(workspace, patch_text, fuzz=fuzz, notes=notes)
+    root = os.path.realpath(workspace)
+    for rel, content in changes.items():
+        path = os.path.join(root, rel)
+        if content is None:
+            try: os.remove(path)
+            except FileNotFoundError: pass
+        else:
+            atomic_write_text(path, content)
+    return notes
@@ -1,26 +1,136 @@
 from __future__ import annotations
-import os, yaml
+import hashlib, json, os, time, yaml
 from typing import Any, Dict, List
-from .constants import PLAN_FILE, PREVIEW_CODE_FILE
+from pydantic import PrivateAttr
+from .constants import PLAN_FILE, LEGACY_PLAN_FILE, BLOBS_DIR, PREVIEW_CODE_FILE
 from .schemas import Plan, Action
+from .utils import atomic_write_text
+
+# Plan-Speicher: .devagent/plan.json hält nur die Metadaten; große content/patch-Felder liegen
+# inhaltsadressiert unter .devagent/blobs/<sha256> und werden erst beim ersten Zugriff gelesen.
+# Ein altes .devagent/plan.yaml wird weiterhin gelesen (CSafeLoader, falls vorhanden).
+
+BLOB_MIN_CHARS = 2048
+BLOB_FIELDS = ("content", "patch")
+BLOB_KEEP_S = 3600  # unreferenzierte Blobs bleiben so lange liegen (parallele Leser)
 
 def _plan_path(workspace: str) -> str:
     return os.path.join(workspace, PLAN_FILE)
 
+def _blob_path(workspace: str, sha: str) -> str:
+    if len(sha) != 64 or not all(c in "0123456789abcdef" for c in sha):
+        raise ValueError(f"Ungültige Blob-ID: {sha!r}")
+    return os.path.join(workspace, BLOBS_DIR, sha)
+
+def put_blob(workspace: str, text: str) -> str:
+    sha = hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+    path = _blob_path(workspace, sha)
+    if not os.path.exists(path):
+        atomic_write_text(path, text)
+    return sha
+
+def read_blob(workspace: str, sha: str) -> str:
+    try:
+        with open(_blob_path(workspace, sha), "r", encoding="utf-8", newline="") as f:
+            return f.read()
+    except FileNotFoundError:
+        raise ValueError(f"Plan-Blob fehlt: {sha} (Plan neu erzeugen)") from None
+
+class StoredAction(Action):
+    """Action aus plan.json; Felder mit Blob-Referenz werden beim ersten Zugriff geladen."""
+    _workspace: str = PrivateAttr("")
+    _refs: Dict[str, str] = PrivateAttr(default_factory=dict)
+
+    @classmethod
+    def stored(cls, workspace: str, fields: Dict[str, Any], refs: Dict[str, str]) -> "StoredAction":
+        a = cls.model_construct(**fields)
+        a._workspace = workspace
+        a._refs = dict(refs)
+        for name in refs:
+            a.__dict__.pop(name, None)  # fehlt im __dict__ => __getattr__ lädt nach
+        return a
+
+    def __getattr__(self, name: str) -> Any:
+        refs = (self.__pydantic_private__ or {}).get("_refs")
+        if refs and name in refs:
+            value = read_blob(self._workspace, refs.pop(name))
+            self.__dict__[name] = value
+            return value
+        return super().__getattr__(name)
+
+    def load(self) -> "StoredAction":
+        for name in list(self._refs):
+            getattr(self, name)
+        return self
+
+    def model_dump(self, **kwargs: Any) -> Dict[str, Any]:
+        return super(StoredAction, self.load()).model_dump(**kwargs)
+
+def _gc_blobs(workspace: str, keep: set) -> None:
+    d = os.path.join(workspace, BLOBS_DIR)
+    now = time.time()
+    try:
+        it = os.scandir(d)
+    except OSError:
+        return
+    with it:
+        for e in it:
+            if e.name in keep or e.name.startswith("."):
+                continue
+            try:
+                if now - e.stat().st_mtime > BLOB_KEEP_S:
+                    os.remove(e.path)
+            except OSError:
+                pass
+
 def save_plan(workspace: str, plan: Plan) -> None:
     path = _plan_path(workspace)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    data = {"actions": [a.model_dump() for a in plan.actions]}
-    with open(path, "w", encoding="utf-8") as f:
-        yaml.safe_dump(data, f, sort_keys=False, allow_unicode=True)
+    actions: List[Dict[str, Any]] = []
+    keep: set = set()
+    for a in plan.actions:
+        rec = a.model_dump(exclude_none=True)
+        for name in BLOB_FIELDS:
+            value = rec.get(name)
+            if isinstance(value, str) and len(value) >= BLOB_MIN_CHARS:
+                sha = put_blob(workspace, value)
+                keep.add(sha)
+                rec[name] = {"$blob": sha, "chars": len(value)}
+        actions.append(rec)
+    atomic_write_text(path, json.dumps({"version": 1, "actions": actions}, ensure_ascii=False, separators=(",", ":")))
+    try:
+        os.remove(os.path.join(workspace, LEGACY_PLAN_FILE))  # sonst würde ein veralteter Plan sichtbar
+    except FileNotFoundError:
+        pass
+    _gc_blobs(workspace, keep)
+
+def _load_legacy(workspace: str) -> Plan:
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(os.path.join(workspace, LEGACY_PLAN_FILE), "r", encoding="utf-8") as f:
+        data = yaml.load(f, Loader=loader) or {}
+    actions_raw: List[Dict[str, Any]] = data.get("actions") or []
+    # None-Felder weglassen: content=None vor patch würde den Edit-Validator auslösen
+    actions = [Action.model_validate({k: v for k, v in a.items() if v is not None}) for a in actions_raw]
+    return Plan(actions=actions)
 
 def load_plan(workspace: str) -> Plan:
     path = _plan_path(workspace)
+    if not os.path.exists(path) and os.path.exists(os.path.join(workspace, LEGACY_PLAN_FILE)):
+        return _load_legacy(workspace)
     with open(path, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f) or {}
-    actions_raw: List[Dict[str, Any]] = data.get("actions") or []
-    actions = [Action.model_validate(a) for a in actions_raw]
-    return Plan(actions=actions)
+        data = json.load(f)
+    actions: List[Action] = []
+    for rec in data.get("actions") or []:
+        refs: Dict[str, str] = {}
+        for name in BLOB_FIELDS:
+            value = rec.get(name)
+            if isinstance(value, dict) and "$blob" in value:
+                refs[name] = value["$blob"]
+                del rec[name]
+        if refs:
+            actions.append(StoredAction.stored(workspace, rec, refs))
+        else:
+            actions.append(Action.model_validate(rec))
+    return Plan.model_construct(actions=actions)
 
 def save_approval_code(workspace: str, code: str) -> None:
     ap = os.path.join(workspace, PREVIEW_CODE_FILE)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+from .config import Config
+from .scanner import CardSnapshot, build_card
+from .budget import CardBudget, budget_for, estimate_tokens
+from .res import read_template
+from .utils import is_git_repo
+
+def card_budget(cfg: Config, model: str, fixed_text: str) -> CardBudget:
+    ctx = cfg.model_context.get(model, cfg.context_tokens)
+    tokens = budget_for(ctx, fixed_text, cfg.response_tokens, cfg.token_estimator) if ctx > 0 else None
+    return CardBudget(tokens=tokens, estimator=cfg.token_estimator, files_share=cfg.card_files_share,
+                      max_files=cfg.card_max_files, max_samples=cfg.card_max_samples)
+
+MAX_DELTA_LIST = 50  # Dateinamen je Kategorie im Delta
+
+class CardSession:
+    """Zuletzt gesendete Vollkarte einer REPL-Sitzung; Folge-Turns schicken nur das Delta.
+
+    Die Vollkarte steht als eigene User-Nachricht (context) vor dem Turn-Prompt und bleibt
+    Byte für Byte gleich, damit Provider den Präfix cachen können; der Turn-Prompt verweist
+    per [card:<ref>] darauf. Jeder Request ist eigenständig, die Karte wird also jedes Mal
+    mitgesendet: gespart wird nur über den Prompt-Cache des Providers, nicht an Prompt-Tokens.
+    self.last["tokens"] ist deshalb die tatsächliche Summe (Präfix + Delta).
+    Ist das Delta zu groß, wird neu aufgesetzt.
+    """
+
+    def __init__(self, max_share: float = 0.5):
+        self.max_share = max_share
+        self.base: Optional[CardSnapshot] = None
+        self.base_message = ""
+        self.key: tuple = ()
+        self.last: Dict[str, object] = {}
+
+    @property
+    def context(self) -> List[str]:
+        return [self.base_message] if self.base_message else []
+
+    def reset(self) -> None:
+        self.base, self.base_message, self.key = None, "", ()
+
+    def apply(self, card: str, snap: CardSnapshot, key: tuple, budget: CardBudget) -> str:
+        """Liefert den Text für {{PROJECT_CARD}} und merkt die Delta-Statistik in self.last."""
+        full = estimate_tokens(card, budget.estimator)
+        if self.base is not None and key == self.key:
+            delta, stats = render_delta(self.base, snap)
+            tokens = estimate_tokens(delta, budget.estimator)
+            base_tokens = estimate_tokens(self.base_message, budget.estimator)
+            over = budget.tokens is not None and base_tokens + tokens > budget.tokens
+            if tokens <= self.max_share * full and not over:
+                self.last = {"ref": self.base.ref, "mode": "delta", "tokens": base_tokens + tokens,
+                             "prefix_tokens": base_tokens, "delta_tokens": tokens, "full_tokens": full, **stats}
+                return delta
+        self.base, self.key = snap, key
+        self.base_message = f"Projektkarte [card:{snap.ref}]:\n{card}"
+        base_tokens = estimate_tokens(self.base_message, budget.estimator)
+        self.last = {"ref": snap.ref, "mode": "full", "tokens": base_tokens,
+                     "prefix_tokens": base_tokens, "delta_tokens": 0, "full_tokens": full}
+        return f"Siehe [card:{snap.ref}] oben (unverändert)."
+
+def render_delta(base: CardSnapshot, new: CardSnapshot) -> Tuple[str, Dict[str, int]]:
+    added = sorted(new.files.keys() - base.files.keys())
+    removed = sorted(base.files.keys() - new.files.keys())
+    changed = sorted(r for r in new.files.keys() & base.files.keys() if new.files[r] != base.files[r])
+    lines = [f"Siehe [card:{base.ref}] oben. Änderungen seitdem:"]
+    if not (added or removed or changed):
+        lines.append("(keine Dateiänderungen)")
+    for label, rels in (("Neu", added), ("Entfernt", removed), ("Geändert", changed)):
+        if rels:
+            more = f" ... (+{len(rels) - MAX_DELTA_LIST} weitere)" if len(rels) > MAX_DELTA_LIST else ""
+            lines.append(f"{label}: " + ", ".join(rels[:MAX_DELTA_LIST]) + more)
+    fresh = [(rel, text) for rel, text in new.samples.items() if base.samples.get(rel) != text]
+    if fresh:
+        lines.append("\nSamples (neu/aktualisiert):")
+        lines += [f"--- {rel} ---\n{text}" for rel, text in fresh]
+    stats = {"added": len(added), "removed": len(removed), "changed": len(changed), "samples": len(fresh)}
+    return "\n".join(lines), stats
+
+def build_prompts(ws: str, cfg: Config, goal: str, extra_dirs: Optional[List[str]] = None,
+                  model: Optional[str] = None, session: Optional[CardSession] = None) -> Tuple[str, str, Dict[str, int]]:
+    """Rendert System- und User-Prompt für einen Plan.
+
+    Die Projektkarte wird nach dem Ziel gerankt und in das Kontextfenster des Modells gepackt;
+    der Report enthält die Tokens je Kartenabschnitt. Mit session enthält der User-Prompt nur
+    das Delta zur Vollkarte in session.context.
+    """
+    system_prompt = read_template("system_plan.txt")
+    user_prompt = read_template("user_plan.txt")
+
+    extra_info = ""
+    if extra_dirs:
+        extra_info = "\n\nAdditional read-only dirs:\n" + "\n".join(f"- {p}" for p in extra_dirs)
+
+    user_prompt = user_prompt.replace("{{GOAL}}", goal)\
+        .replace("{{WORKSPACE}}", ws)\
+        .replace("{{ALLOWLIST}}", ", ".join(sorted(cfg.allow_commands)))\
+        .replace("{{HAS_GIT}}", str(is_git_repo(ws)))
+    budget = card_budget(cfg, model or cfg.model, system_prompt + user_prompt + extra_info)
+    snap = CardSnapshot() if session is not None else None
+    card, report = build_card(ws, cfg.ignores, workers=cfg.scan_workers, use_git=cfg.scan_use_git,
+                              goal=goal, budget=budget, snapshot=snap)
+    if session is not None:
+        card = session.apply(card, snap, (model or cfg.model, extra_info), budget)
+    return system_prompt, user_prompt.replace("{{PROJECT_CARD}}", card + extra_info), report
+
+def format_report(report: Dict[str, int]) -> str:
+    budget = f" von {report['budget']}" if "budget" in report else ""
+    return (f"Projektkarte: {report['total']}{budget} Tokens "
+            f"(Dateien {report['files']} [{report['files_listed']}], "
+            f"Samples {report['samples']} [{report['samples_full']}], "
+            f"gekürzt {report['heads']} [{report['samples_truncated']}])")
+
+def format_delta(stats: Dict[str, object]) -> str:
+    if stats.get("mode") != "delta":
+        return f"Vollkarte [card:{stats['ref']}] gesendet ({stats['tokens']} Tokens, neuer Präfix)"
+    return (f"Delta zu [card:{stats['ref']}]: {stats['tokens']} Tokens = Karte {stats['prefix_tokens']} "
+            f"(unveränderter Präfix, vom Provider cachebar) + Delta {stats['delta_tokens']} "
+            f"(+{stats['added']} -{stats['removed']} ~{stats['changed']}, Samples {stats['samples']})")
@@ -0,0 +1,83 @@
+from __future__ import annotations
+import math, re
+from collections import Counter
+from typing import Callable, Dict, Iterable, List
+
+# Lokales BM25 über Pfad-Tokens und Bezeichner (kein Netz, keine Embeddings).
+
+MAX_TERMS = 64      # Bezeichner pro Datei im Index
+PATH_WEIGHT = 3     # Pfad-Tokens zählen mehrfach
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from if in into is it not of on or the this that to was with
+der die das und oder für mit von den dem des ein eine einen einer ist nicht zu im auf aus bei
+als wie wenn dann nur auch noch sowie sich es sie wir ich du bitte alle keine kein
+self return import def class none true false else elif str int
+""".split())
+
+_WORD_RE = re.compile(r"[^\W_]+")
+_CAMEL_RE = re.compile(r"[A-ZÄÖÜ]+(?=[A-ZÄÖÜ][a-zäöüß])|[A-ZÄÖÜ]?[a-zäöüß]+|[A-ZÄÖÜ]+|\d+")
+
+def tokenize(text: str) -> List[str]:
+    out: List[str] = []
+    for word in _WORD_RE.findall(text):
+        parts = _CAMEL_RE.findall(word) or [word]
+        for p in parts:
+            t = p.lower()
+            if len(t) >= 2 and not t.isdigit() and t not in STOPWORDS:
+                out.append(t)
+    return out
+
+def extract_terms(text: str, limit: int = MAX_TERMS) -> Dict[str, int]:
+    """Häufigste Bezeichner-Tokens einer Datei (für den persistenten Index)."""
+    return dict(Counter(tokenize(text)).most_common(limit))
+
+def path_terms(rel: str) -> Dict[str, int]:
+    c = Counter(tokenize(rel))
+    return {t: n * PATH_WEIGHT for t, n in c.items()}
+
+class BM25:
+    """Invertierter Index, beschränkt auf das Query-Vokabular (spart bei großen Repos die Vollindizierung)."""
+
+    def __init__(self, docs: Dict[str, Dict[str, int]], vocab: Iterable[str], k1: float = 1.2, b: float = 0.75):
+        self.k1, self.b = k1, b
+        vocab = set(vocab)
+        self.postings: Dict[str, Dict[str, int]] = {t: {} for t in vocab}
+        self.lengths: Dict[str, int] = {}
+        for doc, terms in docs.items():
+            self.lengths[doc] = sum(terms.values())
+            for t in vocab.intersection(terms):
+                self.postings[t][doc] = terms[t]
+        self.n = len(docs)
+        self.avgdl = (sum(self.lengths.values()) / self.n) if self.n else 0.0
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term) or ())
+        return math.log(1 + (self.n - df + 0.5) / (df + 0.5))
+
+    def scores(self, query_terms: Iterable[str]) -> Dict[str, float]:
+        out: Dict[str, float] = {}
+        for t, qtf in Counter(query_terms).items():
+            posting = self.postings.get(t)
+            if not posting:
+                continue
+            idf = self.idf(t)
+            for doc, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc] / (self.avgdl or 1))
+                out[doc] = out.get(doc, 0.0) + qtf * idf * tf * (self.k1 + 1) / (tf + norm)
+        return out
+
+def rank_files(files: List[str], goal: str, content_terms: Callable[[str], Dict[str, int]]) -> List[str]:
+    """Sortiert files nach Relevanz für goal; Dateien ohne Treffer behalten ihre Reihenfolge."""
+    query = tokenize(goal)
+    if not query:
+        return list(files)
+    docs: Dict[str, Dict[str, int]] = {}
+    for rel in files:
+        terms = path_terms(rel)
+        for t, n in content_terms(rel).items():
+            terms[t] = terms.get(t, 0) + n
+        docs[rel] = terms
+    scores = BM25(docs, query).scores(query)
+    order = {rel: i for i, rel in enumerate(files)}
+    return sorted(files, key=lambda r: (-scores.get(r, 0.0), order[r]))
@@ -0,0 +1,120 @@
+from __future__ import annotations
+import os, re, time
+from typing import Dict, List, Tuple
+from rich.console import Console
+from rich.markup import escape
+from rich.syntax import Syntax
+from .constants import PREVIEW_PATCH_FILE
+from .utils import atomic_write_text
+
+# Preview-Ausgabe mit Zeilenbudget: Hunks werden angezeigt, solange das Budget je Datei und
+# gesamt reicht; der Rest wird eingeklappt und ist über seine ID (<item>.<hunk>) abrufbar.
+# Durch Syntax (das Teure) laufen nur die angezeigten Zeilen.
+
+_HUNK_RE = re.compile(r"^@@ -\d+(?:,(\d+))? \+\d+(?:,(\d+))? @@")
+
+def split_hunks(diff: str) -> Tuple[List[str], List[List[str]]]:
+    """(Kopfzeilen, Hunks). Hunk-Grenzen folgen den Zeilenzahlen der @@-Zeile, damit entfernte
+    Zeilen wie '-- x' nicht als Dateikopf gelten; Köpfe weiterer Dateien gehören zum nächsten Hunk."""
+    head: List[str] = []
+    hunks: List[List[str]] = []
+    pending: List[str] = []
+    old = new = 0
+    for ln in diff.splitlines():
+        if old > 0 or new > 0:
+            hunks[-1].append(ln)
+            if ln.startswith("-"):
+                old -= 1
+            elif ln.startswith("+"):
+                new -= 1
+            elif not ln.startswith("\\"):
+                old -= 1
+                new -= 1
+            continue
+        m = _HUNK_RE.match(ln)
+        if m:
+            hunks.append(pending + [ln])
+            pending = []
+            old = int(m.group(1) if m.group(1) is not None else 1)
+            new = int(m.group(2) if m.group(2) is not None else 1)
+        elif hunks:
+            pending.append(ln)
+        else:
+            head.append(ln)
+    if pending and hunks:
+        hunks[-1].extend(pending)
+    return head, hunks
+
+def _label(hunk: List[str]) -> str:
+    return next((ln for ln in hunk if ln.startswith("@@")), hunk[0])
+
+class PreviewRenderer:
+    def __init__(self, console: Console, file_lines: int = 200, total_lines: int = 1500):
+        self.console = console
+        self.file_lines = file_lines
+        self.total_lines = total_lines
+        self.collapsed: Dict[str, List[str]] = {}
+        self.shown = 0
+        self.hidden = 0
+        self.render_s = 0.0
+
+    def render(self, items: list, headers_only: bool = False) -> None:
+        t0 = time.perf_counter()
+        self.collapsed, self.shown, self.hidden = {}, 0, 0
+        for n, it in enumerate(items, 1):
+            self.console.rule(f"[{n}] [bold]{it.kind.upper()}[/bold] {escape(it.relpath or '')} - {escape(it.summary)}")
+            if it.cmd:
+                self.console.print(escape(" ".join(it.cmd)))
+            if not it.diff:
+                continue
+            head, hunks = split_hunks(it.diff)
+            if not hunks:
+                self.console.print(f"[dim]{escape(it.diff)}[/dim]")  # Zusammenfassung statt Diff
+                continue
+            out = list(head)
+            file_used = 0
+            for h, hunk in enumerate(hunks, 1):
+                hid = f"{n}.{h}"
+                fits = file_used + len(hunk) <= self.file_lines and self.shown + len(hunk) <= self.total_lines
+                if fits and not headers_only:
+                    out.extend(hunk)
+                    file_used += len(hunk)
+                    self.shown += len(hunk)
+                else:
+                    self.collapsed[hid] = hunk
+                    self.hidden += len(hunk)
+                    if not headers_only:
+                        out.append(f"{_label(hunk)} ... {len(hunk)} Zeilen eingeklappt [{hid}]")
+            if headers_only:
+                self.console.print(f"[dim]{len(hunks)} Hunks, {sum(len(x) for x in hunks)} Zeilen[/dim]")
+            else:
+                self.console.print(Syntax("\n".join(out), "diff", theme="ansi_dark"))
+        self.render_s = time.perf_counter() - t0
+
+    def expand(self, ref: str) -> bool:
+        """Zeigt einen eingeklappten Hunk ('3.2') oder alle eingeklappten Hunks eines Items ('3')."""
+        keys = [k for k in self.collapsed if k == ref or k.startswith(ref + ".")]
+        for k in keys:
+            self.console.rule(f"[{k}]")
+            self.console.print(Syntax("\n".join(self.collapsed[k]), "diff", theme="ansi_dark"))
+        return bool(keys)
+
+    def summary(self, diff_s: float) -> str:
+        text = f"Preview: {self.shown} Zeilen angezeigt"
+        if self.collapsed:
+            text += f", {self.hidden} in {len(self.collapsed)} Hunks eingeklappt"
+        return text + f" | Diff {diff_s * 1000:.0f} ms, Render {self.render_s * 1000:.0f} ms"
+
+def write_patch(workspace: str, items: list) -> str:
+    """Schreibt alle Diffs nach .devagent/preview.patch; Zusammenfassungen als Kommentarzeilen."""
+    parts: List[str] = []
+    for it in items:
+        if not it.diff:
+            continue
+        if split_hunks(it.diff)[1]:
+            parts.append(it.diff.rstrip("\n"))
+        else:
+            parts.append(f"# {it.relpath}: {it.diff}")
+    path = os.path.join(os.path.realpath(workspace), PREVIEW_PATCH_FILE)
+    atomic_write_text(path, "\n".join(parts) + "\n" if parts else "")
+    return path
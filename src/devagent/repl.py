@@ -1,19 +1,24 @@
 from __future__ import annotations
-import os, getpass
-from typing import List
+import os, time, getpass
+from typing import List, Optional
 from rich.console import Console
 from rich.panel import Panel
-from rich.syntax import Syntax
+from rich.markup import escape
 from .config import load_config, Config
 from .scanner import project_card
 from .planner import save_plan, save_approval_code
-from .llm import LLMClient
-from .verifier import verify_plan
-from .executor import preview as preview_actions, execute as execute_actions
+from .llm import LLMClient, AsyncLLMClient
+from .cache import PlanCache
+from .audit import log_event
+from .verifier import verify_plan, verify_action
+from .schemas import Action
+from .executor import preview as preview_actions, execute as execute_actions, change_summary
 from .utils import is_git_repo, rand_code, json_dump, json_load
-from .constants import PREVIEW_CODE_FILE, STATE_FILE
+from .constants import PREVIEW_CODE_FILE, PLAN_FILE, STATE_FILE
 from .transcript import Transcript
+from .render import PreviewRenderer, write_patch
 from .res import read_template
+from .prompts import CardSession, build_prompts, format_report, format_delta
 from .creds import get_openrouter_key, set_openrouter_key, unset_openrouter_key, mask_key
 
 console = Console()
@@ -24,13 +29,16 @@ def _help_text() -> str:
 /status               – Status (Model, Mode, Workspaces)
 /mode <normal|plan|auto>
 /model <id>          – Modell für OpenRouter setzen (nur Session)
+/cache <on|off>       – LLM-Antwort-Cache für diese Session an/aus
+/card reset           – nächste Anfrage mit vollständiger Projektkarte
 /scan                 – Projektkarte knapp ausgeben
 /plan <ziel>          – Plan generieren (LLM)
 /lint-fix [hinweis]   – Stack-sensitiver Lint/Type/Build-Fix-Plan
 /test [hinweis]       – Testlauf + Fix-Plan
 /conflicts [hinweis]  – Merge-Konflikte erkennen & minimal lösen
 /review [hinweis]     – Code-Review & kleine Fixes
-/preview              – Diffs/Commands anzeigen + Approve-Code erzeugen
+/preview [patch]      – Diffs/Commands anzeigen + Approve-Code erzeugen (patch: nach .devagent/preview.patch)
+/expand <id>          – eingeklappten Hunk (3.2) oder alle eines Eintrags (3) zeigen
 /approve <code>       – Code aus Preview übernehmen
 /execute              – Plan ausführen
 /config               – aktive Konfiguration anzeigen
@@ -53,6 +61,8 @@ def run_repl(workspace: str) -> None:
     session_model = cfg.model
     session_mode = cfg.permission_mode
     extra_dirs: List[str] = list(cfg.extra_workspaces)
+    cards = CardSession(cfg.card_delta_max_share) if cfg.card_delta else None
+    renderer = PreviewRenderer(console, cfg.preview_file_lines, cfg.preview_total_lines)
 
     while True:
         try:
@@ -98,6 +108,19 @@ def run_repl(workspace: str) -> None:
             tr.write("ModelChange", {"model": session_model})
             continue
 
+        if line.startswith("/cache "):
+            v = line.split(" ", 1)[1].strip()
+            if v not in ("on","off"):
+                console.print("[red]Nutze: /cache on|off[/red]"); continue
+            cfg.llm_cache = v == "on"
+            console.print(f"[green]LLM-Cache:[/green] {v}")
+            continue
+
+        if line == "/card reset":
+            if cards: cards.reset()
+            console.print("[green]Nächste Anfrage sendet die vollständige Projektkarte[/green]")
+            continue
+
         if line.startswith("/add-dir "):
             _, p = line.split(" ", 1)
             p = os.path.realpath(p.strip())
@@ -138,42 +161,48 @@ def run_repl(workspace: str) -> None:
             continue
 
         if line == "/scan":
-            card = project_card(ws, cfg.ignores)
+            card = project_card(ws, cfg.ignores, workers=cfg.scan_workers, use_git=cfg.scan_use_git)
             console.print(Panel(card[:4000], title="Project Card (gekürzt)"))
             continue
 
         if line.startswith("/lint-fix"):
             extra = line.replace("/lint-fix", "", 1).strip()
-            _handle_special_goal(ws, cfg, session_model, extra_dirs, "goal_lint_fix.txt", extra, tr)
+            _handle_special_goal(ws, cfg, session_model, extra_dirs, "goal_lint_fix.txt", extra, tr, cards)
             _maybe_auto(ws, cfg, session_mode, tr)
             continue
 
         if line.startswith("/test"):
             extra = line.replace("/test", "", 1).strip()
-            _handle_special_goal(ws, cfg, session_model, extra_dirs, "goal_test.txt", extra, tr)
+            _handle_special_goal(ws, cfg, session_model, extra_dirs, "goal_test.txt", extra, tr, cards)
             _maybe_auto(ws, cfg, session_mode, tr)
             continue
 
         if line.startswith("/conflicts"):
             extra = line.replace("/conflicts", "", 1).strip()
-            _handle_special_goal(ws, cfg, session_model, extra_dirs, "goal_conflicts.txt", extra, tr)
+            _handle_special_goal(ws, cfg, session_model, extra_dirs, "goal_conflicts.txt", extra, tr, cards)
             _maybe_auto(ws, cfg, session_mode, tr)
             continue
 
         if line.startswith("/review"):
             extra = line.replace("/review", "", 1).strip()
-            _handle_special_goal(ws, cfg, session_model, extra_dirs, "goal_review.txt", extra, tr)
+            _handle_special_goal(ws, cfg, session_model, extra_dirs, "goal_review.txt", extra, tr, cards)
             _maybe_auto(ws, cfg, session_mode, tr)
             continue
 
         if line.startswith("/plan "):
             goal = line[len("/plan "):].strip()
-            _handle_plan(ws, cfg, session_model, extra_dirs, goal, tr)
+            _handle_plan(ws, cfg, session_model, extra_dirs, goal, tr, cards)
             _maybe_auto(ws, cfg, session_mode, tr)
             continue
 
-        if line == "/preview":
-            _handle_preview(ws, cfg); continue
+        if line in ("/preview", "/preview patch"):
+            _handle_preview(ws, cfg, renderer, to_file=line.endswith("patch")); continue
+
+        if line.startswith("/expand"):
+            ref = line[len("/expand"):].strip()
+            if not ref or not renderer.expand(ref):
+                console.print("[red]Nutze: /expand <id> (IDs siehe /preview)[/red]")
+            continue
 
         if line.startswith("/approve "):
             code = line.split(" ",1)[1].strip()
@@ -183,7 +212,7 @@ def run_repl(workspace: str) -> None:
             _handle_execute(ws, cfg, tr); continue
 
         goal = line
-        _handle_plan(ws, cfg, session_model, extra_dirs, goal, tr)
+        _handle_plan(ws, cfg, session_model, extra_dirs, goal, tr, cards)
         _maybe_auto(ws, cfg, session_mode, tr)
 
 def _maybe_auto(ws: str, cfg: Config, mode: str, tr: Transcript):
@@ -193,42 +222,64 @@ def _maybe_auto(ws: str, cfg: Config, mode: str, tr: Transcript):
             _handle_auto_approve(ws)
             _handle_execute(ws, cfg, tr)
 
-def _render_prompts(ws: str, cfg: Config, model: str, extra_dirs: List[str], goal_text: str) -> tuple[str,str]:
-    system_prompt = read_template("system_plan.txt")
-    user_prompt = read_template("user_plan.txt")
-
-    card = project_card(ws, cfg.ignores)
-    extra_info = ""
-    if extra_dirs:
-        extra_info = "\n\nAdditional read-only dirs:\n" + "\n".join(f"- {p}" for p in extra_dirs)
-
-    user_prompt = user_prompt.replace("{{GOAL}}", goal_text)\
-        .replace("{{WORKSPACE}}", ws)\
-        .replace("{{ALLOWLIST}}", ", ".join(sorted(cfg.allow_commands)))\
-        .replace("{{HAS_GIT}}", str(is_git_repo(ws)))\
-        .replace("{{PROJECT_CARD}}", card + extra_info)
+def _render_prompts(ws: str, cfg: Config, model: str, extra_dirs: List[str], goal_text: str,
+                    cards: Optional[CardSession] = None) -> tuple[str,str]:
+    system_prompt, user_prompt, report = build_prompts(ws, cfg, goal_text, extra_dirs, model=model, session=cards)
+    console.print(f"[dim]{format_report(report)}[/dim]", highlight=False)
+    if cards is not None:
+        console.print(f"[dim]{format_delta(cards.last)}[/dim]", highlight=False)
     return system_prompt, user_prompt
 
-def _handle_special_goal(ws: str, cfg: Config, model: str, extra_dirs: List[str], template_name: str, extra_hint: str, tr: Transcript) -> None:
+def _handle_special_goal(ws: str, cfg: Config, model: str, extra_dirs: List[str], template_name: str, extra_hint: str, tr: Transcript,
+                         cards: Optional[CardSession] = None) -> None:
     base_goal = read_template(template_name)
     goal = base_goal + ("\n\nZusätzlicher Hinweis:\n" + extra_hint if extra_hint else "")
-    _handle_plan(ws, cfg, model, extra_dirs, goal, tr)
+    _handle_plan(ws, cfg, model, extra_dirs, goal, tr, cards)
 
-def _handle_plan(ws: str, cfg: Config, model: str, extra_dirs: List[str], goal: str, tr: Transcript) -> None:
+def _handle_plan(ws: str, cfg: Config, model: str, extra_dirs: List[str], goal: str, tr: Transcript,
+                 cards: Optional[CardSession] = None) -> None:
     console.print(f"[bold]Plan wird erstellt[/bold]")
-    sys_p, usr_p = _render_prompts(ws, cfg, model, extra_dirs, goal)
-    client = LLMClient(model=model, workspace=ws)
-    plan, plan_hash = client.generate_plan(sys_p, usr_p)
+    sys_p, usr_p = _render_prompts(ws, cfg, model, extra_dirs, goal, cards)
+    context = cards.context if cards is not None else None
+    if cards is not None:
+        tr.write("CardDelta", cards.last)
+    cache = PlanCache(ws, max_bytes=cfg.llm_cache_max_mb * 1024 * 1024, max_age_s=int(cfg.llm_cache_max_age_h * 3600)) \
+        if cfg.llm_cache else None
+    if cfg.race_models:
+        git = is_git_repo(ws)
+        client = AsyncLLMClient([model] + cfg.race_models, workspace=ws, cfg=cfg, cache=cache,
+                                validate=lambda p: verify_plan(p, ws, cfg, git), context=context)
+    else:
+        client = LLMClient(model=model, workspace=ws, cfg=cfg, cache=cache, context=context)
+    if cfg.stream:
+        has_git = is_git_repo(ws)
+        t0 = time.perf_counter()
+
+        def on_action(i: int, a: Action) -> None:
+            dt = time.perf_counter() - t0
+            if i == 0:
+                tr.write("FirstAction", {"seconds": round(dt, 3)})
+            console.print(f"[dim]+{dt:.2f}s[/dim] #{i+1} [bold]{a.type.upper()}[/bold] {a.file or ' '.join(a.cmd or [])}", highlight=False)
+            for e in verify_action(i, a, ws, cfg, has_git):
+                console.print(f"[yellow] - {e}[/yellow]")
+
+        plan, plan_hash = client.generate_plan(sys_p, usr_p, stream=True, on_action=on_action)
+    else:
+        plan, plan_hash = client.generate_plan(sys_p, usr_p)
     save_plan(ws, plan)
     tr.write("PlanCreated", {"hash": plan_hash, "actions": len(plan.actions)})
+    tr.write("LLMStats", client.stats)
+    log_event(ws, f"plan-{plan_hash}", "llm", client.stats)
+    if client.stats.get("cache") == "hit":
+        console.print("[dim]Plan aus dem LLM-Cache (/cache off für neue Anfragen)[/dim]")
     errs = verify_plan(plan, ws, cfg, is_git_repo(ws))
     if errs:
         console.print("[yellow]Plan enthält Probleme:[/yellow]")
         for e in errs: console.print(" - " + e)
     else:
-        console.print("[green]Plan OK[/green] -> .devagent/plan.yaml")
+        console.print(f"[green]Plan OK[/green] -> {PLAN_FILE}")
 
-def _handle_preview(ws: str, cfg: Config) -> bool:
+def _handle_preview(ws: str, cfg: Config, renderer: Optional[PreviewRenderer] = None, to_file: bool = False) -> bool:
     from .planner import load_plan
     plan = load_plan(ws)
     errs = verify_plan(plan, ws, cfg, is_git_repo(ws))
@@ -236,12 +287,16 @@ def _handle_preview(ws: str, cfg: Config) -> bool:
         console.print("[red]Plan-Fehler:[/red]")
         for e in errs: console.print(" - " + e)
         return False
-    items = preview_actions(plan, ws)
-    for it in items:
-        header = f"[bold]{it.kind.upper()}[/bold] {it.relpath or ''} - {it.summary}"
-        console.rule(header)
-        if it.cmd: console.print(" ".join(it.cmd))
-        if it.diff: console.print(Syntax(it.diff, "diff", theme="ansi_dark"))
+    t0 = time.perf_counter()
+    items = preview_actions(plan, ws, cfg)
+    diff_s = time.perf_counter() - t0
+    renderer = renderer or PreviewRenderer(console, cfg.preview_file_lines, cfg.preview_total_lines)
+    renderer.render(items, headers_only=to_file)
+    if to_file:
+        console.print(f"Diffs geschrieben: {write_patch(ws, items)}")
+    elif renderer.collapsed:
+        console.print(f"[dim]Eingeklappt: {', '.join(renderer.collapsed)} – /expand <id>[/dim]")
+    console.print(f"[dim]{renderer.summary(diff_s)}[/dim]", highlight=False)
     code = rand_code()
     save_approval_code(ws, code)
     console.print(Panel(f"Bestätigungscode:\n[bold]{code}[/bold]\nNutze: /approve {code}", title="Approve"))
@@ -261,14 +316,27 @@ def _handle_auto_approve(ws: str) -> None:
     code = rand_code()
     json_dump(os.path.join(ws, STATE_FILE), {"approved_code": code})
 
+def _echo(tr: Transcript):
+    def on_output(cmd: List[str], stream: str, line: str) -> None:
+        name = os.path.basename(cmd[0]) if cmd else "?"
+        console.print(f"[{'red' if stream == 'stderr' else 'dim'}]{name}|[/] {escape(line)}", highlight=False)
+        tr.write("CmdOutput", {"cmd": name, "stream": stream, "line": line})
+    return on_output
+
 def _handle_execute(ws: str, cfg: Config, tr: Transcript) -> None:
     from .planner import load_plan
     state = json_load(os.path.join(ws, STATE_FILE)) or {}
     if not state.get("approved_code"):
         console.print("[red]Kein Approve. Erst /preview und /approve.[/red]"); return
     plan = load_plan(ws)
-    ok, msgs = execute_actions(plan, ws, state["approved_code"], require_git_for_patches=cfg.enforce_git_for_patches)
+    report: dict = {}
+    ok, msgs = execute_actions(plan, ws, state["approved_code"], require_git_for_patches=cfg.enforce_git_for_patches,
+                               workers=cfg.execute_workers, cfg=cfg, on_output=_echo(tr), report=report)
     for m in msgs: console.print(m); tr.write("ExecMsg", {"msg": m})
+    if report:
+        console.print("Änderungen:")
+        for line in change_summary(report): console.print(line, highlight=False)
+        tr.write("ExecChanges", {rel: list(v) for rel, v in report.items()})
     if ok:
         console.print("[green]Ausführung abgeschlossen[/green]")
         tr.write("ExecDone", {})
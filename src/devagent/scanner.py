@@ -1,12 +1,19 @@
 from __future__ import annotations
-import os
-from typing import List
-from .constants import DEFAULT_IGNORES, SENSITIVE_NAMES, MAX_FILE_BYTES
-from .utils import read_text_limited, is_text_bytes
+import os, time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from .constants import DEFAULT_IGNORES, SENSITIVE_NAMES
+from .ignore import IgnoreMatcher, compile_ignores
+from .budget import CardBudget, pack_card
+from .rank import rank_files
+from .utils import hash_str
+
+_DEFAULT_NAMES = frozenset(DEFAULT_IGNORES)
 
 def should_ignore(name: str, extra_ignores: List[str]) -> bool:
-    names = set(DEFAULT_IGNORES + extra_ignores)
-    return name in names
+    # nur exakte Namen; für Glob-/.gitignore-Regeln siehe ignore.compile_ignores
+    return name in _DEFAULT_NAMES or name in extra_ignores
 
 def is_sensitive(path: str) -> bool:
     base = os.path.basename(path)
@@ -15,43 +22,146 @@ def is_sensitive(path: str) -> bool:
 def scan_tree(workspace: str, extra_ignores: List[str]) -> List[str]:
     out: List[str] = []
     root = os.path.realpath(workspace)
+    matcher = compile_ignores(root, extra_ignores)
     for d, dirs, files in os.walk(root):
-        # Filter ig
-        dirs[:] = [x for x in dirs if not should_ignore(x, extra_ignores)]
         rel_dir = os.path.relpath(d, root)
         if rel_dir == ".":
             rel_dir = ""
+        # ignorierte Ordner gar nicht erst betreten
+        dirs[:] = [x for x in dirs if not matcher.ignored(os.path.join(rel_dir, x) if rel_dir else x, True)]
         for f in files:
             rel = os.path.join(rel_dir, f) if rel_dir else f
-            out.append(rel)
+            if not matcher.ignored(rel, False):
+                out.append(rel)
     out.sort()
     return out
 
-def project_card(workspace: str, extra_ignores: List[str], max_files: int = 400) -> str:
-    files = scan_tree(workspace, extra_ignores)
-    lines: List[str] = []
-    lines.append("Files:")
-    for i, rel in enumerate(files[:max_files]):
-        lines.append(f"- {rel}")
-    if len(files) > max_files:
-        lines.append(f"... (+{len(files)-max_files} weitere)")
+def list_dir(abs_dir: str, rel_dir: str, matcher: IgnoreMatcher) -> Tuple[List[str], List[str]]:
+    # gleiche Semantik wie os.walk: Symlinks auf Ordner werden weder betreten noch als Datei gelistet
+    dirs: List[str] = []
+    files: List[str] = []
+    try:
+        it = os.scandir(abs_dir)
+    except OSError:
+        return dirs, files
+    with it:
+        for e in it:
+            try:
+                is_dir = e.is_dir()
+            except OSError:
+                is_dir = False
+            rel = os.path.join(rel_dir, e.name) if rel_dir else e.name
+            if is_dir:
+                if e.is_symlink() or matcher.ignored(rel, True):
+                    continue
+                dirs.append(e.name)
+            elif not matcher.ignored(rel, False):
+                files.append(e.name)
+    return sorted(dirs), sorted(files)
+
+def _walk_subtree(root: str, top: str, matcher: IgnoreMatcher, records: Optional[Dict[str, dict]] = None) -> List[str]:
+    out: List[str] = []
+    stack = [top]
+    while stack:
+        rel = stack.pop()
+        abs_dir = os.path.join(root, rel) if rel else root
+        if records is not None:
+            try:
+                mtime = os.stat(abs_dir).st_mtime_ns
+            except OSError:
+                continue
+        subdirs, files = list_dir(abs_dir, rel, matcher)
+        if records is not None:
+            records[rel] = {"mtime_ns": mtime, "dirs": subdirs, "files": files}
+        for name in subdirs:
+            stack.append(os.path.join(rel, name) if rel else name)
+        for name in files:
+            out.append(os.path.join(rel, name) if rel else name)
+    return out
+
+def scan_tree_parallel(workspace: str, extra_ignores: List[str], workers: int = 0,
+                       records: Optional[Dict[str, dict]] = None) -> Tuple[List[str], List[dict]]:
+    """Wie scan_tree, aber die Top-Level-Unterbäume laufen parallel in einem Thread-Pool.
 
-    lines.append("\nSamples:")
+    Gibt (files, timings) zurück; timings enthält je Unterbaum {"subtree", "files", "seconds"},
+    absteigend nach Dauer sortiert. workers <= 0 => Pool-Default.
+    """
     root = os.path.realpath(workspace)
-    for rel in files[:60]:
-        abs_path = os.path.join(root, rel)
+    matcher = compile_ignores(root, extra_ignores)
+    if records is not None:
+        records[""] = {"mtime_ns": os.stat(root).st_mtime_ns}
+    top_dirs, top_files = list_dir(root, "", matcher)
+    if records is not None:
+        records[""].update({"dirs": top_dirs, "files": top_files})
+
+    def job(name: str) -> Tuple[List[str], dict]:
+        t0 = time.perf_counter()
+        files = _walk_subtree(root, name, matcher, records)
+        return files, {"subtree": name, "files": len(files), "seconds": time.perf_counter() - t0}
+
+    out: List[str] = list(top_files)
+    timings: List[dict] = []
+    with ThreadPoolExecutor(max_workers=workers if workers > 0 else None) as ex:
+        for files, timing in ex.map(job, top_dirs):
+            out.extend(files)
+            timings.append(timing)
+    out.sort()
+    timings.sort(key=lambda t: t["seconds"], reverse=True)
+    return out, timings
+
+@dataclass
+class CardSnapshot:
+    """Inhalt einer gebauten Karte: alle Dateien (rel -> sha256) und die vollständig
+    aufgenommenen Samples (rel -> Text), Basis für Delta-Karten in der REPL."""
+    ref: str = ""
+    files: Dict[str, str] = field(default_factory=dict)
+    samples: Dict[str, str] = field(default_factory=dict)
+
+def card_samples(idx, ranked: List[str]):
+    """(rel, text, is_body) in Rangfolge; inhaltsgleiche Dateien (Vendor-Kopien, Lockfiles)
+    erscheinen nur einmal, weitere Kopien als Verweis."""
+    seen: Dict[str, str] = {}
+    for rel in ranked:
         if is_sensitive(rel):
-            lines.append(f"--- {rel} (masked: sensitive) ---")
+            yield rel, f"--- {rel} (masked: sensitive) ---", False
+            continue
+        sha = (idx.entry(rel) or {}).get("sha256")
+        if sha and sha in seen:
+            yield rel, f"--- {rel} (identisch mit {seen[sha]}) ---", False
             continue
         try:
-            with open(abs_path, "rb") as f:
-                b = f.read(MAX_FILE_BYTES)
-            if not is_text_bytes(b):
-                lines.append(f"--- {rel} (binary or non-utf8, skipped) ---")
-                continue
-            txt = b.decode("utf-8", errors="replace")
-            head = "\n".join(txt.splitlines()[:120])
-            lines.append(f"--- {rel} ---\n{head}")
+            head = idx.head(rel)
         except Exception as e:
-            lines.append(f"--- {rel} (read error: {e}) ---")
-    return "\n".join(lines)
+            yield rel, f"--- {rel} (read error: {e}) ---", False
+            continue
+        if head is None:
+            yield rel, f"--- {rel} (binary or non-utf8, skipped) ---", False
+        else:
+            if sha:
+                seen[sha] = rel
+            yield rel, head, True
+
+def build_card(workspace: str, extra_ignores: List[str], workers: int = 0, use_git: bool = True,
+               goal: Optional[str] = None, budget: Optional[CardBudget] = None,
+               snapshot: Optional[CardSnapshot] = None) -> Tuple[str, Dict[str, int]]:
+    """Projektkarte aus dem Index, gepackt in das Token-Budget; liefert (card, report).
+    Mit snapshot wird zusätzlich festgehalten, was die Karte enthält."""
+    from .index import load_index
+    budget = budget or CardBudget()
+    idx = load_index(workspace, extra_ignores, workers=workers, use_git=use_git)
+    files = idx.files()
+    # Samples nach Relevanz zum Ziel statt alphabetisch
+    ranked = rank_files(files, goal, idx.terms) if goal else files
+    included = {} if snapshot is not None else None
+    card, report = pack_card(files, card_samples(idx, ranked), budget, included)
+    idx.save()
+    if snapshot is not None:
+        snapshot.ref = hash_str(card)[:12]
+        snapshot.files = {rel: (idx.entry(rel) or {}).get("sha256") or "" for rel in files}
+        snapshot.samples = included
+    return card, report
+
+def project_card(workspace: str, extra_ignores: List[str], max_files: int = 400, workers: int = 0,
+                 use_git: bool = True, goal: Optional[str] = None, max_samples: int = 60) -> str:
+    budget = CardBudget(max_files=max_files, max_samples=max_samples)
+    return build_card(workspace, extra_ignores, workers, use_git, goal, budget)[0]
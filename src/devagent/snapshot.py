@@ -0,0 +1,355 @@
+from __future__ import annotations
+import errno, hashlib, os, shutil, subprocess, tempfile, time
+from typing import Dict, List, Optional, Set, Tuple
+from . import gitio
+from .audit import log_event
+from .constants import SNAPSHOT_DIR, SNAPSHOT_REF_PREFIX
+from .jail import ensure_inside, move_to_trash, trash_path
+from .patcher import patch_paths
+from .schemas import Plan
+from .utils import json_dump, json_load
+
+# Snapshots vor der Ausführung, ohne 'git add -A' auf dem echten Index und ohne Commit in der Historie.
+#   git:  temporärer Index (Kopie des echten, damit der Stat-Cache greift) -> add -A -> write-tree
+#         -> commit-tree, abgelegt unter refs/devagent/snapshots/<run_id>
+#   sonst: nur die Dateien, die der Plan anfasst, als Hardlink/Reflink/Kopie unter .devagent/snapshots/<run_id>
+# Das Manifest .devagent/snapshots/<run_id>.json beschreibt, wie 'rollback' wiederherstellt.
+# Nach der Ausführung hält finish_snapshot den Nachher-Stand nur der Pfade fest, die der Lauf
+# angefasst hat (Plan-Dateien plus Pfade, deren git-status sich geändert hat; git: Blob-IDs per
+# hash-object, sonst sha256). rollback fasst nur Pfade an, die der Lauf geändert hat,
+# verweigert (ohne force), wenn sie seitdem weiter geändert wurden, und legt die aktuellen
+# Fassungen unter .devagent/trash/<run_id>/ ab, statt sie zu löschen. Aufbewahrt werden die
+# letzten cfg.snapshot_keep Snapshots (Manifest, Ref bzw. Dateikopien), ältere räumt prune auf.
+
+_EXCLUDE = ":(exclude).devagent"
+_IDENT = {"GIT_AUTHOR_NAME": "devagent", "GIT_AUTHOR_EMAIL": "devagent@localhost",
+          "GIT_COMMITTER_NAME": "devagent", "GIT_COMMITTER_EMAIL": "devagent@localhost"}
+_FICLONE = 0x40049409  # Linux ioctl, Reflink (btrfs, xfs)
+
+class SnapshotError(RuntimeError):
+    """Snapshot fehlt oder lässt sich nicht wiederherstellen."""
+
+def _git(root: str, args: List[str], env: Optional[Dict[str, str]] = None,
+         stdin: Optional[bytes] = None) -> Tuple[int, bytes, str]:
+    proc = subprocess.run(["git"] + args, cwd=root, input=stdin, capture_output=True,
+                          env={**os.environ, **env} if env else None)
+    return proc.returncode, proc.stdout, proc.stderr.decode("utf-8", "replace")
+
+def _manifest_path(root: str, run_id: str) -> str:
+    return os.path.join(root, SNAPSHOT_DIR, f"{run_id}.json")
+
+def _temp_index(root: str) -> str:
+    """Kopie des echten Index in einer Temp-Datei (leer, falls das Repo noch keinen hat)."""
+    fd, tmp = tempfile.mkstemp(prefix="devagent-index-")
+    os.close(fd)
+    code, out, _ = _git(root, ["rev-parse", "--git-path", "index"])
+    src = os.path.join(root, os.fsdecode(out.strip())) if code == 0 else ""
+    if src and os.path.exists(src):
+        shutil.copyfile(src, tmp)
+    else:
+        os.remove(tmp)  # git legt den Index selbst an
+    return tmp
+
+def _drop(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _fresh_status(root: str) -> Dict[str, str]:
+    st = gitio.status(root)
+    if st is None:
+        raise SnapshotError("git status fehlgeschlagen")
+    return st
+
+def _snapshot_tree(root: str, run_id: str, dirty: Dict[str, str]) -> str:
+    parent = _git(root, ["rev-parse", "-q", "--verify", "HEAD"])
+    if parent[0] == 0 and not dirty:
+        return parent[1].decode().strip()  # sauberer Worktree: HEAD ist der Snapshot
+    index = _temp_index(root)
+    env = {"GIT_INDEX_FILE": index, **_IDENT}
+    try:
+        code, _, err = _git(root, ["add", "-A", "--", ".", _EXCLUDE], env)
+        if code != 0:
+            raise SnapshotError(f"git add: {err.strip()}")
+        code, out, err = _git(root, ["write-tree"], env)
+        if code != 0:
+            raise SnapshotError(f"git write-tree: {err.strip()}")
+        tree = out.decode().strip()
+    finally:
+        _drop(index)
+    args = ["commit-tree", tree, "-m", f"devagent snapshot: {run_id}"]
+    if parent[0] == 0:
+        args += ["-p", parent[1].decode().strip()]
+    code, out, err = _git(root, args, _IDENT)
+    if code != 0:
+        raise SnapshotError(f"git commit-tree: {err.strip()}")
+    return out.decode().strip()
+
+def _update_ref(root: str, ref: str, sha: str) -> None:
+    code, _, err = _git(root, ["update-ref", ref, sha])
+    if code != 0:
+        raise SnapshotError(f"git update-ref: {err.strip()}")
+
+def snapshot_git(root: str, run_id: str, paths: Optional[List[str]] = None) -> str:
+    """Gesamter Worktree-Stand (ohne .devagent und Ignoriertes) als Commit unter einer privaten Ref.
+    paths (Dateien laut Plan) und der git-status davor bestimmen später die angefassten Pfade."""
+    dirty = _fresh_status(root)
+    sha = _snapshot_tree(root, run_id, dirty)
+    ref = SNAPSHOT_REF_PREFIX + run_id
+    _update_ref(root, ref, sha)
+    json_dump(_manifest_path(root, run_id), {"kind": "git", "ref": ref, "commit": sha,
+                                             "paths": paths or [], "status": dirty})
+    return sha
+
+def touched_paths(plan: Plan) -> List[str]:
+    """Alle Pfade, die Datei-Aktionen des Plans schreiben oder löschen (inkl. Pfade in Patches)."""
+    out: Set[str] = set()
+    for a in plan.actions:
+        if a.type == "run" or not a.file:
+            continue
+        out.add(os.path.normpath(a.file))
+        if a.type == "edit" and a.content is None:
+            out |= patch_paths(a.patch or "")
+    return sorted(out)
+
+def _clone(src: str, dst: str, link: bool) -> str:
+    """Hardlink (nur wenn alle Schreibzugriffe die Datei ersetzen), sonst Reflink, sonst Kopie."""
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if link:
+        try:
+            os.link(src, dst)
+            return "link"
+        except OSError:
+            pass
+    try:
+        import fcntl
+        with open(src, "rb") as fs, open(dst, "wb") as fd:
+            fcntl.ioctl(fd.fileno(), _FICLONE, fs.fileno())
+        shutil.copystat(src, dst)
+        return "reflink"
+    except (ImportError, OSError) as e:
+        if isinstance(e, OSError) and e.errno not in (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY):
+            raise
+    shutil.copy2(src, dst)
+    return "copy"
+
+def snapshot_files(root: str, run_id: str, paths: List[str], link: bool = False) -> Dict[str, str]:
+    """Sichert nur die angegebenen Dateien; nicht vorhandene werden als 'new' vermerkt."""
+    base = os.path.join(root, SNAPSHOT_DIR, run_id)
+    files: Dict[str, str] = {}
+    for rel in paths:
+        src = ensure_inside(root, rel)
+        if os.path.isfile(src):
+            files[rel] = _clone(src, os.path.join(base, rel), link)
+        elif not os.path.exists(src):
+            files[rel] = "new"
+    json_dump(_manifest_path(root, run_id), {"kind": "files", "files": files})
+    return files
+
+def prune(workspace: str, keep: int) -> List[str]:
+    """Entfernt alle bis auf die keep neuesten Snapshots; liefert die run_ids der entfernten."""
+    root = os.path.realpath(workspace)
+    d = os.path.join(root, SNAPSHOT_DIR)
+    try:
+        with os.scandir(d) as it:
+            manifests = sorted((e.stat().st_mtime, e.name[:-len(".json")]) for e in it
+                               if e.name.endswith(".json") and e.is_file())
+    except OSError:
+        return []
+    removed: List[str] = []
+    for _, run_id in manifests[:max(0, len(manifests) - keep)]:
+        manifest = json_load(_manifest_path(root, run_id)) or {}
+        if manifest.get("kind") == "git":
+            _git(root, ["update-ref", "-d", manifest.get("ref") or SNAPSHOT_REF_PREFIX + run_id])
+        shutil.rmtree(os.path.join(d, run_id), ignore_errors=True)
+        _drop(_manifest_path(root, run_id))
+        removed.append(run_id)
+    return removed
+
+def take_snapshot(workspace: str, run_id: str, plan: Plan, has_git: bool, keep: int = 20) -> Optional[str]:
+    """Snapshot passend zum Workspace; liefert die Meldung für das Ausführungsprotokoll
+    (ohne Git nur im Fehlerfall, die Dateikopien stehen im Audit-Log). Danach bleiben
+    höchstens keep Snapshots erhalten."""
+    root = os.path.realpath(workspace)
+    try:
+        prune(root, max(0, keep - 1))
+        if has_git:
+            return f"Git snapshot: {snapshot_git(root, run_id, touched_paths(plan))}"
+        # create/edit/patch ersetzen Dateien atomar; run-Schritte könnten in-place schreiben
+        link = not any(a.type == "run" for a in plan.actions)
+        files = snapshot_files(root, run_id, touched_paths(plan), link=link)
+        log_event(root, run_id, "snapshot", {"files": files})
+        return None
+    except (SnapshotError, OSError, ValueError) as e:
+        return f"Snapshot: failed ({e})"
+
+def _digest(path: str) -> Optional[str]:
+    """sha256 einer Datei (Symlink: des Ziels als Text); None, wenn sie fehlt."""
+    if os.path.islink(path):
+        return "link:" + hashlib.sha256(os.fsencode(os.readlink(path))).hexdigest()
+    if not os.path.isfile(path):
+        return None
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def finish_snapshot(workspace: str, run_id: str) -> None:
+    """Hält nach der Ausführung fest, wie die angefassten Pfade danach aussahen (nur diese Dateien
+    werden gehasht, kein zweiter Baum-Snapshot). run-Schritte erkennt git nur über eine Änderung
+    des status (neue/erstmals geänderte Dateien), nicht bei bereits geänderten Dateien.
+    Fehler landen im Audit-Log; rollback verlangt dann force."""
+    root = os.path.realpath(workspace)
+    path = _manifest_path(root, run_id)
+    manifest = json_load(path)
+    if not manifest:
+        return
+    try:
+        if manifest.get("kind") == "git":
+            before: Dict[str, str] = manifest.get("status") or {}
+            now = _fresh_status(root)
+            paths = set(manifest.get("paths") or [])
+            paths |= {rel for rel in before.keys() | now.keys() if before.get(rel) != now.get(rel)}
+            manifest["after"] = _worktree_ids(root, sorted(paths))
+        else:
+            manifest["after"] = {rel: _digest(ensure_inside(root, rel)) for rel in manifest.get("files") or {}}
+        json_dump(path, manifest)
+    except (SnapshotError, OSError, ValueError) as e:
+        log_event(root, run_id, "snapshot", {"after": f"failed ({e})"})
+
+def _blob_ids(root: str, commit: str, paths: List[str]) -> Dict[str, Tuple[str, str]]:
+    """{rel: (mode, blob-sha)} der Pfade in commit; fehlende Pfade fehlen auch im Ergebnis."""
+    if not paths:
+        return {}
+    code, out, err = _git(root, ["ls-tree", "-z", commit, "--"] + paths)
+    if code != 0:
+        raise SnapshotError(f"git ls-tree: {err.strip()}")
+    ids: Dict[str, Tuple[str, str]] = {}
+    for rec in (os.fsdecode(p) for p in out.split(b"\0") if p):
+        meta, rel = rec.split("\t", 1)
+        mode, kind, sha = meta.split()
+        if kind == "blob":
+            ids[rel] = (mode, sha)
+    return ids
+
+def _worktree_ids(root: str, paths: List[str]) -> Dict[str, Optional[str]]:
+    """Blob-sha der aktuellen Dateien (mit Git-Filtern wie beim Snapshot); None, wenn sie fehlen."""
+    ids: Dict[str, Optional[str]] = {}
+    files: List[str] = []
+    for rel in paths:
+        full = ensure_inside(root, rel)
+        if os.path.islink(full):
+            target = os.fsencode(os.readlink(full))
+            ids[rel] = hashlib.sha1(b"blob %d\0" % len(target) + target).hexdigest()
+        elif os.path.isfile(full):
+            files.append(rel)
+        else:
+            ids[rel] = None
+    if files:
+        code, out, err = _git(root, ["hash-object", "--stdin-paths"], stdin="\n".join(files).encode("utf-8") + b"\n")
+        if code != 0:
+            raise SnapshotError(f"git hash-object: {err.strip()}")
+        ids.update(zip(files, out.decode().split()))
+    return ids
+
+def _to_trash(root: str, run_id: str, stamp: str, rel: str) -> bool:
+    """Aktuelle Fassung nach .devagent/trash/<run_id>/rollback-<zeit>/ verschieben (falls vorhanden)."""
+    full = ensure_inside(root, rel)
+    if not os.path.lexists(full):
+        return False
+    move_to_trash(full, trash_path(root, run_id, os.path.join(f"rollback-{stamp}", rel)))
+    return True
+
+def _refuse(changed: List[str]) -> None:
+    raise SnapshotError("Nach dem Lauf geändert: " + ", ".join(changed)
+                        + " (--force setzt trotzdem zurück; aktuelle Fassungen landen in .devagent/trash)")
+
+def _rollback_git(root: str, run_id: str, manifest: dict, force: bool) -> List[str]:
+    commit = manifest["commit"]
+    after: Optional[Dict[str, Optional[str]]] = manifest.get("after")
+    if after is None and not force:
+        raise SnapshotError("Nachher-Stand fehlt (Lauf abgebrochen?); --force setzt die Plan-Dateien zurück")
+    candidates = sorted(after) if after is not None else list(manifest.get("paths") or [])
+    before = _blob_ids(root, commit, candidates)
+    if after is None:
+        paths = candidates
+    else:
+        paths = [rel for rel in candidates if after.get(rel) != (before[rel][1] if rel in before else None)]
+        if not force:
+            current = _worktree_ids(root, paths)
+            changed = [rel for rel in paths if current.get(rel) != after.get(rel)]
+            if changed:
+                _refuse(changed)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    msgs: List[str] = []
+    for rel in paths:
+        had = _to_trash(root, run_id, stamp, rel)
+        if rel in before:
+            msgs.append(f"RESTORE {rel}")
+        elif had:
+            msgs.append(f"REMOVE {rel}")
+    _restore_blobs(root, {rel: before[rel] for rel in paths if rel in before})
+    return msgs
+
+def _restore_blobs(root: str, blobs: Dict[str, Tuple[str, str]]) -> None:
+    """Schreibt die Snapshot-Version der Pfade; Inhalte über den langlebigen cat-file-Prozess."""
+    for rel, (mode, sha) in blobs.items():
+        obj = gitio.read_object(root, sha)
+        if obj is None:
+            raise SnapshotError(f"Objekt fehlt: {sha} ({rel})")
+        target = ensure_inside(root, rel)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.islink(target) or (mode == "120000" and os.path.exists(target)):
+            os.remove(target)
+        if mode == "120000":
+            os.symlink(os.fsdecode(obj[1]), target)
+            continue
+        tmp = f"{target}.devagent-rollback"
+        with open(tmp, "wb") as f:
+            f.write(obj[1])
+        os.chmod(tmp, 0o755 if mode == "100755" else 0o644)
+        os.replace(tmp, target)
+
+def _rollback_files(root: str, run_id: str, manifest: dict, force: bool) -> List[str]:
+    files: Dict[str, str] = manifest.get("files") or {}
+    after: Optional[Dict[str, Optional[str]]] = manifest.get("after")
+    if after is None and not force:
+        raise SnapshotError("Nachher-Stand fehlt (Lauf abgebrochen?); --force setzt die Plan-Dateien zurück")
+    if after is not None:
+        files = {rel: how for rel, how in files.items() if after.get(rel) != _snapshot_digest(root, run_id, rel, how)}
+        if not force:
+            changed = sorted(rel for rel in files if _digest(ensure_inside(root, rel)) != after.get(rel))
+            if changed:
+                _refuse(changed)
+    base = os.path.join(root, SNAPSHOT_DIR, run_id)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    msgs: List[str] = []
+    for rel, how in sorted(files.items()):
+        had = _to_trash(root, run_id, stamp, rel)
+        if how == "new":
+            if had:
+                msgs.append(f"REMOVE {rel}")
+            continue
+        target = ensure_inside(root, rel)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.devagent-rollback"
+        shutil.copy2(os.path.join(base, rel), tmp)  # Snapshot bleibt für weitere Rollbacks erhalten
+        os.replace(tmp, target)
+        msgs.append(f"RESTORE {rel}")
+    return msgs
+
+def _snapshot_digest(root: str, run_id: str, rel: str, how: str) -> Optional[str]:
+    return None if how == "new" else _digest(os.path.join(root, SNAPSHOT_DIR, run_id, rel))
+
+def rollback(workspace: str, run_id: str, force: bool = False) -> List[str]:
+    """Setzt die Pfade, die run_id geändert hat, auf den Stand davor zurück; liefert die Meldungen.
+    Ohne force wird abgebrochen, wenn einer davon nach dem Lauf erneut geändert wurde."""
+    root = os.path.realpath(workspace)
+    manifest = json_load(_manifest_path(root, run_id))
+    if not manifest:
+        raise SnapshotError(f"Kein Snapshot für {run_id}")
+    if manifest.get("kind") == "git":
+        return _rollback_git(root, run_id, manifest, force)
+    return _rollback_files(root, run_id, manifest, force)
@@ -1,6 +1,8 @@
 from __future__ import annotations
-import os, json, hashlib, base64, re, subprocess, shlex, time, pathlib
-from typing import Iterable, List, Tuple
+import os, json, hashlib, base64, re, subprocess, shlex, time, pathlib, threading, tempfile
+from collections import deque
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple
+from . import gitio
 
 def is_text_bytes(b: bytes) -> bool:
     if not b:
@@ -33,6 +35,29 @@ def json_dump(path: str, obj: dict) -> None:
     with open(path, "w", encoding="utf-8") as f:
         json.dump(obj, f, ensure_ascii=False, indent=2)
 
+def atomic_write_text(path: str, text: str) -> None:
+    """Schreibt über eine temporäre Datei im selben Ordner und os.replace; Dateimodus bleibt erhalten."""
+    d = os.path.dirname(path) or "."
+    os.makedirs(d, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".devagent-", dir=d)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        try:
+            os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+        except FileNotFoundError:
+            os.chmod(tmp, 0o666 & ~_umask())
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.remove(tmp)
+        except FileNotFoundError: pass
+        raise
+
+def _umask() -> int:
+    m = os.umask(0)
+    os.umask(m)
+    return m
+
 def json_load(path: str) -> dict | None:
     if not os.path.exists(path):
         return None
@@ -56,13 +81,81 @@ def run_cmd(args: List[str], cwd: str | None = None, timeout: int | None = None)
         return 124, out, err
     return proc.returncode, out, err
 
+MAX_LINE_CHARS = 4000
+
+class _HeadTail:
+    """Behält die ersten head und die letzten tail Zeilen, zählt den Rest."""
+
+    def __init__(self, head: int, tail: int):
+        self.head_max = head
+        self.head: List[str] = []
+        self.tail: deque = deque(maxlen=max(0, tail))
+        self.dropped = 0
+
+    def add(self, line: str) -> None:
+        if len(self.head) < self.head_max:
+            self.head.append(line)
+            return
+        if self.tail.maxlen == 0 or len(self.tail) == self.tail.maxlen:
+            self.dropped += 1
+        if self.tail.maxlen:
+            self.tail.append(line)
+
+    def text(self) -> str:
+        skipped = [f"... ({self.dropped} Zeilen ausgelassen) ..."] if self.dropped else []
+        return "\n".join(self.head + skipped + list(self.tail))
+
+class CmdResult(NamedTuple):
+    code: int
+    out: str
+    err: str
+    aborted: Optional[str] = None  # Abbruchmuster, das getroffen hat
+
+def stream_cmd(args: List[str], cwd: str | None = None, timeout: float | None = None,
+               on_line: Optional[Callable[[str, str], None]] = None, head_lines: int = 100,
+               tail_lines: int = 200, abort_patterns: Iterable[str] = ()) -> CmdResult:
+    """Wie run_cmd, aber stdout/stderr werden parallel zeilenweise gelesen und per on_line(stream, line)
+    live weitergereicht. Im Ergebnis bleiben nur Kopf und Ende (begrenzter Speicher).
+    Trifft eine Zeile ein abort_pattern (Regex), wird der Prozess beendet. Timeout => code 124.
+    """
+    rx = [re.compile(p) for p in abort_patterns]
+    proc = subprocess.Popen(args, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            text=True, errors="replace", bufsize=1)
+    bufs = {"stdout": _HeadTail(head_lines, tail_lines), "stderr": _HeadTail(head_lines, tail_lines)}
+    aborted: List[str] = []
+
+    def pump(name: str, pipe) -> None:
+        with pipe:
+            for line in pipe:
+                line = line.rstrip("\n")[:MAX_LINE_CHARS]
+                bufs[name].add(line)
+                if on_line:
+                    on_line(name, line)
+                if not aborted:
+                    hit = next((r.pattern for r in rx if r.search(line)), None)
+                    if hit:
+                        aborted.append(hit)
+                        proc.kill()
+
+    readers = [threading.Thread(target=pump, args=(n, p), daemon=True)
+               for n, p in (("stdout", proc.stdout), ("stderr", proc.stderr))]
+    for t in readers:
+        t.start()
+    try:
+        code = proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        code = 124
+    for t in readers:
+        t.join(timeout=5 if code == 124 or aborted else None)  # Enkelprozesse halten evtl. die Pipe
+    return CmdResult(code, bufs["stdout"].text(), bufs["stderr"].text(), aborted[0] if aborted else None)
+
 def is_git_repo(path: str) -> bool:
-    code, _, _ = run_cmd(["git", "rev-parse", "--is-inside-work-tree"], cwd=path)
-    return code == 0
+    return gitio.is_repo(path)  # gemerkt für die Prozesslaufzeit
 
 def git_top(path: str) -> str | None:
-    code, out, _ = run_cmd(["git", "rev-parse", "--show-toplevel"], cwd=path)
-    return out.strip() if code == 0 else None
+    return gitio.repo_top(path)
 
 def git_commit_all(path: str, message: str) -> str | None:
     code, _, _ = run_cmd(["git", "add", "-A"], cwd=path)
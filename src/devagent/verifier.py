@@ -1,9 +1,10 @@
 from __future__ import annotations
-from typing import List
+from typing import Dict, List, Optional
 import os, re
 from .schemas import Plan, Action
 from .jail import ensure_inside
 from .config import Config
+from .patcher import PatchError, PatchUnsupported, compute_patch
 from .utils import normalize_cmd, ensure_no_pipes_redirs
 
 FORBIDDEN_RE = re.compile(r"(?:^|/)\.\.(?:/|$)")
@@ -16,35 +17,64 @@ def verify_plan(plan: Plan, workspace: str, cfg: Config, has_git: bool) -> List[
         errs.append(f"Zu viele Aktionen: {len(plan.actions)} > {cfg.max_actions}")
 
     for i, a in enumerate(plan.actions):
-        if a.type in ("create","edit","delete"):
-            if not a.file:
-                errs.append(f"[{i}] file fehlt")
-                continue
-            if FORBIDDEN_RE.search(a.file):
-                errs.append(f"[{i}] '..' im Pfad verboten: {a.file}")
-                continue
+        errs.extend(verify_action(i, a, workspace, cfg, has_git))
+    if not errs:
+        errs.extend(verify_patches(plan, workspace))
+    return errs
+
+def verify_patches(plan: Plan, workspace: str) -> List[str]:
+    """Wendet alle Patches des Plans im Speicher auf den Stand nach den vorherigen Aktionen an.
+    Formen, die nur git apply beherrscht, werden hier nicht bewertet."""
+    if not any(a.type == "edit" and a.content is None and a.patch for a in plan.actions):
+        return []
+    errs: List[str] = []
+    files: Dict[str, Optional[str]] = {}
+    for i, a in enumerate(plan.actions):
+        if a.type == "create" or (a.type == "edit" and a.content is not None):
+            files[os.path.normpath(a.file or "")] = a.content or ""
+        elif a.type == "delete":
+            files[os.path.normpath(a.file or "")] = None
+        elif a.type == "edit" and a.patch:
             try:
-                ensure_inside(workspace, a.file)
-            except Exception as e:
-                errs.append(f"[{i}] Pfad ungültig: {e}")
-            if a.type == "edit" and (not a.content and not a.patch):
-                errs.append(f"[{i}] edit benötigt content oder patch")
-            if a.type == "edit" and a.patch and cfg.enforce_git_for_patches and not has_git:
-                errs.append(f"[{i}] patch benötigt Git-Repo (enforce_git_for_patches=true)")
-        elif a.type == "run":
-            argv = normalize_cmd(a.cmd or [])
-            if not argv:
-                errs.append(f"[{i}] run ohne cmd")
+                files.update(compute_patch(workspace, a.patch, files))
+            except PatchUnsupported:
                 continue
-            if not ensure_no_pipes_redirs(argv):
-                errs.append(f"[{i}] Pipes/Redirections/Shell-Operatoren verboten")
-            base = os.path.basename(argv[0])
-            if base in cfg.disallow_commands:
-                errs.append(f"[{i}] Befehl explizit verboten: {base}")
-            if base not in cfg.allow_commands:
-                errs.append(f"[{i}] Befehl nicht erlaubt: {base}")
-            if any(x in ("sudo",) for x in argv):
-                errs.append(f"[{i}] 'sudo' verboten")
-        else:
-            errs.append(f"[{i}] unbekannter Typ: {a.type}")
+            except PatchError as e:
+                errs.append(f"[{i}] patch passt nicht: {e}")
+    return errs
+
+def verify_action(i: int, a: Action, workspace: str, cfg: Config, has_git: bool) -> List[str]:
+    """Prüft eine einzelne Aktion (auch für gestreamte Pläne, bevor der Rest da ist)."""
+    errs: List[str] = []
+    if a.type in ("create","edit","delete"):
+        if not a.file:
+            errs.append(f"[{i}] file fehlt")
+            return errs
+        if FORBIDDEN_RE.search(a.file):
+            errs.append(f"[{i}] '..' im Pfad verboten: {a.file}")
+            return errs
+        try:
+            ensure_inside(workspace, a.file)
+        except Exception as e:
+            errs.append(f"[{i}] Pfad ungültig: {e}")
+        if a.type == "edit" and (not a.content and not a.patch):
+            errs.append(f"[{i}] edit benötigt content oder patch")
+        if a.type == "edit" and a.patch and cfg.enforce_git_for_patches and not has_git:
+            errs.append(f"[{i}] patch benötigt Git-Repo (enforce_git_for_patches=true)")
+    elif a.type == "run":
+        argv = normalize_cmd(a.cmd or [])
+        if not argv:
+            errs.append(f"[{i}] run ohne cmd")
+            return errs
+        if not ensure_no_pipes_redirs(argv):
+            errs.append(f"[{i}] Pipes/Redirections/Shell-Operatoren verboten")
+        base = os.path.basename(argv[0])
+        if base in cfg.disallow_commands:
+            errs.append(f"[{i}] Befehl explizit verboten: {base}")
+        if base not in cfg.allow_commands:
+            errs.append(f"[{i}] Befehl nicht erlaubt: {base}")
+        if any(x in ("sudo",) for x in argv):
+            errs.append(f"[{i}] 'sudo' verboten")
+    else:
+        errs.append(f"[{i}] unbekannter Typ: {a.type}")
     return errs
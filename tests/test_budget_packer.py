@@ -0,0 +1,44 @@
+from devagent.budget import CardBudget, pack_card, estimate_tokens
+from devagent.config import Config
+from devagent.prompts import build_prompts
+
+def _samples(n, lines):
+    body = "\n".join(f"line {i} " + "x" * 30 for i in range(lines))
+    return [(f"f{i}.py", body, True) for i in range(n)]
+
+def test_unbounded_budget_keeps_legacy_limits():
+    files = [f"f{i}.py" for i in range(5)]
+    card, report = pack_card(files, _samples(5, 3), CardBudget(max_samples=2))
+    assert card.startswith("Files:\n- f0.py")
+    assert card.count("--- f") == 2
+    assert report["samples_full"] == 2 and report["heads"] == 0
+
+def test_budget_fills_list_then_samples_then_heads():
+    files = [f"f{i}.py" for i in range(200)]
+    budget = CardBudget(tokens=800, files_share=0.3)
+    card, report = pack_card(files, _samples(10, 40), budget)
+    assert report["total"] <= 800
+    assert report["files"] <= 240
+    assert "... (+" in card
+    assert report["samples_full"] >= 1
+    assert report["samples_truncated"] >= 1
+    assert "(gekürzt) ---" in card
+    assert estimate_tokens(card) <= report["total"]
+
+def test_markers_are_not_truncated():
+    samples = [("a.bin", "--- a.bin (binary or non-utf8, skipped) ---", False)]
+    card, report = pack_card(["a.bin"], samples, CardBudget(tokens=1000))
+    assert "a.bin (binary" in card and report["samples_full"] == 1
+
+def test_build_prompts_respects_model_context(tmp_path):
+    for i in range(30):
+        (tmp_path / f"m{i}.py").write_text("\n".join(f"value_{j} = {i * 1000 + j}" for j in range(120)), encoding="utf-8")
+    cfg = Config()
+    cfg.model_context = {"small/model": 3000}
+    cfg.response_tokens = 500
+    sys_p, usr_p, report = build_prompts(tmp_path.as_posix(), cfg, "value", model="small/model")
+    assert 0 < report["budget"] < 3000 - 500
+    assert report["total"] <= report["budget"]
+    _, usr_big, big = build_prompts(tmp_path.as_posix(), cfg, "value")
+    assert big["total"] > report["total"]
+    assert len(usr_big) > len(usr_p)
@@ -0,0 +1,49 @@
+from devagent.config import Config
+from devagent.llm import LLMClient
+from devagent.prompts import CardSession, build_prompts, format_delta
+from devagent.scanner import project_card
+
+def _ws(tmp_path):
+    for i in range(20):
+        (tmp_path / f"mod{i}.py").write_text("\n".join(f"def f{i}_{j}(): return {j}" for j in range(40)), encoding="utf-8")
+    (tmp_path / ".devagent").mkdir()
+    return tmp_path.as_posix()
+
+def test_second_turn_sends_only_delta(tmp_path):
+    ws = _ws(tmp_path)
+    cfg = Config()
+    cards = CardSession()
+    _, u1, _ = build_prompts(ws, cfg, "mod3 anpassen", session=cards)
+    assert cards.last["mode"] == "full"
+    base = cards.context[0]
+    assert f"[card:{cards.last['ref']}]" in u1 and "def f3_0" in base and "def f3_0" not in u1
+
+    (tmp_path / "mod3.py").write_text("def neu(): pass\n", encoding="utf-8")
+    (tmp_path / "extra.py").write_text("x = 1\n", encoding="utf-8")
+    (tmp_path / "mod7.py").unlink()
+    _, u2, _ = build_prompts(ws, cfg, "mod3 anpassen", session=cards)
+    assert cards.last["mode"] == "delta"
+    assert cards.context[0] == base  # stabiler Präfix
+    assert "Neu: extra.py" in u2 and "Entfernt: mod7.py" in u2 and "Geändert: mod3.py" in u2
+    assert "def neu(): pass" in u2
+    assert cards.last["delta_tokens"] < cards.last["full_tokens"] / 4
+    assert cards.last["tokens"] == cards.last["prefix_tokens"] + cards.last["delta_tokens"]  # real gesendet
+    assert "Karte" in format_delta(cards.last)
+
+    _, u3, _ = build_prompts(ws, cfg, "mod3 anpassen", model="other/model", session=cards)
+    assert cards.last["mode"] == "full" and cards.context[0] != base
+
+def test_context_goes_before_prompt_and_into_cache_key(tmp_path):
+    c = LLMClient("m", tmp_path.as_posix(), context=["KARTE"])
+    msgs = c._body("s", "u")["messages"]
+    assert [m["content"] for m in msgs] == ["s", "KARTE", "u"]
+    assert c._cache_prompt("u") != LLMClient("m", tmp_path.as_posix())._cache_prompt("u")
+
+def test_identical_files_are_sampled_once(tmp_path):
+    lock = "\n".join(f"pkg{i}==1.{i}" for i in range(30))
+    for d in ("a", "b", "c"):
+        (tmp_path / d).mkdir()
+        (tmp_path / d / "requirements.lock").write_text(lock, encoding="utf-8")
+    card = project_card(tmp_path.as_posix(), [], use_git=False)
+    assert card.count("pkg7==1.7") == 1
+    assert "(identisch mit a/requirements.lock)" in card
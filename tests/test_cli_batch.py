@@ -0,0 +1,56 @@
+import json, threading, time, yaml
+from typer.testing import CliRunner
+from devagent.cli import app
+from devagent.schemas import Plan, Action
+
+class SlowLLM:
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def __init__(self, model, **kw):
+        self.stats = {"model": model}
+
+    def generate_plan(self, system_prompt, user_prompt):
+        with SlowLLM.lock:
+            SlowLLM.active += 1
+            SlowLLM.peak = max(SlowLLM.peak, SlowLLM.active)
+        time.sleep(0.2)
+        with SlowLLM.lock:
+            SlowLLM.active -= 1
+        if "kaputt" in user_prompt:
+            return Plan(actions=[Action(type="create", file="../x.txt", content="x")]), "bad"
+        return Plan(actions=[Action(type="create", file="a.txt", content="x")]), "h"
+
+def test_batch_pipeline_writes_plans_and_summary(tmp_path, monkeypatch):
+    monkeypatch.setattr("devagent.cli.LLMClient", SlowLLM)
+    SlowLLM.peak = 0
+    for n in ("r1", "r2", "r3", "r4"):
+        (tmp_path / n).mkdir()
+        (tmp_path / n / "main.py").write_text("print(1)\n")
+    jobs = tmp_path / "jobs.jsonl"
+    jobs.write_text("\n".join([
+        json.dumps({"workspace": "r1", "goal": "Logging ergänzen"}),
+        json.dumps({"workspace": "r2", "template": "lint_fix"}),
+        json.dumps({"workspace": "r3", "goal": "Tests"}),
+        json.dumps({"workspace": "r4", "goal": "kaputt"}),
+    ]) + "\n")
+    out = tmp_path / "out"
+    t0 = time.perf_counter()
+    r = CliRunner().invoke(app, ["batch", str(jobs), "--out", str(out), "-j", "4"])
+    wall = time.perf_counter() - t0
+    assert r.exit_code == 1, r.output  # r4 scheitert in verify
+    assert SlowLLM.peak >= 2 and wall < 0.8  # LLM-Aufrufe überlappen
+    summary = json.loads((out / "summary.json").read_text())
+    assert summary["jobs"] == 4 and summary["ok"] == 3 and summary["failed"] == 1
+    assert set(summary["stages"]) == {"scan", "llm", "verify"}
+    assert summary["stages"]["llm"]["n"] == 4
+    first = summary["results"][0]
+    assert yaml.safe_load(open(first["plan"]))["actions"][0]["file"] == "a.txt"
+    assert summary["results"][3]["errors"]
+
+def test_batch_rejects_bad_jobs_file(tmp_path):
+    jobs = tmp_path / "jobs.jsonl"
+    jobs.write_text('{"workspace": "."}\n')
+    r = CliRunner().invoke(app, ["batch", str(jobs)])
+    assert r.exit_code == 2
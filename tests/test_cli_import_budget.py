@@ -0,0 +1,32 @@
+import os, subprocess, sys
+import pytest
+
+# Kaltstart einzelner Kommandos: 'python -X importtime' summiert die Eigenzeiten aller Importe.
+# Das Budget ist großzügig (laute CI-Maschinen); die Liste schwerer Module ist die harte Grenze.
+BUDGET_MS = float(os.environ.get("DEVAGENT_IMPORT_BUDGET_MS", "350"))
+HEAVY = ("httpx", "pydantic", "yaml", "devagent.llm", "devagent.repl", "devagent.executor", "devagent.schemas")
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+def _import_profile(args, cwd):
+    env = {**os.environ, "PYTHONPATH": SRC + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-m", "devagent.cli"] + args,
+                          cwd=cwd, env=env, capture_output=True, text=True)
+    total_us = 0
+    modules = set()
+    for ln in proc.stderr.splitlines():
+        if not ln.startswith("import time:") or "self [us]" in ln:
+            continue
+        self_us, _, name = ln[len("import time:"):].split("|")
+        total_us += int(self_us)
+        modules.add(name.strip())
+    return proc.returncode, total_us / 1000.0, modules
+
+@pytest.mark.parametrize("cmd", ["approve", "logs", "scan"])
+def test_cold_start_budget(tmp_path, cmd):
+    (tmp_path / "a.py").write_text("x = 1\n", encoding="utf-8")
+    args = {"approve": ["approve", "--code", "x"], "logs": ["logs"], "scan": ["scan"]}[cmd]
+    code, total_ms, modules = _import_profile(args + ["-w", str(tmp_path)], str(tmp_path))
+    assert code == (2 if cmd == "approve" else 0)
+    loaded = sorted(m for m in HEAVY if m in modules)
+    assert not loaded, f"{cmd} lädt {loaded}"
+    assert total_ms <= BUDGET_MS, f"{cmd}: Importe {total_ms:.0f} ms > {BUDGET_MS:.0f} ms"
@@ -0,0 +1,85 @@
+import os, textwrap
+from typer.testing import CliRunner
+from devagent import config
+from devagent.config import load_config, resolve_config, set_cli_overrides
+
+def _write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(textwrap.dedent(text), encoding="utf-8")
+
+def test_layers_merge_in_order(tmp_path, monkeypatch):
+    ws = tmp_path / "ws"
+    monkeypatch.setenv("XDG_CONFIG_HOME", (tmp_path / "xdg").as_posix())
+    monkeypatch.setenv("DEVAGENT_HTTP_TIMEOUT", "12.5")
+    monkeypatch.setenv("DEVAGENT_RACE_MODELS", "a/b, c/d")
+    _write(tmp_path / "xdg" / "devagent" / "config.toml", """
+    model = "xdg/model"
+    max_actions = 3
+    scan_workers = 2
+    """)
+    _write(ws / ".devagent" / "config.toml", """
+    max_actions = 7
+    http_timeout = 99
+    """)
+    cfg, sources = resolve_config(ws.as_posix(), {"scan_workers": 6})
+    assert cfg.model == "xdg/model" and sources["model"].startswith("xdg:")
+    assert cfg.max_actions == 7 and sources["max_actions"].startswith("project:")
+    assert cfg.http_timeout == 12.5 and sources["http_timeout"] == "env:DEVAGENT_HTTP_TIMEOUT"
+    assert cfg.race_models == ["a/b", "c/d"]
+    assert cfg.scan_workers == 6 and sources["scan_workers"] == "cli"
+    assert "card_max_files" not in sources
+
+def test_memoized_until_file_changes(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CONFIG_HOME", (tmp_path / "xdg").as_posix())
+    path = tmp_path / ".devagent" / "config.toml"
+    _write(path, "max_actions = 4\n")
+    calls = []
+    orig = config._resolve
+    monkeypatch.setattr(config, "_resolve", lambda *a: calls.append(1) or orig(*a))
+    a = load_config(tmp_path.as_posix())
+    a.max_actions = 100  # Kopie: verändert den gemerkten Stand nicht
+    assert load_config(tmp_path.as_posix()).max_actions == 4
+    assert len(calls) == 1
+    _write(path, "max_actions = 5\n")
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert load_config(tmp_path.as_posix()).max_actions == 5
+    assert len(calls) == 2
+
+def test_invalid_value_names_layer(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CONFIG_HOME", (tmp_path / "xdg").as_posix())
+    monkeypatch.setenv("DEVAGENT_MAX_ACTIONS", "viele")
+    try:
+        load_config(tmp_path.as_posix())
+    except ValueError as e:
+        assert "env:DEVAGENT_MAX_ACTIONS" in str(e)
+    else:
+        raise AssertionError("ValueError erwartet")
+
+def test_cli_explain_and_set(tmp_path, monkeypatch):
+    from devagent.cli import app
+    monkeypatch.setenv("XDG_CONFIG_HOME", (tmp_path / "xdg").as_posix())
+    _write(tmp_path / ".devagent" / "config.toml", 'model = "foo/bar"\n')
+    try:
+        res = CliRunner().invoke(app, ["--set", "hook_workers=3", "config", "--explain", "-w", tmp_path.as_posix()])
+    finally:
+        set_cli_overrides({})
+    assert res.exit_code == 0, res.output
+    lines = {ln.split("│")[1].strip(): ln for ln in res.output.splitlines() if ln.count("│") >= 3}
+    assert "project:" in lines["model"] and "foo/bar" in lines["model"]
+    assert "cli" in lines["hook_workers"] and "3" in lines["hook_workers"]
+    assert "default" in lines["max_actions"]
+
+def test_cli_reports_invalid_config(tmp_path, monkeypatch):
+    from devagent.cli import app
+    monkeypatch.setenv("XDG_CONFIG_HOME", (tmp_path / "xdg").as_posix())
+    monkeypatch.setenv("DEVAGENT_MAX_ACTIONS", "viele")
+    jobs = tmp_path / "jobs.jsonl"
+    jobs.write_text('{"workspace": "%s", "goal": "x"}\n' % tmp_path.as_posix(), encoding="utf-8")
+    ws = ["-w", tmp_path.as_posix()]
+    for args in (["repl"] + ws, ["plan", "-g", "ziel"] + ws, ws + ["-p", "ziel"], ["batch", str(jobs)], ["config"] + ws):
+        res = CliRunner().invoke(app, args, input="/quit\n")
+        assert res.exit_code == 2, (args, res.output)
+        out = " ".join(res.output.split())
+        assert "env:DEVAGENT_MAX_ACTIONS, Schlüssel 'max_actions'" in out, out
+        assert not isinstance(res.exception, ValueError)
@@ -0,0 +1,55 @@
+import difflib, random
+from devagent.config import Config
+from devagent.diffing import DiffCache, compute, opcodes
+from devagent.executor import execute, preview
+from devagent.schemas import Plan, Action
+
+def test_opcodes_rebuild_target_and_match_difflib_format():
+    rnd = random.Random(7)
+    for _ in range(500):
+        a = [rnd.choice("abcde") for _ in range(rnd.randint(0, 25))]
+        b = [rnd.choice("abcde") for _ in range(rnd.randint(0, 25))]
+        out = []
+        for tag, i1, i2, j1, j2 in opcodes(a, b):
+            if tag == "equal":
+                assert a[i1:i2] == b[j1:j2]
+            out += b[j1:j2]
+        assert out == b
+    a = [f"line {i}" for i in range(60)]
+    b = a[:10] + ["new"] + a[10:40] + ["X"] + a[41:]
+    ref = "\n".join(difflib.unified_diff(a, b, "a/f.txt", "b/f.txt", lineterm=""))
+    assert compute("\n".join(a), "\n".join(b), 1000).unified("f.txt") == ref
+
+def test_size_cutoff_gives_summary():
+    d = compute("x\n" * 10, "y\n" * 20, max_lines=15)
+    assert d.skipped and "10 -> 20" in d.body
+
+def test_preview_diff_reused_by_execute_report(tmp_path):
+    (tmp_path / "a.txt").write_text("one\ntwo\n", encoding="utf-8")
+    plan = Plan(actions=[Action(type="edit", file="a.txt", content="one\nTWO\nthree\n")])
+    cfg = Config()
+    items = preview(plan, tmp_path.as_posix(), cfg)
+    assert "+TWO" in items[0].diff
+    report = {}
+    ok, _ = execute(plan, tmp_path.as_posix(), "r1", require_git_for_patches=False, cfg=cfg, report=report)
+    assert ok and report == {"a.txt": (2, 1)}
+    fresh = DiffCache(tmp_path.as_posix())
+    fresh.get("one\ntwo\n", "one\nTWO\nthree\n")
+    assert fresh.stats == {"hits": 1, "misses": 0}
+
+def test_duplicated_lines_stay_local_past_max_cost():
+    # keine eindeutigen Zeilen, 541 verstreute Änderungen (> MAX_COST Edits): keine Ganzdatei-Ersetzung
+    rnd = random.Random(1)
+    a = [f"    value = {i % 40}" for i in range(20000)]
+    b = list(a)
+    for k in rnd.sample(range(20000), 541):
+        b[k] = f"    value = {rnd.randrange(40)}  # x"  # je 2 Edits, zusammen > MAX_COST
+    out, changed = [], 0
+    for tag, i1, i2, j1, j2 in opcodes(a, b):
+        if tag == "equal":
+            assert a[i1:i2] == b[j1:j2]
+        else:
+            changed += max(i2 - i1, j2 - j1)
+        out += b[j1:j2]
+    assert out == b
+    assert changed <= 2 * 541
@@ -0,0 +1,53 @@
+import os, sys, time
+from devagent.config import Config
+from devagent.schemas import Plan, Action
+from devagent.executor import action_deps, execute
+
+SLEEP = [sys.executable, "-c", "import time; time.sleep(0.4)"]
+
+def test_action_deps():
+    acts = [
+        Action(type="create", file="a.py", content="1"),
+        Action(type="create", file="b.py", content="2"),
+        Action(type="edit", file="a.py", content="3"),
+        Action(type="run", cmd=["ruff"]),
+        Action(type="run", cmd=["mypy"]),
+        Action(type="create", file="c.py", content="4"),
+    ]
+    assert action_deps(acts) == [set(), set(), {0}, {0, 1, 2}, {0, 1, 2, 3}, {3, 4}]
+    assert action_deps(acts, {"ruff", "mypy"}) == [set(), set(), {0}, {0, 1, 2}, {0, 1, 2}, {3, 4}]
+
+def test_runs_serial_unless_marked_parallel(tmp_path):
+    plan = Plan(actions=[Action(type="run", cmd=SLEEP), Action(type="run", cmd=SLEEP)])
+    t0 = time.perf_counter()
+    ok, msgs = execute(plan, tmp_path.as_posix(), run_id="r1", require_git_for_patches=False, workers=4)
+    assert ok and time.perf_counter() - t0 >= 0.8  # z.B. npm install -> npm test
+    cfg = Config(run_parallel_commands=[os.path.basename(SLEEP[0])])
+    t0 = time.perf_counter()
+    ok, msgs = execute(plan, tmp_path.as_posix(), run_id="r2", require_git_for_patches=False, workers=4, cfg=cfg)
+    assert ok and time.perf_counter() - t0 < 0.75
+
+def test_independent_runs_overlap(tmp_path):
+    plan = Plan(actions=[Action(type="create", file=f"f{i}.txt", content=str(i)) for i in range(5)]
+                + [Action(type="run", cmd=SLEEP), Action(type="run", cmd=SLEEP)])
+    t0 = time.perf_counter()
+    cfg = Config(run_parallel_commands=[os.path.basename(SLEEP[0])])
+    ok, msgs = execute(plan, tmp_path.as_posix(), run_id="r", require_git_for_patches=False, workers=4, cfg=cfg)
+    assert ok and time.perf_counter() - t0 < 0.75
+    assert [m.split()[0] for m in msgs] == ["CREATE"] * 5 + ["RUN", "RUN"]  # Planreihenfolge
+
+def test_run_sees_preceding_file_ops(tmp_path):
+    check = [sys.executable, "-c", "import pathlib; assert pathlib.Path('x.txt').read_text() == 'neu'"]
+    plan = Plan(actions=[Action(type="create", file="x.txt", content="alt"),
+                         Action(type="edit", file="x.txt", content="neu"),
+                         Action(type="run", cmd=check)])
+    ok, msgs = execute(plan, tmp_path.as_posix(), run_id="r", require_git_for_patches=False, workers=4)
+    assert ok, msgs
+
+def test_stops_after_first_error(tmp_path):
+    fail = [sys.executable, "-c", "import sys; sys.exit(2)"]
+    plan = Plan(actions=[Action(type="run", cmd=fail),
+                         Action(type="create", file="later.txt", content="x")])
+    ok, msgs = execute(plan, tmp_path.as_posix(), run_id="r", require_git_for_patches=False, workers=4)
+    assert not ok and any("exit 2" in m for m in msgs)
+    assert not (tmp_path / "later.txt").exists()
@@ -0,0 +1,31 @@
+import subprocess
+from devagent import gitio
+
+def _git(ws, *args):
+    subprocess.run(["git", "-c", "user.email=t@t", "-c", "user.name=t", *args], cwd=ws, check=True, capture_output=True)
+
+def test_repo_detection_cached_and_notices_git_init(tmp_path):
+    ws = tmp_path.as_posix()
+    assert gitio.is_repo(ws) is False
+    spawned = gitio.stats["spawned"]
+    assert gitio.is_repo(ws) is False
+    assert gitio.stats["spawned"] == spawned  # zweiter Aufruf ohne Prozess
+    _git(ws, "init", "-q")
+    assert gitio.repo_top(ws) == str(tmp_path.resolve())
+
+def test_status_is_fresh_and_cat_file_reused(tmp_path):
+    ws = tmp_path.as_posix()
+    _git(ws, "init", "-q")
+    (tmp_path / "a.txt").write_text("a\n", encoding="utf-8")
+    _git(ws, "add", "a.txt")
+    _git(ws, "commit", "-qm", "init")
+    (tmp_path / "a.txt").write_text("b\n", encoding="utf-8")
+    (tmp_path / "new.txt").write_text("n\n", encoding="utf-8")
+    assert gitio.status(ws) == {"a.txt": ".M", "new.txt": "??"}
+    (tmp_path / "new.txt").unlink()
+    assert gitio.status(ws) == {"a.txt": ".M"}  # kein Memo: Worktree-Änderungen sofort sichtbar
+    assert gitio.read_object(ws, "HEAD:a.txt") == ("blob", b"a\n")
+    spawned = gitio.stats["spawned"]
+    assert gitio.read_object(ws, "HEAD:missing.txt") is None
+    assert gitio.read_object(ws, "HEAD:a.txt") == ("blob", b"a\n")
+    assert gitio.stats["spawned"] == spawned  # derselbe cat-file-Prozess
@@ -0,0 +1,77 @@
+import json, os, stat, time
+from devagent.hooks import HookRunner, run_hooks
+from devagent.schemas import Plan, Action
+from devagent.executor import execute
+
+def _hook(d, name, body):
+    h = d / name
+    h.write_text("#!/usr/bin/env bash\n" + body, encoding="utf-8")
+    h.chmod(h.stat().st_mode | stat.S_IXUSR)
+
+def test_parallel_safe_hooks_run_concurrently(tmp_path):
+    d = tmp_path / ".devagent" / "hooks" / "PreToolUse"
+    d.mkdir(parents=True)
+    for i in range(3):
+        _hook(d, f"slow{i}.parallel.sh", "cat >/dev/null; sleep 0.4; echo ok\n")
+    _hook(d, "z-deny.parallel.sh", "cat >/dev/null; sleep 0.4; exit 1\n")
+    t0 = time.perf_counter()
+    allowed, msgs = run_hooks(tmp_path.as_posix(), "PreToolUse", {"x": 1})
+    assert time.perf_counter() - t0 < 1.2
+    assert allowed is False  # ein Block genügt
+    assert msgs == [f"[hook:PreToolUse:slow{i}.parallel.sh] ok" for i in range(3)]
+
+def test_discovery_cached_and_latency_recorded(tmp_path, monkeypatch):
+    d = tmp_path / ".devagent" / "hooks" / "PreToolUse"
+    d.mkdir(parents=True)
+    _hook(d, "audit.sh", "cat >/dev/null\n")
+    listed = []
+    real = os.listdir
+    monkeypatch.setattr(os, "listdir", lambda p: listed.append(p) or real(p))
+    plan = Plan(actions=[Action(type="create", file=f"f{i}.txt", content="x") for i in range(5)])
+    ok, msgs = execute(plan, tmp_path.as_posix(), "run1", require_git_for_patches=False)
+    assert ok, msgs
+    assert len(listed) == 2  # PreToolUse + PostToolUse, je einmal pro Run
+    log = (tmp_path / ".devagent" / "logs" / "run1.jsonl").read_text().splitlines()
+    rec = json.loads(log[-1])
+    assert rec["event"] == "hooks"
+    assert rec["payload"]["latency"]["PreToolUse:audit.sh"]["calls"] == 5
+
+def test_manifest_parallel_safe_flag(tmp_path):
+    hooks = tmp_path / ".devagent" / "hooks"
+    hooks.mkdir(parents=True)
+    (hooks / "slow.py").write_text("import time\ndef handle(event, payload):\n    time.sleep(0.3)\n", encoding="utf-8")
+    (hooks / "hooks.toml").write_text("".join(f"""
+[[hook]]
+name = "slow{i}"
+events = ["PreToolUse"]
+mode = "python"
+module = "slow.py"
+parallel_safe = true
+""" for i in range(3)), encoding="utf-8")
+    with HookRunner(tmp_path.as_posix()) as runner:
+        t0 = time.perf_counter()
+        allowed, _ = runner.run("PreToolUse", {"action": {}})
+        assert allowed and time.perf_counter() - t0 < 0.8
+        assert set(runner.latency) == {"PreToolUse:slow0", "PreToolUse:slow1", "PreToolUse:slow2"}
+
+def test_sequential_hook_never_overlaps_parallel_batch():
+    import threading
+    from devagent.hooks import _run_all
+    active, overlap, lock = [0], [], threading.Lock()
+    def call(name):
+        def run():
+            with lock:
+                active[0] += 1
+                if name == "seq" and active[0] > 1:
+                    overlap.append(name)
+            time.sleep(0.1)
+            with lock:
+                if name == "seq" and active[0] > 1:
+                    overlap.append(name)
+                active[0] -= 1
+            return True, [name]
+        return run
+    calls = [("p1", True, call("p1")), ("seq", False, call("seq")), ("p2", True, call("p2"))]
+    allowed, msgs = _run_all("PreToolUse", calls)
+    assert allowed and msgs == ["p1", "seq", "p2"]
+    assert overlap == []
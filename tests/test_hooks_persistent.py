@@ -0,0 +1,82 @@
+import json, os, sys
+from devagent.constants import HOOK_BLOBS_DIR
+from devagent.schemas import Plan, Action
+from devagent.executor import execute
+from devagent.hooks import HookRunner
+
+WORKER = r"""
+import json, os, sys
+for line in sys.stdin:
+    req = json.loads(line)
+    act = req["payload"]["action"]
+    content = act.get("content")
+    if isinstance(content, dict):
+        content = open(content["$file"], encoding="utf-8").read()
+    with open("calls.log", "a") as f:
+        f.write(f"{os.getpid()} {req['event']} {type(act.get('content')).__name__}\n")
+    allow = "VERBOTEN" not in (content or "")
+    print(json.dumps({"id": req["id"], "allow": allow, "message": "" if allow else "Inhalt verboten"}), flush=True)
+"""
+
+GUARD = """
+def handle(event, payload):
+    if payload["action"].get("file") == "secret.txt":
+        return False, "secret.txt ist tabu"
+    return True
+"""
+
+def _setup(tmp_path):
+    hooks = tmp_path / ".devagent" / "hooks"
+    hooks.mkdir(parents=True)
+    (hooks / "worker.py").write_text(WORKER, encoding="utf-8")
+    (hooks / "guard.py").write_text(GUARD, encoding="utf-8")
+    (hooks / "hooks.toml").write_text(f"""
+[[hook]]
+name = "policy"
+events = ["PreToolUse", "PostToolUse"]
+mode = "persistent"
+command = [{json.dumps(sys.executable)}, "worker.py"]
+inline_max = 100
+
+[[hook]]
+name = "guard"
+events = ["PreToolUse"]
+mode = "python"
+module = "guard.py"
+""", encoding="utf-8")
+    return hooks
+
+def test_persistent_worker_started_once_per_run(tmp_path):
+    hooks = _setup(tmp_path)
+    plan = Plan(actions=[Action(type="create", file=f"f{i}.txt", content="x" * (10 if i % 2 else 500))
+                         for i in range(4)])
+    ok, msgs = execute(plan, tmp_path.as_posix(), "r", require_git_for_patches=False)
+    assert ok, msgs
+    calls = (hooks / "calls.log").read_text().splitlines()
+    assert len(calls) == 8 and len({c.split()[0] for c in calls}) == 1  # ein Prozess für 8 Requests
+    assert {c.split()[2] for c in calls} == {"str", "dict"}  # große Inhalte als Dateiverweis
+    assert not os.listdir(tmp_path / HOOK_BLOBS_DIR)  # Blobs nach der Hook-Antwort gelöscht
+
+def test_persistent_and_python_hooks_block(tmp_path):
+    _setup(tmp_path)
+    plan = Plan(actions=[Action(type="create", file="a.txt", content="VERBOTEN" * 50)])
+    ok, msgs = execute(plan, tmp_path.as_posix(), "r", require_git_for_patches=False)
+    assert not ok and any("Inhalt verboten" in m for m in msgs)
+    with HookRunner(tmp_path.as_posix()) as runner:
+        allowed, msgs = runner.run("PreToolUse", {"action": {"type": "create", "file": "secret.txt"}})
+    assert not allowed and any("[hook:PreToolUse:guard] secret.txt ist tabu" in m for m in msgs)
+
+def test_hanging_worker_times_out(tmp_path):
+    hooks = tmp_path / ".devagent" / "hooks"
+    hooks.mkdir(parents=True)
+    (hooks / "hooks.toml").write_text(f"""
+[[hook]]
+name = "stuck"
+events = ["PreToolUse"]
+mode = "persistent"
+command = [{json.dumps(sys.executable)}, "-c", "import time; time.sleep(30)"]
+timeout = 0.3
+""", encoding="utf-8")
+    with HookRunner(tmp_path.as_posix()) as runner:
+        allowed, msgs = runner.run("PreToolUse", {"action": {"type": "run"}})
+    assert not allowed and any("keine Antwort" in m for m in msgs)
@@ -0,0 +1,50 @@
+import subprocess
+from devagent.ignore import IgnoreMatcher, compile_ignores, git_ls_files
+from devagent.scanner import scan_tree, scan_tree_parallel
+
+def test_gitignore_semantics():
+    m = IgnoreMatcher(["*.log", "!keep.log", "/target/", "vendor/**", "*.egg-info/", "docs/**/gen", "bazel-*"])
+    assert m.ignored("a/b/x.log", False)
+    assert not m.ignored("a/keep.log", False)
+    assert m.ignored("target", True)
+    assert not m.ignored("target", False)          # dir-only
+    assert not m.ignored("sub/target", True)       # verankert
+    assert m.ignored("vendor/lib/x.go", False)
+    assert m.ignored("pkg/foo.egg-info", True)
+    assert m.ignored("docs/gen", True) and m.ignored("docs/a/b/gen", True)
+    assert m.ignored("bazel-out", True)
+    assert m.ignored_path("target/debug/app")
+    assert not m.ignored_path("src/main.rs")
+
+def test_plain_names_fast_path():
+    m = IgnoreMatcher(["node_modules/", "secret.txt", "[ab].py"])
+    assert m.ignored("x/node_modules", True)
+    assert not m.ignored("node_modules", False)
+    assert m.ignored("deep/secret.txt", False)
+    assert m.ignored("a.py", False) and not m.ignored("c.py", False)
+
+def _tree(ws):
+    for rel in ["src/a.py", "src/a.pyc", "target/debug/app", "pkg.egg-info/PKG-INFO", "keep/x.log", "keep/y.txt", "sub/gen.txt"]:
+        p = ws / rel
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(rel, encoding="utf-8")
+    (ws / ".gitignore").write_text("*.pyc\ntarget/\n*.egg-info/\n*.log\n!keep/x.log\n", encoding="utf-8")
+    (ws / ".devagent").mkdir(exist_ok=True)
+    (ws / ".devagent" / "ignore").write_text("/sub/\n", encoding="utf-8")
+
+def test_scan_prunes_gitignored_dirs(tmp_path):
+    _tree(tmp_path)
+    files = scan_tree(tmp_path.as_posix(), [])
+    assert files == [".gitignore", "keep/x.log", "keep/y.txt", "src/a.py"]
+    assert scan_tree_parallel(tmp_path.as_posix(), [])[0] == files
+    assert scan_tree(tmp_path.as_posix(), ["keep"]) == [".gitignore", "src/a.py"]
+    assert compile_ignores(tmp_path.as_posix(), []) is compile_ignores(tmp_path.as_posix(), [])
+
+def test_git_ls_files_fast_path(tmp_path):
+    _tree(tmp_path)
+    assert git_ls_files(tmp_path.as_posix(), compile_ignores(tmp_path.as_posix(), [])) is None
+    subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+    (tmp_path / "src" / ".gitignore").write_text("a.py\n", encoding="utf-8")
+    files = git_ls_files(tmp_path.as_posix(), compile_ignores(tmp_path.as_posix(), []))
+    # verschachtelte .gitignore wird von git beachtet, .devagent/ignore vom Matcher
+    assert files == [".gitignore", "keep/x.log", "keep/y.txt", "src/.gitignore"]
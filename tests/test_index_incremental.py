@@ -0,0 +1,63 @@
+import os
+from devagent.index import load_index
+from devagent.scanner import scan_tree, project_card
+
+def test_index_matches_scan_and_persists(tmp_path):
+    ws = tmp_path
+    (ws / ".devagent").mkdir()
+    (ws / "src").mkdir()
+    (ws / "src" / "a.py").write_text("print('a')\n", encoding="utf-8")
+    (ws / "b.txt").write_text("b\n", encoding="utf-8")
+    (ws / "node_modules").mkdir()
+    (ws / "node_modules" / "x.js").write_text("x", encoding="utf-8")
+
+    idx = load_index(ws.as_posix(), [])
+    assert idx.files() == scan_tree(ws.as_posix(), [])
+    assert idx.stats["files_hashed"] == 2
+    idx.save()
+    assert (ws / ".devagent" / "index.json").exists()
+
+    idx2 = load_index(ws.as_posix(), [])
+    assert idx2.stats["files_hashed"] == 0
+    assert idx2.stats["dirs_listed"] == 0
+    assert idx2.entry("src/a.py")["sha256"] == idx.entry("src/a.py")["sha256"]
+
+def test_index_detects_changes(tmp_path):
+    ws = tmp_path
+    (ws / "a.txt").write_text("one\n", encoding="utf-8")
+    (ws / "b.txt").write_text("two\n", encoding="utf-8")
+    load_index(ws.as_posix(), []).save()
+
+    (ws / "a.txt").write_text("one changed\n", encoding="utf-8")
+    os.remove(ws / "b.txt")
+    (ws / "sub").mkdir()
+    (ws / "sub" / "c.txt").write_text("three\n", encoding="utf-8")
+
+    idx = load_index(ws.as_posix(), [])
+    assert idx.files() == ["a.txt", "sub/c.txt"]
+    assert idx.stats["files_hashed"] == 2
+
+def test_project_card_uses_index(tmp_path):
+    ws = tmp_path
+    (ws / "main.py").write_text("x = 1\n", encoding="utf-8")
+    (ws / "blob.bin").write_bytes(b"\x00\x01\x02")
+    (ws / ".env").write_text("SECRET=1\n", encoding="utf-8")
+    card = project_card(ws.as_posix(), [])
+    assert "--- main.py ---\nx = 1" in card
+    assert "blob.bin (binary or non-utf8, skipped)" in card
+    assert ".env (masked: sensitive)" in card
+    assert "SECRET" not in card
+    assert project_card(ws.as_posix(), []) == card
+
+def test_heads_live_outside_index_json(tmp_path):
+    ws = tmp_path
+    (ws / "main.py").write_text("MARKER_HEAD = 1\n", encoding="utf-8")
+    (ws / "other.py").write_text("y = 2\n", encoding="utf-8")
+    project_card(ws.as_posix(), [])
+    assert "MARKER_HEAD" not in (ws / ".devagent" / "index.json").read_text(encoding="utf-8")
+    heads = ws / ".devagent" / "cache" / "heads"
+    assert len(os.listdir(heads)) == 2
+    os.remove(ws / "other.py")
+    project_card(ws.as_posix(), [])
+    names = os.listdir(heads)
+    assert len(names) == 1 and (heads / names[0]).read_text(encoding="utf-8") == "MARKER_HEAD = 1"
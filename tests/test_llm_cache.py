@@ -0,0 +1,88 @@
+import os, time
+from typer.testing import CliRunner
+from devagent.cache import PlanCache
+from devagent.llm import LLMClient
+from devagent.cli import app
+
+RAW = [{"type": "run", "cmd": ["pytest", "-q"]}, {"type": "create", "file": "a.txt", "content": "x"}]
+
+class CountingClient(LLMClient):
+    calls = 0
+    def _request_actions(self, system_prompt, user_prompt):
+        type(self).calls += 1
+        return RAW
+
+def test_cache_hit_keeps_plan_hash(tmp_path):
+    CountingClient.calls = 0
+    cache = PlanCache(tmp_path.as_posix())
+    p1, h1 = CountingClient("m", tmp_path.as_posix(), cache=cache).generate_plan("s", "u")
+    c2 = CountingClient("m", tmp_path.as_posix(), cache=cache)
+    p2, h2 = c2.generate_plan("s", "u")
+    assert CountingClient.calls == 1
+    assert h1 == h2 and p1 == p2
+    assert c2.stats["cache"] == "hit" and c2.stats["hits"] == 1 and c2.stats["misses"] == 1
+    CountingClient("other", tmp_path.as_posix(), cache=cache).generate_plan("s", "u")
+    assert CountingClient.calls == 2
+
+def test_cache_lru_and_age_eviction(tmp_path):
+    big = PlanCache(tmp_path.as_posix())
+    keys = [PlanCache.key("m", "s", f"u{i}", "x") for i in range(4)]
+    for i, k in enumerate(keys):
+        big.put(k, RAW)
+        os.utime(big._path(k), (time.time() - 100 + i, time.time() - 100 + i))
+    cache = PlanCache(tmp_path.as_posix(), max_bytes=300, max_age_s=3600)
+    cache.get(keys[0])  # frisch benutzt -> bleibt
+    cache.put(PlanCache.key("m", "s", "new", "x"), RAW)
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    old = PlanCache(tmp_path.as_posix(), max_age_s=0)
+    assert old.get(keys[0]) is None
+
+class DummyCached:
+    calls = 0
+    def __init__(self, model, workspace=None, cfg=None, cache=None):
+        self.cache = cache
+        self.stats = {"model": model, "cache": "miss" if cache else "off"}
+    def generate_plan(self, system_prompt, user_prompt):
+        from devagent.llm import _plan_from_raw
+        type(self).calls += 1
+        return _plan_from_raw(RAW)
+
+def test_cli_no_cache_flag_and_audit(tmp_path, monkeypatch):
+    monkeypatch.setattr("devagent.cli.LLMClient", DummyCached)
+    ws = tmp_path.as_posix()
+    r = CliRunner().invoke(app, ["plan", "-g", "x", "-w", ws, "--no-cache"])
+    assert r.exit_code == 0, r.output
+    logs = list((tmp_path / ".devagent" / "logs").glob("plan-*.jsonl"))
+    assert logs and '"cache": "off"' in logs[0].read_text(encoding="utf-8")
+
+def test_stats_counts_survive_concurrent_jobs(tmp_path):
+    import threading
+    cache = PlanCache(tmp_path.as_posix())
+    def job():
+        for _ in range(25):
+            cache.get("0" * 64)
+    threads = [threading.Thread(target=job) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert cache.totals()["misses"] == 200
+
+def test_corrupt_stats_read_as_empty(tmp_path):
+    cache = PlanCache(tmp_path.as_posix())
+    os.makedirs(cache.dir, exist_ok=True)
+    with open(cache._stats_path, "w", encoding="utf-8") as f:
+        f.write('{"hits": 1,')  # halb geschrieben
+    assert cache.totals() == {"hits": 0, "misses": 0}
+    assert cache.get("0" * 64) is None
+    assert cache.totals()["misses"] == 1
+
+def test_get_tolerates_entry_evicted_before_touch(tmp_path, monkeypatch):
+    cache = PlanCache(tmp_path.as_posix())
+    key = "1" * 64
+    cache.put(key, RAW)
+    real_utime = os.utime
+    def racing_utime(path, *a, **kw):
+        os.remove(path)  # paralleles evict zwischen Lesen und Touch
+        return real_utime(path, *a, **kw)
+    monkeypatch.setattr(os, "utime", racing_utime)
+    assert cache.get(key) == RAW
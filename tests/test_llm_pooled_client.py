@@ -0,0 +1,68 @@
+import json, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+from devagent.config import Config
+from devagent.llm import LLMClient, shared_client
+from devagent import creds
+
+class _Stub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-Alive
+    connections = 0
+
+    def setup(self):
+        type(self).connections += 1
+        super().setup()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        content = json.dumps({"actions": [{"type": "run", "cmd": ["pytest"]}]})
+        body = json.dumps({"choices": [{"message": {"content": content}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def _serve():
+    _Stub.connections = 0
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Stub)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://127.0.0.1:{srv.server_address[1]}/v1/chat/completions"
+
+def test_shared_client_reuses_connection(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENROUTER_API_KEY", "sk-test")
+    srv, url = _serve()
+    try:
+        cfg = Config(api_url=url, http_keepalive_expiry=30.0)
+        for _ in range(3):  # drei REPL-Turns = drei Clients
+            plan, _ = LLMClient("m", tmp_path.as_posix(), cfg=cfg).generate_plan("s", "u")
+            assert plan.actions[0].cmd == ["pytest"]
+        assert _Stub.connections == 1
+        assert shared_client(cfg) is shared_client(cfg)
+
+        # Vergleich: neuer Client pro Aufruf (altes Verhalten) => neuer Handshake pro Request
+        for _ in range(3):
+            with httpx.Client() as c:
+                c.post(url, json={}).raise_for_status()
+        assert _Stub.connections == 4
+    finally:
+        srv.shutdown()
+
+def test_credentials_cached_until_mtime_changes(tmp_path, monkeypatch):
+    monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+    monkeypatch.setenv("XDG_CONFIG_HOME", (tmp_path / "xdg").as_posix())
+    ws = tmp_path.as_posix()
+    creds.set_openrouter_key("sk-one", scope="project", workspace=ws)
+    calls = []
+    real = creds._toml_load
+    monkeypatch.setattr(creds, "_toml_load", lambda p: calls.append(p) or real(p))
+    assert creds.get_openrouter_key(ws) == "sk-one"
+    assert creds.get_openrouter_key(ws) == "sk-one"
+    assert len(calls) == 1
+    time.sleep(0.01)
+    creds.set_openrouter_key("sk-two-longer", scope="project", workspace=ws)
+    assert creds.get_openrouter_key(ws) == "sk-two-longer"
+    assert len(calls) == 2
@@ -0,0 +1,119 @@
+import asyncio, time
+import httpx
+import pytest
+from devagent.config import Config
+from devagent.llm import AsyncLLMClient, LatencyStats, RequestScheduler
+
+GOOD = [{"type": "create", "file": "a.txt", "content": "x"}]
+BAD = [{"type": "create", "file": "../evil.txt", "content": "x"}]
+
+class FakeRace(AsyncLLMClient):
+    """Antwortet je Modell nach einer festen Verzögerung, ohne Netz."""
+    script = {}
+    started = []
+    cancelled = []
+
+    async def _request_async(self, client, model, system_prompt, user_prompt):
+        type(self).started.append(model)
+        delay, raw = self.script[model]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            type(self).cancelled.append(model)
+            raise
+        if isinstance(raw, Exception):
+            raise raw
+        return raw
+
+def _reset(script):
+    FakeRace.script = script
+    FakeRace.started = []
+    FakeRace.cancelled = []
+
+def _no_escape(plan):
+    return [f"#{i+1}: außerhalb" for i, a in enumerate(plan.actions) if a.file and a.file.startswith("..")]
+
+def test_race_picks_fastest_and_cancels_rest(tmp_path):
+    _reset({"slow": (1.0, GOOD), "fast": (0.01, GOOD)})
+    c = FakeRace(["slow", "fast"], workspace=tmp_path.as_posix(), cfg=Config())
+    t0 = time.perf_counter()
+    plan, _ = c.generate_plan("s", "u")
+    assert time.perf_counter() - t0 < 0.5
+    assert c.stats["model"] == "fast" and c.stats["race"]["fast"]["winner"]
+    assert FakeRace.cancelled == ["slow"]
+    assert plan.actions[0].file == "a.txt"
+
+def test_race_skips_invalid_and_failed(tmp_path):
+    _reset({"a": (0.01, BAD), "b": (0.02, RuntimeError("429")), "c": (0.05, GOOD)})
+    c = FakeRace(["a", "b", "c"], workspace=tmp_path.as_posix(), cfg=Config(), validate=_no_escape)
+    plan, _ = c.generate_plan("s", "u")
+    assert c.stats["model"] == "c"
+    assert c.stats["race"]["a"]["errors"] and "429" in c.stats["race"]["b"]["errors"][0]
+
+def test_race_all_invalid_raises(tmp_path):
+    _reset({"a": (0.0, BAD)})
+    c = FakeRace(["a"], workspace=tmp_path.as_posix(), cfg=Config(), validate=_no_escape)
+    with pytest.raises(RuntimeError):
+        c.generate_plan("s", "u")
+
+def test_hedge_uses_p95_delay(tmp_path):
+    ws = tmp_path.as_posix()
+    lat = LatencyStats(ws)
+    for _ in range(10):
+        lat.record("primary", 0.05)
+    lat.save()
+    cfg = Config(hedge=True, hedge_delay_s=30.0)
+    # primary hängt: Backup startet nach p95 (0.05s), nicht nach dem Fallback von 30s
+    _reset({"primary": (5.0, GOOD), "backup": (0.01, GOOD)})
+    c = FakeRace(["primary", "backup"], workspace=ws, cfg=cfg)
+    t0 = time.perf_counter()
+    c.generate_plan("s", "u")
+    assert time.perf_counter() - t0 < 1.0
+    assert FakeRace.started == ["primary", "backup"]
+    assert c.stats["model"] == "backup"
+    # primary schnell genug: Backup wird nie gestartet
+    _reset({"primary": (0.01, GOOD), "backup": (0.01, GOOD)})
+    c = FakeRace(["primary", "backup"], workspace=ws, cfg=cfg)
+    c.generate_plan("s", "u")
+    assert FakeRace.started == ["primary"]
+    assert LatencyStats(ws).p95("primary") is not None
+
+def test_async_client_outlives_calls(tmp_path):
+    seen = []
+
+    class Recording(FakeRace):
+        async def _request_async(self, client, model, system_prompt, user_prompt):
+            seen.append(client)
+            return GOOD
+
+    cfg = Config(http_max_connections=3)
+    for _ in range(2):
+        Recording(["a"], workspace=tmp_path.as_posix(), cfg=cfg).generate_plan("s", "u")
+    assert seen[0] is seen[1] and not seen[0].is_closed
+    assert seen[0]._transport._pool._max_connections == 3
+
+def test_arequest_waits_without_polling_and_frees_slot_on_cancel():
+    s = RequestScheduler(max_concurrency=1)
+    order = []
+
+    async def send():
+        order.append("send")
+        await asyncio.sleep(0.05)
+        return httpx.Response(200)
+
+    async def use():
+        async with s.arequest(send) as r:
+            return r.status_code
+
+    async def main():
+        first = asyncio.create_task(use())
+        await asyncio.sleep(0.01)
+        blocked = asyncio.create_task(use())
+        await asyncio.sleep(0.01)
+        blocked.cancel()
+        await asyncio.gather(blocked, return_exceptions=True)
+        assert await first == 200
+        assert await asyncio.wait_for(use(), 1.0) == 200
+
+    asyncio.run(main())
+    assert order == ["send", "send"]
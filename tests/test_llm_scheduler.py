@@ -0,0 +1,86 @@
+import json, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+import pytest
+from devagent.config import Config
+from devagent.llm import LLMClient, RequestScheduler, retry_after_seconds
+
+class _Flaky(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fail = []  # Statuscodes für die nächsten Antworten
+    hits = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        type(self).hits += 1
+        if self.fail:
+            code = self.fail.pop(0)
+            self.send_response(code)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        content = json.dumps({"actions": [{"type": "run", "cmd": ["pytest"]}]})
+        body = json.dumps({"choices": [{"message": {"content": content}}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def flaky():
+    _Flaky.hits = 0
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Flaky)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}/v1/chat/completions"
+    srv.shutdown()
+
+def test_retries_429_and_503_with_retry_after(tmp_path, monkeypatch, flaky):
+    monkeypatch.setenv("OPENROUTER_API_KEY", "sk-test")
+    _Flaky.fail = [429, 503]
+    c = LLMClient("m", tmp_path.as_posix(), cfg=Config(api_url=flaky, llm_backoff_s=5.0))
+    plan, _ = c.generate_plan("s", "u")
+    assert plan.actions[0].cmd == ["pytest"]
+    assert _Flaky.hits == 3 and c.stats["retries"] == 2
+
+def test_gives_up_after_max_retries(tmp_path, monkeypatch, flaky):
+    monkeypatch.setenv("OPENROUTER_API_KEY", "sk-test")
+    _Flaky.fail = [429] * 5
+    c = LLMClient("m", tmp_path.as_posix(), cfg=Config(api_url=flaky, llm_max_retries=1))
+    with pytest.raises(httpx.HTTPStatusError):
+        c.generate_plan("s", "u")
+    assert _Flaky.hits == 2
+
+def test_backoff_is_exponential_and_capped():
+    slept = []
+    s = RequestScheduler(max_retries=3, backoff_s=1.0, backoff_max_s=3.0, sleep=slept.append)
+    calls = []
+    def send():
+        calls.append(1)
+        raise httpx.ConnectError("down")
+    with pytest.raises(httpx.ConnectError):
+        with s.request(send):
+            pass
+    assert len(calls) == 4 and len(slept) == 3
+    assert slept[0] <= 1.0 and slept[1] <= 2.0 and all(d <= 3.0 for d in slept)
+
+def test_token_bucket_spaces_requests():
+    now = [0.0]
+    slept = []
+    s = RequestScheduler(rate_per_min=60, burst=2, sleep=slept.append, clock=lambda: now[0])
+    ok = lambda: httpx.Response(200)
+    stats = {}
+    for _ in range(4):
+        with s.request(ok, stats):
+            pass
+    assert slept == [1.0, 2.0]  # Burst von 2 frei, dann 1 Request/s auf Vorschuss
+    assert stats["wait_s"] == 3.0
+
+def test_retry_after_formats():
+    assert retry_after_seconds("7") == 7.0
+    assert retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert retry_after_seconds("soon") is None
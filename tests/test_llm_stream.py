@@ -0,0 +1,81 @@
+import json, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from typer.testing import CliRunner
+from devagent.cache import PlanCache
+from devagent.config import Config
+from devagent.llm import SCHEMA_HASH, ActionStreamParser, LLMClient, iter_sse_content
+from devagent.cli import app
+from devagent.schemas import Plan, Action
+
+PAYLOAD = json.dumps({"actions": [
+    {"type": "create", "file": "a.txt", "content": "x {not} \"quoted\" ] [\n"},
+    {"type": "run", "cmd": ["pytest", "-q"]},
+]})
+
+def test_parser_yields_actions_incrementally():
+    p = ActionStreamParser()
+    got = []
+    for ch in PAYLOAD:  # schlimmster Fall: ein Zeichen pro Chunk
+        got.extend(p.feed(ch))
+        if len(got) == 1:
+            assert not p.done
+    assert p.done
+    assert got == json.loads(PAYLOAD)["actions"]
+
+def test_sse_content_extraction():
+    lines = [": OPENROUTER PROCESSING", ""]
+    for part in (PAYLOAD[:10], PAYLOAD[10:]):
+        lines.append("data: " + json.dumps({"choices": [{"delta": {"content": part}}]}))
+    lines += ["data: [DONE]", "data: ignored"]
+    assert "".join(iter_sse_content(lines)) == PAYLOAD
+
+class StreamingLLM:
+    def __init__(self, model, **kw): pass
+    def generate_plan(self, system_prompt, user_prompt, stream=False, on_action=None):
+        actions = [Action(type="create", file="s.txt", content="s\n"), Action(type="run", cmd=["rm", "-rf", "x"])]
+        for i, a in enumerate(actions):
+            if on_action: on_action(i, a)
+        return Plan(actions=actions), "h"
+
+def test_cli_plan_stream_reports_actions(tmp_path, monkeypatch):
+    monkeypatch.setattr("devagent.cli.LLMClient", StreamingLLM)
+    r = CliRunner().invoke(app, ["plan", "-g", "x", "-w", tmp_path.as_posix(), "--stream"])
+    assert r.exit_code == 0, r.output
+    assert "#1 CREATE s.txt" in r.output
+    assert "Befehl nicht erlaubt: rm" in r.output
+    assert "Erste Aktion nach" in r.output
+
+class _TruncatedSSE(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        cut = PAYLOAD[:PAYLOAD.index("{\"type\": \"run\"")]  # erste Aktion komplett, dann Abbruch
+        body = "".join("data: " + json.dumps({"choices": [{"delta": {"content": part}}]}) + "\n\n"
+                       for part in (cut[:20], cut[20:]))
+        body += "data: " + json.dumps({"choices": [{"delta": {}, "finish_reason": "length"}]}) + "\n\ndata: [DONE]\n\n"
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def test_truncated_stream_is_an_error_and_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENROUTER_API_KEY", "sk-test")
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _TruncatedSSE)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        cfg = Config(api_url=f"http://127.0.0.1:{srv.server_address[1]}/v1/chat/completions")
+        cache = PlanCache(tmp_path.as_posix())
+        client = LLMClient("m", tmp_path.as_posix(), cfg=cfg, cache=cache)
+        seen = []
+        with pytest.raises(ValueError, match="unvollständig"):
+            client.generate_plan("s", "u", stream=True, on_action=lambda i, a: seen.append(a))
+        assert [a.file for a in seen] == ["a.txt"]
+        key = PlanCache.key("m", "s", client._cache_prompt("u"), SCHEMA_HASH)
+        assert cache.get(key) is None
+    finally:
+        srv.shutdown()
@@ -0,0 +1,57 @@
+import subprocess
+from devagent.config import Config
+from devagent.executor import execute
+from devagent.patcher import apply_patches_git
+from devagent.schemas import Plan, Action
+
+def _patch(name: str, old: str, new: str) -> str:
+    return f"--- a/{name}\n+++ b/{name}\n@@ -1 +1 @@\n-{old}\n+{new}\n"
+
+def _repo(tmp_path, n: int):
+    subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+    for i in range(n):
+        (tmp_path / f"f{i}.txt").write_text(f"v{i}\n", encoding="utf-8")
+    subprocess.run(["git", "add", "-A"], cwd=tmp_path, check=True)
+    subprocess.run(["git", "-c", "user.email=t@t", "-c", "user.name=t", "commit", "-qm", "init"], cwd=tmp_path, check=True)
+
+def test_combined_apply_attributes_failure_to_file(tmp_path):
+    _repo(tmp_path, 3)
+    patches = [_patch("f0.txt", "v0", "A"), _patch("f1.txt", "nope", "B"), _patch("f2.txt", "v2", "C")]
+    ok, failures = apply_patches_git(tmp_path.as_posix(), patches)
+    assert not ok and list(failures) == [1]
+    assert (tmp_path / "f0.txt").read_text() == "v0\n"  # Check schlägt fehl => nichts angewendet
+    ok, failures = apply_patches_git(tmp_path.as_posix(), [patches[0], patches[2], _patch("f0.txt", "A", "AA")])
+    assert ok and failures == {}
+    assert (tmp_path / "f0.txt").read_text() == "AA\n"
+
+def test_execute_batches_patches_and_stops_at_failing_action(tmp_path):
+    _repo(tmp_path, 3)
+    cfg = Config(patch_engine="git")
+    plan = Plan(actions=[Action(type="edit", file="f0.txt", patch=_patch("f0.txt", "v0", "A")),
+                         Action(type="edit", file="f1.txt", patch=_patch("f1.txt", "nope", "B")),
+                         Action(type="edit", file="f2.txt", patch=_patch("f2.txt", "v2", "C"))])
+    ok, msgs = execute(plan, tmp_path.as_posix(), "r1", cfg=cfg)
+    assert not ok
+    assert (tmp_path / "f0.txt").read_text() == "A\n"
+    assert (tmp_path / "f2.txt").read_text() == "v2\n"
+    assert any(m.startswith("ERROR edit f1.txt: git apply fehlgeschlagen") for m in msgs)
+    assert any(m.startswith("EDIT f0.txt (patch, git apply gebündelt)") for m in msgs)
+
+def test_pre_hooks_see_tree_after_previous_patches(tmp_path):
+    _repo(tmp_path, 1)
+    hooks = tmp_path / ".devagent" / "hooks"
+    hooks.mkdir(parents=True)
+    (hooks / "seen.py").write_text(
+        "import os\n"
+        "def handle(event, payload):\n"
+        f"    with open({(tmp_path / 'f0.txt').as_posix()!r}) as f:\n"
+        "        return True, f.read().strip()\n", encoding="utf-8")
+    (hooks / "hooks.toml").write_text('[[hook]]\nname = "seen"\nevents = ["PreToolUse"]\nmode = "python"\nmodule = "seen.py"\n',
+                                      encoding="utf-8")
+    plan = Plan(actions=[Action(type="edit", file="f0.txt", patch=_patch("f0.txt", "v0", "A")),
+                         Action(type="edit", file="f0.txt", patch=_patch("f0.txt", "A", "B"))])
+    ok, msgs = execute(plan, tmp_path.as_posix(), "r1", cfg=Config(patch_engine="git"))
+    assert ok, msgs
+    assert [m for m in msgs if m.startswith("[hook:PreToolUse:seen]")] == \
+        ["[hook:PreToolUse:seen] v0", "[hook:PreToolUse:seen] A"]
+    assert (tmp_path / "f0.txt").read_text() == "B\n"
@@ -0,0 +1,66 @@
+import textwrap
+import pytest
+from devagent.config import Config
+from devagent.executor import execute
+from devagent.patcher import PatchError, apply_patch
+from devagent.schemas import Plan, Action
+from devagent.verifier import verify_plan
+
+PATCH = textwrap.dedent("""\
+--- a/a.txt
++++ b/a.txt
+@@ -2,3 +2,3 @@
+ two
+-three
++THREE
+ four
+""")
+
+def test_applies_with_offset_without_git(tmp_path):
+    (tmp_path / "a.txt").write_text("zero\none\ntwo\nthree\nfour\n", encoding="utf-8")  # eine Zeile verschoben
+    notes = apply_patch(tmp_path.as_posix(), PATCH)
+    assert (tmp_path / "a.txt").read_text() == "zero\none\ntwo\nTHREE\nfour\n"
+    assert any("Versatz +1" in n for n in notes)
+
+def test_fuzz_ignores_changed_context(tmp_path):
+    (tmp_path / "a.txt").write_text("one\ntwo\nthree\nFOUR changed\n", encoding="utf-8")
+    apply_patch(tmp_path.as_posix(), PATCH)
+    assert (tmp_path / "a.txt").read_text() == "one\ntwo\nTHREE\nFOUR changed\n"
+
+def test_keeps_crlf_and_creates_and_deletes(tmp_path):
+    (tmp_path / "a.txt").write_bytes(b"one\r\ntwo\r\nthree\r\nfour\r\n")
+    (tmp_path / "old.txt").write_text("bye\n", encoding="utf-8")
+    multi = PATCH + textwrap.dedent("""\
+    --- /dev/null
+    +++ b/new/file.txt
+    @@ -0,0 +1,2 @@
+    +hello
+    +world
+    --- a/old.txt
+    +++ /dev/null
+    @@ -1 +0,0 @@
+    -bye
+    """)
+    apply_patch(tmp_path.as_posix(), multi)
+    assert (tmp_path / "a.txt").read_bytes() == b"one\r\ntwo\r\nTHREE\r\nfour\r\n"
+    assert (tmp_path / "new" / "file.txt").read_text() == "hello\nworld\n"
+    assert not (tmp_path / "old.txt").exists()
+
+def test_failed_patch_changes_nothing(tmp_path):
+    (tmp_path / "a.txt").write_text("x\ny\n", encoding="utf-8")
+    with pytest.raises(PatchError):
+        apply_patch(tmp_path.as_posix(), PATCH)
+    assert (tmp_path / "a.txt").read_text() == "x\ny\n"
+
+def test_verify_checks_patches_against_planned_state(tmp_path):
+    cfg = Config()
+    ok_plan = Plan(actions=[Action(type="create", file="a.txt", content="one\ntwo\nthree\nfour\n"),
+                            Action(type="edit", file="a.txt", patch=PATCH)])
+    assert verify_plan(ok_plan, tmp_path.as_posix(), cfg, has_git=False) == []
+    bad_plan = Plan(actions=[Action(type="create", file="a.txt", content="nothing here\n"),
+                             Action(type="edit", file="a.txt", patch=PATCH)])
+    errs = verify_plan(bad_plan, tmp_path.as_posix(), cfg, has_git=False)
+    assert errs and "patch passt nicht" in errs[0]
+    ok, msgs = execute(ok_plan, tmp_path.as_posix(), "r", require_git_for_patches=False)
+    assert ok, msgs
+    assert (tmp_path / "a.txt").read_text() == "one\ntwo\nTHREE\nfour\n"
@@ -0,0 +1,34 @@
+import os
+import pytest
+import yaml
+from devagent.planner import BLOB_MIN_CHARS, load_plan, save_plan
+from devagent.schemas import Plan, Action
+
+def test_large_bodies_go_to_blobs_and_load_lazily(tmp_path):
+    ws = tmp_path.as_posix()
+    big = "line\r\n" * BLOB_MIN_CHARS
+    save_plan(ws, Plan(actions=[Action(type="create", file="a.txt", content=big),
+                                Action(type="edit", file="b.txt", patch="--- a/b.txt\n+++ b/b.txt\n")]))
+    meta = (tmp_path / ".devagent" / "plan.json").read_text(encoding="utf-8")
+    assert "$blob" in meta and len(meta) < 1000
+    blobs = os.listdir(tmp_path / ".devagent" / "blobs")
+    assert len(blobs) == 1
+    plan = load_plan(ws)
+    assert plan.actions[1].patch.startswith("--- a/b.txt")
+    assert plan.actions[0].content == big  # CRLF bleibt erhalten
+    assert plan.actions[0].model_dump()["content"] == big
+    os.remove(tmp_path / ".devagent" / "blobs" / blobs[0])
+    lazy = load_plan(ws)  # Metadaten laden ohne Blob
+    assert lazy.actions[0].file == "a.txt"
+    with pytest.raises(ValueError, match="Blob fehlt"):
+        lazy.actions[0].content
+
+def test_legacy_plan_yaml_still_readable(tmp_path):
+    d = tmp_path / ".devagent"
+    d.mkdir()
+    actions = [Action(type="edit", file="b.txt", patch="--- a/b.txt\n").model_dump(), {"type": "run", "cmd": ["pytest"]}]
+    (d / "plan.yaml").write_text(yaml.safe_dump({"actions": actions}), encoding="utf-8")
+    plan = load_plan(tmp_path.as_posix())
+    assert [a.type for a in plan.actions] == ["edit", "run"]
+    save_plan(tmp_path.as_posix(), plan)
+    assert not (d / "plan.yaml").exists() and (d / "plan.json").exists()
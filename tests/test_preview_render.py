@@ -0,0 +1,35 @@
+import io
+from rich.console import Console
+from devagent.executor import PreviewItem
+from devagent.render import PreviewRenderer, split_hunks, write_patch
+
+def _diff(name: str, hunks: int, size: int) -> str:
+    out = [f"--- a/{name}", f"+++ b/{name}"]
+    for h in range(hunks):
+        out.append(f"@@ -{h * 100 + 1},{size} +{h * 100 + 1},{size} @@")
+        out += [f" ctx {h} {i}" for i in range(size)]
+    return "\n".join(out)
+
+def test_split_hunks_uses_line_counts():
+    diff = "--- a/x\n+++ b/x\n@@ -1,2 +1,1 @@\n--- sql\n keep\n--- a/y\n+++ b/y\n@@ -1 +1 @@\n-a\n+b\n"
+    head, hunks = split_hunks(diff)
+    assert head == ["--- a/x", "+++ b/x"]
+    assert hunks[0] == ["@@ -1,2 +1,1 @@", "--- sql", " keep"]
+    assert hunks[1][:3] == ["--- a/y", "+++ b/y", "@@ -1 +1 @@"]
+
+def test_budget_collapses_and_expand_shows(tmp_path):
+    out = io.StringIO()
+    console = Console(file=out, width=120)
+    items = [PreviewItem("edit", "a.txt", "Edit", _diff("a.txt", 3, 10)),
+             PreviewItem("edit", "b.txt", "Edit", _diff("b.txt", 2, 10))]
+    r = PreviewRenderer(console, file_lines=25, total_lines=35)
+    r.render(items)
+    assert list(r.collapsed) == ["1.3", "2.2"]  # a: 2 Hunks passen, b: Gesamtbudget erschöpft
+    assert "eingeklappt [1.3]" in out.getvalue()
+    assert r.shown == 33
+    out.truncate(0)
+    assert r.expand("1") and "ctx 2 9" in out.getvalue()
+    assert not r.expand("9")
+    path = write_patch(tmp_path.as_posix(), items + [PreviewItem("edit", "big.json", "Edit", "(Diff ausgelassen)")])
+    text = open(path, encoding="utf-8").read()
+    assert "+++ b/b.txt" in text and "# big.json: (Diff ausgelassen)" in text
@@ -0,0 +1,23 @@
+from devagent.rank import tokenize, rank_files
+from devagent.scanner import project_card
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("LLMClient.generate_plan in src/devagent/llm.py") == \
+        ["llm", "client", "generate", "plan", "src", "devagent", "llm", "py"]
+
+def test_rank_prefers_relevant_files():
+    terms = {"src/billing/invoice.py": {"invoice": 5, "total": 2}, "src/zeta/tax.py": {"vat": 3}}
+    files = [".github/ci.yml", "a/readme.md", "src/billing/invoice.py", "src/zeta/tax.py"]
+    ranked = rank_files(files, "Fix rounding of invoice totals (VAT)", lambda r: terms.get(r, {}))
+    assert ranked[:2] == ["src/billing/invoice.py", "src/zeta/tax.py"]
+    assert ranked[2:] == [".github/ci.yml", "a/readme.md"]
+    assert rank_files(files, "und die", lambda r: {}) == files
+
+def test_project_card_samples_ranked_by_goal(tmp_path):
+    for i in range(5):
+        (tmp_path / f"a{i}.txt").write_text("filler\n", encoding="utf-8")
+    (tmp_path / "zz_parser.py").write_text("def parse_config(): pass\n", encoding="utf-8")
+    card = project_card(tmp_path.as_posix(), [], goal="parse config", max_samples=2)
+    samples = card.split("Samples:")[1]
+    assert "--- zz_parser.py ---" in samples
+    assert "--- a0.txt ---" in samples and "--- a1.txt ---" not in samples
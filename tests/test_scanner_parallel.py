@@ -0,0 +1,27 @@
+import os
+from devagent.scanner import scan_tree, scan_tree_parallel
+
+def _make_tree(ws):
+    for rel in ["a/x.py", "a-b/y.py", "a/b/c/z.txt", "b.txt", "z/1", "z/2/3", "node_modules/pkg/i.js", "build/out.o"]:
+        p = ws / rel
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(rel, encoding="utf-8")
+    os.symlink(ws / "a", ws / "link_to_a")
+    os.symlink(ws / "b.txt", ws / "link_to_b")
+
+def test_parallel_scan_matches_scan_tree(tmp_path):
+    _make_tree(tmp_path)
+    expected = scan_tree(tmp_path.as_posix(), ["z"])
+    for workers in (0, 1, 3):
+        files, timings = scan_tree_parallel(tmp_path.as_posix(), ["z"], workers=workers)
+        assert files == expected
+        assert {t["subtree"] for t in timings} == {"a", "a-b"}
+        assert sum(t["files"] for t in timings) == 3
+
+def test_parallel_scan_records_dirs(tmp_path):
+    _make_tree(tmp_path)
+    records = {}
+    scan_tree_parallel(tmp_path.as_posix(), [], records=records)
+    assert records[""]["files"] == ["b.txt", "link_to_b"]
+    assert records["a"]["dirs"] == ["b"]
+    assert "node_modules" not in records
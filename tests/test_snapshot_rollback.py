@@ -0,0 +1,133 @@
+import json, os, subprocess
+import pytest
+from devagent.config import Config
+from devagent.executor import execute
+from devagent.schemas import Plan, Action
+from devagent.snapshot import SnapshotError, rollback
+
+def _git(ws, *args):
+    return subprocess.run(["git", "-c", "user.email=t@t", "-c", "user.name=t", *args],
+                          cwd=ws, check=True, capture_output=True, text=True).stdout
+
+PLAN = Plan(actions=[Action(type="edit", file="a.txt", content="changed\n"),
+                     Action(type="create", file="new/b.txt", content="b\n"),
+                     Action(type="delete", file="c.txt")])
+
+def test_git_snapshot_uses_private_ref_and_rolls_back(tmp_path):
+    ws = tmp_path.as_posix()
+    _git(ws, "init", "-q")
+    (tmp_path / "a.txt").write_text("a\n", encoding="utf-8")
+    (tmp_path / "c.txt").write_text("c\n", encoding="utf-8")
+    _git(ws, "add", "a.txt")
+    _git(ws, "commit", "-qm", "init")
+    (tmp_path / "c.txt").write_text("c untracked\n", encoding="utf-8")
+    head = _git(ws, "rev-parse", "HEAD")
+    ok, msgs = execute(PLAN, ws, "run1", require_git_for_patches=False, cfg=Config())
+    assert ok, msgs
+    assert _git(ws, "rev-parse", "HEAD") == head  # keine Commits in der Historie
+    assert _git(ws, "status", "--porcelain", "a.txt") == " M a.txt\n"  # echter Index unberührt
+    assert _git(ws, "rev-parse", "refs/devagent/snapshots/run1").strip() in msgs[0]
+    rollback(ws, "run1")
+    assert (tmp_path / "a.txt").read_text() == "a\n"
+    assert (tmp_path / "c.txt").read_text() == "c untracked\n"
+    assert not (tmp_path / "new" / "b.txt").exists()
+
+def test_file_snapshot_without_git_rolls_back(tmp_path):
+    ws = tmp_path.as_posix()
+    (tmp_path / "a.txt").write_text("a\n", encoding="utf-8")
+    (tmp_path / "c.txt").write_text("c\n", encoding="utf-8")
+    (tmp_path / "other.txt").write_text("o\n", encoding="utf-8")
+    ok, msgs = execute(PLAN, ws, "run2", require_git_for_patches=False, cfg=Config())
+    assert ok, msgs
+    assert not any(m.startswith("Snapshot") for m in msgs)
+    assert not (tmp_path / ".devagent" / "snapshots" / "run2" / "other.txt").exists()
+    rollback(ws, "run2")
+    assert (tmp_path / "a.txt").read_text() == "a\n"
+    assert (tmp_path / "c.txt").read_text() == "c\n"
+    assert not (tmp_path / "new" / "b.txt").exists()
+
+def test_git_rollback_only_touches_run_paths_and_keeps_later_edits(tmp_path):
+    ws = tmp_path.as_posix()
+    _git(ws, "init", "-q")
+    (tmp_path / "a.txt").write_text("a\n", encoding="utf-8")
+    (tmp_path / "c.txt").write_text("c\n", encoding="utf-8")
+    _git(ws, "add", "a.txt", "c.txt")
+    _git(ws, "commit", "-qm", "init")
+    ok, msgs = execute(PLAN, ws, "r1", require_git_for_patches=False, cfg=Config())
+    assert ok, msgs
+    (tmp_path / "my_notes.txt").write_text("notes\n", encoding="utf-8")
+    (tmp_path / "a.txt").write_text("user edit\n", encoding="utf-8")
+    with pytest.raises(SnapshotError, match="a.txt"):
+        rollback(ws, "r1")
+    assert (tmp_path / "a.txt").read_text() == "user edit\n"
+    msgs = rollback(ws, "r1", force=True)
+    assert sorted(msgs) == ["REMOVE new/b.txt", "RESTORE a.txt", "RESTORE c.txt"]
+    assert (tmp_path / "my_notes.txt").read_text() == "notes\n"
+    assert (tmp_path / "a.txt").read_text() == "a\n"
+    assert (tmp_path / "c.txt").read_text() == "c\n"
+    trash = list((tmp_path / ".devagent" / "trash" / "r1").glob("rollback-*"))
+    assert (trash[0] / "a.txt").read_text() == "user edit\n"
+    assert (trash[0] / "new" / "b.txt").read_text() == "b\n"
+
+def test_file_rollback_refuses_after_later_edit(tmp_path):
+    ws = tmp_path.as_posix()
+    (tmp_path / "a.txt").write_text("a\n", encoding="utf-8")
+    (tmp_path / "c.txt").write_text("c\n", encoding="utf-8")
+    ok, msgs = execute(PLAN, ws, "r2", require_git_for_patches=False, cfg=Config())
+    assert ok, msgs
+    (tmp_path / "new" / "b.txt").write_text("user\n", encoding="utf-8")
+    with pytest.raises(SnapshotError, match="new/b.txt"):
+        rollback(ws, "r2")
+    (tmp_path / "new" / "b.txt").write_text("b\n", encoding="utf-8")
+    assert sorted(rollback(ws, "r2")) == ["REMOVE new/b.txt", "RESTORE a.txt", "RESTORE c.txt"]
+
+def test_git_snapshot_sees_edits_after_failed_run(tmp_path):
+    ws = tmp_path.as_posix()
+    _git(ws, "init", "-q")
+    (tmp_path / "a.txt").write_text("a\n", encoding="utf-8")
+    _git(ws, "add", "a.txt")
+    _git(ws, "commit", "-qm", "init")
+    manifest = tmp_path / ".devagent" / "hooks" / "hooks.toml"
+    manifest.parent.mkdir(parents=True)
+    manifest.write_text('[[hook]]\nmode = "bogus"\n', encoding="utf-8")
+    plan = Plan(actions=[Action(type="create", file="b.txt", content="b\n")])
+    ok, msgs = execute(plan, ws, "r1", require_git_for_patches=False, cfg=Config())
+    assert not ok and any("ERROR hooks" in m for m in msgs)
+    (tmp_path / "a.txt").write_text("uncommitted\n", encoding="utf-8")
+    manifest.unlink()
+    ok, msgs = execute(plan, ws, "r2", require_git_for_patches=False, cfg=Config())
+    assert ok, msgs
+    assert _git(ws, "show", "refs/devagent/snapshots/r2:a.txt") == "uncommitted\n"
+    rollback(ws, "r2")
+    assert (tmp_path / "a.txt").read_text() == "uncommitted\n"
+
+def test_after_state_covers_only_touched_paths_and_old_snapshots_are_pruned(tmp_path):
+    ws = tmp_path.as_posix()
+    _git(ws, "init", "-q")
+    (tmp_path / "a.txt").write_text("a\n", encoding="utf-8")
+    (tmp_path / "other.txt").write_text("o\n", encoding="utf-8")
+    _git(ws, "add", "-A")
+    _git(ws, "commit", "-qm", "init")
+    plan = Plan(actions=[Action(type="edit", file="a.txt", content="changed\n")])
+    for i in range(4):
+        ok, msgs = execute(plan, ws, f"k{i}", require_git_for_patches=False, cfg=Config(snapshot_keep=2))
+        assert ok, msgs
+    manifest = json.loads((tmp_path / ".devagent" / "snapshots" / "k3.json").read_text())
+    assert sorted(manifest["after"]) == ["a.txt"]
+    assert sorted(p.stem for p in (tmp_path / ".devagent" / "snapshots").glob("*.json")) == ["k2", "k3"]
+    refs = _git(ws, "for-each-ref", "--format=%(refname)", "refs/devagent/snapshots").split()
+    assert refs == ["refs/devagent/snapshots/k2", "refs/devagent/snapshots/k3"]
+
+def test_git_rollback_removes_file_created_by_run_step(tmp_path):
+    import sys
+    ws = tmp_path.as_posix()
+    _git(ws, "init", "-q")
+    (tmp_path / "a.txt").write_text("a\n", encoding="utf-8")
+    _git(ws, "add", "-A")
+    _git(ws, "commit", "-qm", "init")
+    gen = [sys.executable, "-c", "open('gen.txt', 'w').write('g')"]
+    cfg = Config(allow_commands={os.path.basename(sys.executable)})
+    ok, msgs = execute(Plan(actions=[Action(type="run", cmd=gen)]), ws, "g1", require_git_for_patches=False, cfg=cfg)
+    assert ok, msgs
+    assert rollback(ws, "g1") == ["REMOVE gen.txt"]
+    assert not (tmp_path / "gen.txt").exists()
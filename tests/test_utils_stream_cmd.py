@@ -0,0 +1,34 @@
+import sys, time
+from devagent.config import Config
+from devagent.executor import command_timeout, execute
+from devagent.schemas import Plan, Action
+from devagent.utils import stream_cmd
+
+PY = sys.executable
+
+def test_bounded_head_and_tail_with_live_lines():
+    seen = []
+    res = stream_cmd([PY, "-c", "import sys\nfor i in range(1000): print(i)\nprint('oops', file=sys.stderr)"],
+                     on_line=lambda s, l: seen.append((s, l)), head_lines=3, tail_lines=2)
+    assert res.code == 0
+    assert res.out.splitlines() == ["0", "1", "2", "... (995 Zeilen ausgelassen) ...", "998", "999"]
+    assert res.err == "oops"
+    assert len(seen) == 1001 and ("stderr", "oops") in seen
+
+def test_abort_pattern_kills_early():
+    t0 = time.perf_counter()
+    res = stream_cmd([PY, "-u", "-c", "import time\nprint('FATAL: db down')\ntime.sleep(10)"],
+                     abort_patterns=[r"FATAL"])
+    assert res.aborted == "FATAL" and time.perf_counter() - t0 < 5
+
+def test_timeout_returns_124():
+    res = stream_cmd([PY, "-c", "import time; time.sleep(10)"], timeout=0.3)
+    assert res.code == 124
+
+def test_execute_uses_config_timeouts_and_aborts(tmp_path):
+    cfg = Config(run_timeouts={"python3": 0.3, "python": 0.3}, run_abort_patterns=["Traceback"])
+    assert command_timeout(cfg, ["/usr/bin/python3", "x"]) == 0.3
+    assert command_timeout(cfg, ["ruff"]) == cfg.run_timeout_s
+    plan = Plan(actions=[Action(type="run", cmd=[PY, "-c", "raise SystemExit(\"Traceback: x\")"])])
+    ok, msgs = execute(plan, tmp_path.as_posix(), "r", require_git_for_patches=False, cfg=cfg)
+    assert not ok and any("Abgebrochen" in m for m in msgs)